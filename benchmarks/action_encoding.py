@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for encoding episode actions for an upload
+
+Encodes episode actions with every installed codec, once through a
+list of dicts from to_dictionary and once with EPISODE_ACTION_ENCODER
+(also streamed), checks that all give the same bytes and reports
+actions/second.
+
+    python benchmarks/action_encoding.py --actions 100000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import json  # noqa: E402
+
+from upload_compression import make_actions  # noqa: E402
+
+
+def through_dicts(actions):
+    return json.get_codec().dumps([a.to_dictionary() for a in actions])
+
+
+def with_encoder(actions):
+    return api.EPISODE_ACTION_ENCODER.encode(actions)
+
+
+def streamed(actions):
+    return b''.join(json.iterencode(actions,
+                                    encoder=api.EPISODE_ACTION_ENCODER))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000,
+                        help='number of episode actions to encode')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    actions = make_actions(args.actions)
+
+    print('%10s %14s %14s %10s' % ('codec', 'encoding', 'actions/s',
+                                   'speedup'))
+    for codec in json.available_codecs():
+        json.set_default_codec(codec)
+        expected = through_dicts(actions)
+        before = None
+        functions = [('dicts', through_dicts), ('encoder', with_encoder),
+                     ('streamed', streamed)]
+        for name, function in functions:
+            if function(actions) != expected:
+                raise SystemExit('%s gives different bytes with %s' % (
+                    name, codec))
+            seconds = min(timeit.repeat(lambda: function(actions), number=1,
+                                        repeat=args.repeat))
+            before = before or seconds
+            print('%10s %14s %14.0f %9.2fx' % (codec, name,
+                                               args.actions / seconds,
+                                               before / seconds))
+
+
+if __name__ == '__main__':
+    main()
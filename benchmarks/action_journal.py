@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for queueing episode actions in an ActionJournal
+
+A player creates --actions episode actions, one every --interval
+seconds, and either uploads each of them with upload_episode_actions
+(blocking on the stand-in server of chunked_upload.py, which answers
+after --latency seconds) or enqueues it in an ActionJournal. Reports
+the time the player is blocked per action, the number of uploads, and
+the time until all actions have been acknowledged.
+
+    python benchmarks/action_journal.py --actions 500 --latency 0.05
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import journal  # noqa: E402
+
+import chunked_upload  # noqa: E402
+import upload_compression  # noqa: E402
+
+
+class CountingClient(api.MygPodderClient):
+    uploads = 0
+
+    def upload_episode_actions(self, actions=[], stream=False):
+        self.uploads += 1
+        return api.MygPodderClient.upload_episode_actions(self, actions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=0.001,
+                        help='seconds between two actions of the player')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds the server waits before answering')
+    args = parser.parse_args()
+
+    chunked_upload.SlowHandler.latency = args.latency
+    server = upload_compression.StandInServer(('127.0.0.1', 0),
+                                              chunked_upload.SlowHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    root_url = 'http://127.0.0.1:%d' % server.server_address[1]
+    actions = upload_compression.make_actions(args.actions)
+    directory = tempfile.mkdtemp()
+
+    def blocking(client):
+        for action in actions:
+            client.upload_episode_actions([action])
+            time.sleep(args.interval)
+
+    def journaled(client):
+        queue = journal.ActionJournal(os.path.join(directory, 'journal'),
+                                      client, flush_interval=0.01)
+        blocked = 0
+        for action in actions:
+            start = time.time()
+            queue.enqueue(action)
+            blocked += time.time() - start
+            time.sleep(args.interval)
+        queue.flush()
+        queue.close()
+        return blocked
+
+    print('%10s %14s %8s %10s' % ('upload', 'blocked ms/a', 'uploads',
+                                  'seconds'))
+    try:
+        for name, function in (('blocking', blocking),
+                               ('journal', journaled)):
+            client = CountingClient('user', 'secret', root_url)
+            start = time.time()
+            blocked = function(client)
+            seconds = time.time() - start
+            if blocked is None:
+                blocked = seconds - args.interval * args.actions
+            print('%10s %14.3f %8d %10.2f' % (
+                name, blocked * 1000 / args.actions, client.uploads,
+                seconds))
+    finally:
+        shutil.rmtree(directory)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
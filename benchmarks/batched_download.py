@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for downloading many episode actions in batches
+
+Downloads a response with many episode actions (read in blocks of
+64 KiB, as from a socket) with download_episode_actions and with
+iter_episode_action_batches (counting the play actions of every
+batch), and reports the time and the peak memory allocated while doing
+so (not counting the response itself).
+
+    python benchmarks/batched_download.py --actions 200000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import json  # noqa: E402
+from mygpoclient import testing  # noqa: E402
+
+from upload_compression import make_actions  # noqa: E402
+
+BLOCK_SIZE = 64 * 1024
+
+
+class BlockJsonClient(testing.FakeJsonClient):
+    """Returns the response in blocks, like a real response body"""
+
+    def GET_items(self, uri, key=None, members=None):
+        self.requests.append(('GET', uri, None))
+        data = self.response_value
+        blocks = (data[i:i + BLOCK_SIZE]
+                  for i in range(0, len(data), BLOCK_SIZE))
+        return json.iterdecode(blocks, key, members)
+
+
+def count_plays(actions):
+    return sum(1 for action in actions if action.action == 'play')
+
+
+def all_at_once(client, directory):
+    changes = client.download_episode_actions()
+    return count_plays(changes.actions), changes.since
+
+
+def in_batches(client, directory, batch_size):
+    plays = 0
+    watermark = os.path.join(directory, 'actions.watermark')
+    for changes in client.iter_episode_action_batches(
+            batch_size=batch_size, watermark=watermark):
+        plays += count_plays(changes.actions)
+    os.unlink(watermark)
+    return plays, changes.since
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=200000,
+                        help='number of episode actions in the response')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    fake_client = BlockJsonClient()
+    fake_client.response_value = json.JsonClient.encode({
+        'actions': [a.to_dictionary() for a in make_actions(args.actions)],
+        'timestamp': 1262103016,
+    })
+    client = api.MygPodderClient('user', 'password',
+                                 client_class=fake_client)
+    directory = tempfile.mkdtemp()
+
+    print('%16s %10s %12s' % ('download', 'seconds', 'peak MiB'))
+    results = set()
+    try:
+        for name, function, extra in (
+                ('all at once', all_at_once, ()),
+                ('in batches', in_batches, (args.batch_size,))):
+            tracemalloc.start()
+            start = time.time()
+            results.add(function(client, directory, *extra))
+            seconds = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('%16s %10.2f %12.1f' % (name, seconds, peak / 2.0 ** 20))
+    finally:
+        shutil.rmtree(directory)
+
+    assert len(results) == 1
+
+
+if __name__ == '__main__':
+    main()
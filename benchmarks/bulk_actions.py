@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for creating many EpisodeAction objects
+
+Creates episode actions from dictionaries (as decoded from a download
+response) one at a time with from_dictionary, with the strptime-based
+timestamp check the constructor used before, and in bulk with
+from_dictionaries (checked and trusted), and reports actions/second.
+
+    python benchmarks/bulk_actions.py --actions 100000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import util  # noqa: E402
+
+from upload_compression import make_actions  # noqa: E402
+
+
+def strptime_check(s):
+    """The timestamp check of the constructor before is_iso8601"""
+    return util.iso8601_to_datetime(s) is not None
+
+
+def one_at_a_time(dicts):
+    return [api.EpisodeAction.from_dictionary(d) for d in dicts]
+
+
+def one_at_a_time_strptime(dicts):
+    is_iso8601, util.is_iso8601 = util.is_iso8601, strptime_check
+    try:
+        return one_at_a_time(dicts)
+    finally:
+        util.is_iso8601 = is_iso8601
+
+
+def bulk(dicts):
+    return api.EpisodeAction.from_dictionaries(dicts)
+
+
+def bulk_trusted(dicts):
+    return api.EpisodeAction.from_dictionaries(dicts, trusted=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000,
+                        help='number of episode actions to create')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dicts = [a.to_dictionary() for a in make_actions(args.actions)]
+
+    print('%26s %14s' % ('constructor', 'actions/s'))
+    for name, function in (('from_dictionary+strptime',
+                            one_at_a_time_strptime),
+                           ('from_dictionary', one_at_a_time),
+                           ('from_dictionaries', bulk),
+                           ('from_dictionaries trusted', bulk_trusted)):
+        seconds = min(timeit.repeat(lambda: function(dicts), number=1,
+                                    repeat=args.repeat))
+        print('%26s %14.0f' % (name, args.actions / seconds))
+
+
+if __name__ == '__main__':
+    main()
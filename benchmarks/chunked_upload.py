@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for chunked episode action uploads
+
+Uploads episode actions in chunks to the local stand-in server of
+upload_compression.py, which waits --latency seconds before answering
+every request (like a remote server would), with different numbers of
+chunks in flight, and reports the wall time.
+
+    python benchmarks/chunked_upload.py --actions 100000 --chunk 1000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+
+import upload_compression  # noqa: E402
+
+
+class SlowHandler(upload_compression.Handler):
+    latency = 0.05
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        upload_compression.Handler.do_POST(self)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000)
+    parser.add_argument('--chunk', type=int, default=1000,
+                        help='maximum number of actions per chunk')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds the server waits before answering')
+    parser.add_argument('--in-flight', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    SlowHandler.latency = args.latency
+    server = upload_compression.StandInServer(('127.0.0.1', 0), SlowHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    root_url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    actions = upload_compression.make_actions(args.actions)
+    client = api.MygPodderClient('user', 'secret', root_url)
+    print('%10s %10s %10s' % ('in flight', 'seconds', 'actions/s'))
+    for in_flight in args.in_flight:
+        start = time.time()
+        client.upload_episode_actions_chunked(actions, max_actions=args.chunk,
+                                              in_flight=in_flight)
+        elapsed = time.time() - start
+        print('%10d %10.2f %10.0f' % (in_flight, elapsed,
+                                      args.actions / elapsed))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for fetching the subscriptions of many devices
+
+Runs a local stand-in server with --devices devices, which waits
+--latency seconds before answering every request (like a remote server
+would), and fetches the subscriptions of all devices with
+get_device_subscriptions using different numbers of jobs (1 is the
+same as calling get_subscriptions for one device after the other).
+
+    python benchmarks/device_subscriptions.py --devices 20 --jobs 1 4 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+
+import upload_compression  # noqa: E402
+
+
+class DeviceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    devices = 20
+    latency = 0.05
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path.startswith('/api/2/devices/'):
+            data = [{'id': 'device-%d' % i, 'caption': 'Device %d' % i,
+                     'type': 'mobile', 'subscriptions': 50}
+                    for i in range(self.devices)]
+        else:
+            data = ['http://feeds.example.com/podcast-%d/feed.rss' % i
+                    for i in range(50)]
+
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--devices', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds the server waits before answering')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    DeviceHandler.devices = args.devices
+    DeviceHandler.latency = args.latency
+    server = upload_compression.StandInServer(('127.0.0.1', 0),
+                                              DeviceHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    root_url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    client = api.MygPodderClient('user', 'secret', root_url)
+    devices = client.get_devices()
+    print('%6s %10s' % ('jobs', 'seconds'))
+    for jobs in args.jobs:
+        start = time.time()
+        subscriptions = client.get_device_subscriptions(devices, jobs=jobs)
+        elapsed = time.time() - start
+        assert len(subscriptions) == args.devices
+        print('%6d %10.2f' % (jobs, elapsed))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
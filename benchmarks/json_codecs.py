@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for the JSON codecs of mygpoclient.json
+
+Encodes and decodes realistic episode action and toplist payloads with
+every installed codec and reports the throughput in MB/s (relative to
+the size of the JSON data produced by the json module).
+
+    python benchmarks/json_codecs.py --actions 100000 --podcasts 100
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import json  # noqa: E402
+
+from upload_compression import make_actions  # noqa: E402
+
+
+def make_toplist(count):
+    """Create a toplist response like the one of gpodder.net"""
+    return [{
+        'url': 'http://feeds.example.com/podcast-%d/feed.rss' % i,
+        'title': 'Podcast %d - Talk about everything' % i,
+        'description': 'A show about things. ' * 20,
+        'website': 'http://www.example.com/podcast-%d/' % i,
+        'subscribers': 10000 - i,
+        'subscribers_last_week': 9990 - i,
+        'mygpo_link': 'http://gpodder.net/podcast/%d' % i,
+        'logo_url': 'http://www.example.com/podcast-%d/logo.png' % i,
+    } for i in range(count)]
+
+
+def measure(function, size, repeat):
+    """Get the best throughput of function in MB/s"""
+    seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+    return size / seconds / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000,
+                        help='number of episode actions in the payload')
+    parser.add_argument('--podcasts', type=int, default=100,
+                        help='number of podcasts in the toplist payload')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [
+        ('actions', {'actions': [a.to_dictionary()
+                                 for a in make_actions(args.actions)],
+                     'timestamp': 1262103016}),
+        ('toplist', make_toplist(args.podcasts)),
+    ]
+
+    print('%10s %12s %12s %14s %14s' % ('payload', 'codec', 'bytes',
+                                        'encode MB/s', 'decode MB/s'))
+    for payload, data in payloads:
+        size = len(json.get_codec('json').dumps(data))
+        for name in json.available_codecs():
+            codec = json.get_codec(name)
+            encoded = codec.dumps(data)
+            encode = measure(lambda: codec.dumps(data), size, args.repeat)
+            decode = measure(lambda: codec.loads(encoded), size, args.repeat)
+            print('%10s %12s %12d %14.1f %14.1f' % (payload, name,
+                                                    len(encoded), encode,
+                                                    decode))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for the memory used by decoded episode actions
+
+Decodes an episode action download response and measures (with
+tracemalloc) the memory that the resulting objects keep alive: as
+plain objects with a __dict__, as EpisodeAction objects (__slots__)
+and as EpisodeAction objects with the podcast URLs, actions and device
+IDs interned, as the schema of the client builds them.
+
+    python benchmarks/model_memory.py --actions 1000000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import json  # noqa: E402
+
+
+FIELDS = api.EpisodeAction.__slots__
+
+
+class PlainEpisodeAction(object):
+    """EpisodeAction as it was before, with a __dict__"""
+
+    def __init__(self, *values):
+        for name, value in zip(FIELDS, values):
+            setattr(self, name, value)
+
+
+def new_episode_action(*values):
+    """Build an EpisodeAction without running the validation
+
+    The validation doesn't change the memory layout of the objects,
+    but running it under tracemalloc would take minutes.
+    """
+    action = object.__new__(api.EpisodeAction)
+    for name, value in zip(FIELDS, values):
+        setattr(action, name, value)
+    return action
+
+
+SCHEMA = api.EPISODE_ACTION_SCHEMA
+PLAIN_SCHEMA = json.Schema(PlainEpisodeAction, SCHEMA.required,
+                           SCHEMA.optional)
+SLOTS_SCHEMA = json.Schema(new_episode_action, SCHEMA.required,
+                           SCHEMA.optional)
+INTERNED_SCHEMA = json.Schema(new_episode_action, SCHEMA.required,
+                              SCHEMA.optional,
+                              interned=('podcast', 'action', 'device'))
+
+
+def make_response(count, podcasts=200, devices=5):
+    """Encode a download response with realistic repetition"""
+    actions = [{
+        'podcast': 'http://feeds.example.com/podcast-%d/feed.rss' % (
+            i % podcasts),
+        'episode': 'http://media.example.com/podcast-%d/episode-%d.mp3' % (
+            i % podcasts, i),
+        'action': 'play',
+        'device': 'device-%d' % (i % devices),
+        'timestamp': '2019-%02d-%02dT%02d:%02d:%02d' % (
+            i % 12 + 1, i % 28 + 1, i % 24, i % 60, i % 60),
+        'started': 0,
+        'position': i % 3600,
+        'total': 3600,
+    } for i in range(count)]
+    return json.JsonClient.encode({'actions': actions,
+                                   'timestamp': 1262103016})
+
+
+def measure(schema, data):
+    """Get the retained and peak memory in MB of the decoded actions"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        actions = schema.build_list(json.JsonClient.decode(data)['actions'])
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        del actions
+        return current / 1e6, peak / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=1000000,
+                        help='number of episode actions in the response')
+    args = parser.parse_args()
+
+    data = make_response(args.actions)
+    print('%d actions, %.1f MB of JSON, codec: %s' % (
+        args.actions, len(data) / 1e6, json.get_codec().name))
+    print('%10s %12s %12s %14s' % ('objects', 'retained MB', 'peak MB',
+                                   'bytes/action'))
+    for name, schema in (('plain', PLAIN_SCHEMA), ('slots', SLOTS_SCHEMA),
+                         ('interned', INTERNED_SCHEMA)):
+        retained, peak = measure(schema, data)
+        print('%10s %12.1f %12.1f %14.0f' % (name, retained, peak,
+                                             retained * 1e6 / args.actions))
+
+
+if __name__ == '__main__':
+    main()
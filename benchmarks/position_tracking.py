@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for keeping the latest play positions up to date
+
+Builds an action history with many plays per episode, and compares
+replaying the whole history whenever a new batch of actions arrives
+with folding only the batch into a PositionTracker. Also reports the
+size of a snapshot and the time to restore a tracker from it.
+
+    python benchmarks/position_tracking.py --history 200000 --batch 500
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import positions  # noqa: E402
+from mygpoclient import util  # noqa: E402
+
+
+def make_history(count, episodes=5000, devices=3):
+    """Create play actions for a few episodes, oldest first"""
+    start = datetime.datetime(2019, 1, 1)
+    actions = []
+    for i in range(count):
+        episode = i % episodes
+        timestamp = start + datetime.timedelta(seconds=60 * i)
+        actions.append(api.EpisodeAction(
+            'http://feeds.example.com/podcast-%d/feed.rss' % (episode % 100),
+            'http://media.example.com/episode-%d.mp3' % episode, 'play',
+            'device-%d' % (i % devices), util.datetime_to_iso8601(timestamp),
+            0, (i // episodes) * 60 % 3600, 3600))
+    return actions
+
+
+def replay(history):
+    """Get the latest positions by replaying all actions"""
+    latest = {}
+    for action in sorted(history, key=positions._order_key):
+        latest[action.podcast, action.episode] = action.position
+    return latest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--history', type=int, default=200000,
+                        help='number of actions in the history')
+    parser.add_argument('--batch', type=int, default=500,
+                        help='number of new actions per update')
+    args = parser.parse_args()
+
+    history = make_history(args.history + args.batch)
+    old, batch = history[:args.history], history[args.history:]
+
+    tracker = positions.PositionTracker()
+    tracker.update(old)
+
+    started = time.time()
+    latest = replay(old + batch)
+    replay_seconds = time.time() - started
+
+    started = time.time()
+    tracker.update(batch)
+    update_seconds = time.time() - started
+
+    for (podcast, episode), position in latest.items():
+        assert tracker.position(podcast, episode) == position
+
+    started = time.time()
+    snapshot = tracker.snapshot()
+    snapshot_seconds = time.time() - started
+    started = time.time()
+    positions.PositionTracker.from_snapshot(snapshot)
+    restore_seconds = time.time() - started
+
+    print('%d actions in the history, %d in the batch, %d episodes' % (
+        args.history, args.batch, len(tracker)))
+    print('%24s %10.1f ms' % ('replay history', replay_seconds * 1e3))
+    print('%24s %10.1f ms' % ('update tracker', update_seconds * 1e3))
+    print('%24s %10.1f ms (%.1f MB)' % ('snapshot', snapshot_seconds * 1e3,
+                                        len(snapshot) / 1e6))
+    print('%24s %10.1f ms' % ('restore', restore_seconds * 1e3))
+
+
+if __name__ == '__main__':
+    main()
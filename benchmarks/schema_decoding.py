@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for the schema-directed decoding of responses
+
+Decodes toplist and episode action responses into model objects, once
+with the per-object from_dict loops the clients used before (building
+a second list next to the decoded dicts) and once with the schemas of
+the clients, and reports the time and the peak of allocated memory.
+
+    python benchmarks/schema_decoding.py --actions 100000 --podcasts 100
+"""
+
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import json  # noqa: E402
+from mygpoclient import simple  # noqa: E402
+
+from json_codecs import make_toplist  # noqa: E402
+from upload_compression import make_actions  # noqa: E402
+
+
+def podcast_from_dict(d):
+    """Podcast.from_dict as it was before the schemas"""
+    for key in simple.Podcast.REQUIRED_FIELDS:
+        if key not in d:
+            raise ValueError('Missing keys for toplist podcast')
+
+    return simple.Podcast(*(d.get(k) for k in simple.Podcast.REQUIRED_FIELDS))
+
+
+def decode_toplist_dicts(data):
+    return [podcast_from_dict(x) for x in json.JsonClient.decode(data)]
+
+
+def decode_toplist_schema(data):
+    return simple.PODCAST_SCHEMA.build_list(json.JsonClient.decode(data))
+
+
+def decode_actions_dicts(data):
+    response = json.JsonClient.decode(data)
+    return [api.EpisodeAction.from_dictionary(d)
+            for d in response['actions']]
+
+
+def decode_actions_schema(data):
+    return api._parse_episode_action_changes(
+        json.JsonClient.decode(data)).actions
+
+
+def peak_memory(function, data):
+    """Get the peak of memory allocated by function in MB"""
+    tracemalloc.start()
+    try:
+        function(data)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000,
+                        help='number of episode actions in the response')
+    parser.add_argument('--podcasts', type=int, default=100,
+                        help='number of podcasts in the toplist response')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    actions = {'actions': [a.to_dictionary()
+                           for a in make_actions(args.actions)],
+               'timestamp': 1262103016}
+    payloads = [
+        ('toplist', json.JsonClient.encode(make_toplist(args.podcasts)),
+         decode_toplist_dicts, decode_toplist_schema),
+        ('actions', json.JsonClient.encode(actions),
+         decode_actions_dicts, decode_actions_schema),
+    ]
+
+    print('codec: %s' % json.get_codec().name)
+    print('%10s %8s %12s %12s' % ('payload', 'decoder', 'ms', 'peak MB'))
+    for payload, data, *decoders in payloads:
+        for name, decode in zip(('dicts', 'schema'), decoders):
+            seconds = min(timeit.repeat(lambda: decode(data), number=1,
+                                        repeat=args.repeat))
+            print('%10s %8s %12.2f %12.1f' % (payload, name, seconds * 1e3,
+                                              peak_memory(decode, data)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for syncing episode actions with a SyncStore
+
+A stand-in for the server has a history of episode actions, and gets
+--new actions before every sync. Syncs download the whole history
+(without store) or only the new actions (refresh_episode_actions with
+a store). Reports the response size and time per sync, and the time of
+a local last_action query.
+
+    python benchmarks/sync_store.py --actions 100000 --new 100
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+from mygpoclient import json  # noqa: E402
+from mygpoclient import store  # noqa: E402
+from mygpoclient import testing  # noqa: E402
+
+from upload_compression import make_actions  # noqa: E402
+
+
+class HistoryJsonClient(testing.FakeJsonClient):
+    """Answers with the actions that were added after since"""
+
+    def __init__(self, actions):
+        testing.FakeJsonClient.__init__(self)
+        self.dicts = [a.to_dictionary() for a in actions]
+        self.sent = 0
+
+    def respond(self, uri):
+        since = int(uri.split('since=')[1]) if 'since=' in uri else 0
+        data = json.JsonClient.encode({'actions': self.dicts[since:],
+                                       'timestamp': len(self.dicts)})
+        self.sent += len(data)
+        return data
+
+    def GET(self, uri):
+        return json.JsonClient.decode(self.respond(uri))
+
+    def GET_items(self, uri, key=None, members=None):
+        return json.iterdecode([self.respond(uri)], key, members)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000,
+                        help='number of episode actions in the history')
+    parser.add_argument('--new', type=int, default=100,
+                        help='number of new episode actions per sync')
+    parser.add_argument('--syncs', type=int, default=5)
+    args = parser.parse_args()
+
+    actions = make_actions(args.actions + args.new * args.syncs)
+    directory = tempfile.mkdtemp()
+    sync_store = store.SyncStore(os.path.join(directory, 'sync.sqlite'))
+    try:
+        fake_client = HistoryJsonClient(actions[:args.actions])
+        client = api.MygPodderClient('user', 'password',
+                                     client_class=fake_client,
+                                     store=sync_store)
+        start = time.time()
+        client.refresh_episode_actions()
+        print('initial refresh: %.2f s' % (time.time() - start))
+
+        print('%16s %12s %10s' % ('sync', 'KiB/sync', 'ms/sync'))
+        for name, sync in (
+                ('full download', client.download_episode_actions),
+                ('refresh', client.refresh_episode_actions)):
+            fake_client.sent = 0
+            start = time.time()
+            for i in range(args.syncs):
+                offset = args.actions + i * args.new
+                fake_client.dicts[offset:] = [
+                    a.to_dictionary()
+                    for a in actions[offset:offset + args.new]]
+                sync()
+            seconds = time.time() - start
+            del fake_client.dicts[args.actions:]
+            print('%16s %12.1f %10.1f' % (
+                name, fake_client.sent / 1024.0 / args.syncs,
+                seconds * 1000 / args.syncs))
+
+        action = actions[args.actions // 2]
+        number = 10000
+        seconds = timeit.timeit(lambda: sync_store.last_action(
+            'user', action.podcast, action.episode), number=number)
+        print('last_action query: %.1f us' % (seconds / number * 1e6))
+    finally:
+        sync_store.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Microbenchmarks for the time functions of mygpoclient.util
+
+Compares the time codec with the implementations it replaced, and
+reports the time per call in microseconds. The "uncached" rows parse
+timestamps that are not in the LRU cache.
+
+    python benchmarks/time_codec.py --number 100000
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+import timeit
+
+from email import utils
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import util  # noqa: E402
+
+
+def old_iso8601_to_datetime(s):
+    for format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
+                   '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.datetime.strptime(s, format)
+        except ValueError:
+            continue
+
+    return None
+
+
+def old_position_to_seconds(s):
+    hours, minutes, seconds = (int(x) for x in s.split(':', 2))
+    return (((hours * 60) + minutes) * 60) + seconds
+
+
+def old_parse_header_date(date_str):
+    ts = time.mktime(utils.parsedate(date_str))
+    return datetime.datetime.utcfromtimestamp(ts)
+
+
+def old_format_header_date(datetime_obj):
+    return utils.formatdate(time.mktime(datetime_obj.timetuple()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=100000,
+                        help='number of calls per measurement')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    uncached = getattr(util._parse_iso8601, '__wrapped__',
+                       util._parse_iso8601)
+    dt = datetime.datetime(2009, 12, 29, 19, 25, 33)
+    header = 'Tue, 29 Dec 2009 19:25:33 GMT'
+    cases = []
+    for name, timestamp in (('iso8601', '2009-12-29T19:25:33'),
+                            ('iso8601 fraction', '2009-12-29T19:25:33.1'),
+                            ('iso8601 Z', '2009-12-29T19:25:33Z')):
+        cases.append((name, old_iso8601_to_datetime, [
+            ('uncached', uncached), ('cached', util.iso8601_to_datetime),
+        ], timestamp))
+    cases.extend([
+        ('position_to_seconds', old_position_to_seconds,
+         [('new', util.position_to_seconds)], '02:59:59'),
+        ('parse_header_date', old_parse_header_date,
+         [('new', util.rfc2822_to_datetime)], header),
+        ('format_header_date', old_format_header_date,
+         [('new', util.datetime_to_rfc2822)], dt),
+    ])
+
+    def per_call(function, argument):
+        seconds = min(timeit.repeat(lambda: function(argument),
+                                    number=args.number, repeat=args.repeat))
+        return seconds / args.number * 1e6
+
+    print('%20s %10s %10s %10s' % ('function', 'variant', 'us/call',
+                                   'speedup'))
+    for name, old, variants, argument in cases:
+        before = per_call(old, argument)
+        print('%20s %10s %10.2f' % (name, 'before', before))
+        for variant, function in variants:
+            after = per_call(function, argument)
+            print('%20s %10s %10.2f %9.1fx' % ('', variant, after,
+                                               before / after))
+
+
+if __name__ == '__main__':
+    main()
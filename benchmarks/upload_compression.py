@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark for gzip-compressed episode action uploads
+
+Uploads batches of episode actions to a local stand-in server that
+accepts gzip-compressed request bodies, with and without compression,
+and reports the bytes on the wire and the wall time for each upload.
+
+    python benchmarks/upload_compression.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mygpoclient import api  # noqa: E402
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    wire_bytes = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['content-length']))
+        self.server.wire_bytes = len(data)
+        if self.headers.get('content-encoding') == 'gzip':
+            data = gzip.decompress(data)
+        json.loads(data.decode('utf-8'))
+
+        body = b'{"timestamp": 1262103016}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(*args):
+        pass
+
+
+def make_actions(count, podcasts=200, devices=5):
+    """Create realistic actions (repeated podcast URLs and devices)"""
+    actions = []
+    for i in range(count):
+        podcast = 'http://feeds.example.com/podcast-%d/feed.rss' % (
+            i % podcasts)
+        episode = 'http://media.example.com/podcast-%d/episode-%d.mp3' % (
+            i % podcasts, i)
+        device = 'device-%d' % (i % devices)
+        timestamp = '2019-%02d-%02dT%02d:%02d:%02d' % (
+            i % 12 + 1, i % 28 + 1, i % 24, i % 60, i % 60)
+        actions.append(api.EpisodeAction(podcast, episode, 'play', device,
+                                         timestamp, 0, i % 3600, 3600))
+    return actions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--threshold', type=int, default=1024,
+                        help='compress_threshold for compressed uploads')
+    args = parser.parse_args()
+
+    server = StandInServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    root_url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    print('%10s %12s %14s %10s' % ('actions', 'mode', 'wire bytes',
+                                   'seconds'))
+    for size in args.sizes:
+        actions = make_actions(size)
+        for mode, threshold in (('raw', None), ('gzip', args.threshold)):
+            client = api.MygPodderClient('user', 'secret', root_url,
+                                         compress_threshold=threshold)
+            start = time.time()
+            client.upload_episode_actions(actions)
+            elapsed = time.time() - start
+            print('%10d %12s %14d %10.3f' % (size, mode, server.wire_bytes,
+                                             elapsed))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,730 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""asyncio flavour of the gpodder.net API client
+
+The classes in this module mirror HttpClient, JsonClient, SimpleClient,
+PublicClient and MygPodderClient method-for-method, except that every
+method that talks to the webservice is a coroutine. URIs are built by
+the same Locator and results are the same model objects, so that a
+single event loop can run many syncs concurrently:
+
+    client = AsyncMygPodderClient('john', 'secret')
+    devices = await client.get_devices()
+    await client.close()
+
+Responses are always read completely and request bodies are always
+sent in one piece, so the streaming iter_* methods and streamed uploads
+of the blocking clients are not available here.
+
+This module requires Python 3.
+"""
+
+import asyncio
+import base64
+import functools
+import io
+import ssl
+
+from http import client as httplib
+from http.cookiejar import CookieJar
+from urllib.error import URLError
+from urllib.parse import urljoin, urlsplit
+
+import mygpoclient
+
+from mygpoclient import api
+from mygpoclient import http
+from mygpoclient import json
+from mygpoclient import public
+from mygpoclient import ratelimit
+from mygpoclient import retry
+from mygpoclient import simple
+
+
+class AsyncConnectionPool(object):
+    """Pool of idle keep-alive connections for AsyncHttpClient
+
+    This is the asyncio equivalent of http.ConnectionPool: at most
+    maxsize idle connections are kept per host, and connections that
+    have been idle for more than idle_timeout seconds are closed. A pool
+    can be shared by clients running in the same event loop.
+    """
+    DEFAULT_MAXSIZE = http.ConnectionPool.DEFAULT_MAXSIZE
+    DEFAULT_IDLE_TIMEOUT = http.ConnectionPool.DEFAULT_IDLE_TIMEOUT
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+
+    def get(self, key):
+        """Get an idle (reader, writer) pair for key, or None"""
+        now = http._now()
+        connections = self._idle.get(key, [])
+        while connections:
+            (reader, writer), released = connections.pop()
+            if now - released > self.idle_timeout:
+                for (_, w), _ in connections:
+                    w.close()
+                del connections[:]
+                writer.close()
+            elif reader.at_eof() or writer.is_closing():
+                writer.close()
+            else:
+                return reader, writer
+
+        return None
+
+    def put(self, key, connection):
+        """Return a connection with no outstanding response to the pool"""
+        connections = self._idle.setdefault(key, [])
+        if len(connections) < self.maxsize:
+            connections.append((connection, http._now()))
+        else:
+            connection[1].close()
+
+    def clear(self):
+        """Close all idle connections"""
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for (_, writer), _ in connections:
+                writer.close()
+
+
+class AsyncHttpResponse(io.BytesIO):
+    """A completely received response of AsyncHttpClient
+
+    Provides the parts of the http.client.HTTPResponse interface used
+    by the clients (read, headers, status and info for cookie handling).
+    """
+
+    def __init__(self, url, status, reason, headers, body):
+        io.BytesIO.__init__(self, body)
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.status
+
+
+async def _read_response(reader, method, timeout=None):
+    """Read a HTTP/1.x response from reader
+
+    Returns (status, reason, headers, body, will_close). The body is
+    decoded from its Content-Encoding block by block while reading.
+    Every read from the server has to finish within timeout seconds,
+    otherwise asyncio.TimeoutError is raised.
+    """
+    async def read(coroutine):
+        return await asyncio.wait_for(coroutine, timeout)
+
+    while True:
+        line = await read(reader.readline())
+        if not line:
+            raise httplib.RemoteDisconnected(
+                'Remote end closed connection without response')
+
+        parts = line.decode('iso-8859-1').rstrip('\r\n').split(' ', 2)
+        try:
+            version, status = parts[0], int(parts[1])
+        except (IndexError, ValueError):
+            raise httplib.BadStatusLine(line)
+        reason = parts[2] if len(parts) > 2 else ''
+
+        lines = []
+        while True:
+            header = await read(reader.readline())
+            lines.append(header)
+            if header in (b'\r\n', b'\n', b''):
+                break
+        headers = httplib.parse_headers(io.BytesIO(b''.join(lines)))
+
+        # Skip informational responses such as "100 Continue"
+        if not 100 <= status < 200:
+            break
+
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        will_close = 'keep-alive' not in connection
+    else:
+        will_close = 'close' in connection
+
+    decoder = http.ContentDecoder(headers.get('content-encoding'))
+    del headers['content-encoding']
+    body = []
+    if method == 'HEAD' or status in (204, 304):
+        pass
+    elif 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            size = await read(reader.readline())
+            size = int(size.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # Skip the trailer up to and including the empty line
+                trailer = None
+                while trailer not in (b'\r\n', b'\n', b''):
+                    trailer = await read(reader.readline())
+                break
+            data = await read(reader.readexactly(size))
+            body.append(decoder.decode(data))
+            await read(reader.readexactly(2))
+    elif headers.get('content-length') is not None:
+        remaining = int(headers['content-length'])
+        while remaining:
+            data = await read(reader.readexactly(min(remaining,
+                                                     http.CHUNK_SIZE)))
+            remaining -= len(data)
+            body.append(decoder.decode(data))
+    else:
+        while True:
+            data = await read(reader.read(http.CHUNK_SIZE))
+            if not data:
+                break
+            body.append(decoder.decode(data))
+        will_close = True
+
+    body.append(decoder.flush())
+    body = b''.join(body)
+
+    return status, reason.strip(), headers, body, will_close
+
+
+async def _with_deadline(coroutine, deadline):
+    """Await coroutine, raising http.RequestTimeout after deadline seconds"""
+    if deadline is None:
+        return await coroutine
+
+    try:
+        return await asyncio.wait_for(coroutine, deadline)
+    except asyncio.TimeoutError:
+        raise http.RequestTimeout('deadline exceeded')
+
+
+def _accepts_deadline(f):
+    """asyncio equivalent of http.accepts_deadline"""
+
+    @functools.wraps(f)
+    def _wrapper(*args, **kwargs):
+        deadline = kwargs.pop('deadline', None)
+        return _with_deadline(f(*args, **kwargs), deadline)
+
+    return _wrapper
+
+
+class AsyncHttpClient(object):
+    """asyncio equivalent of http.HttpClient
+
+    Requests are sent over pooled HTTP/1.1 keep-alive connections.
+    Credentials are sent with every request (pre-emptive Basic auth),
+    cookies are kept in a cookie jar and redirects are followed in the
+    same way as urllib does it. HTTP errors are mapped to the exceptions
+    of the http module (NotFound, Unauthorized, BadRequest and
+    UnknownResponse). Timeouts and deadlines work like in HttpClient and
+    raise RequestTimeout.
+    """
+
+    # The maximum number of redirects followed for a single request
+    MAX_REDIRECTS = 10
+
+    def __init__(self, username=None, password=None, pool=None,
+                 cookie_jar=None, compress_threshold=None, retry_policy=None,
+                 rate_limiter=None, connect_timeout=None, read_timeout=None,
+                 deadline=None, ssl_context=None):
+        self._username = username
+        self._password = password
+        self._compress_threshold = compress_threshold
+        self._retry_policy = retry_policy
+        self._rate_limiter = rate_limiter
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._deadline = deadline
+        if cookie_jar is None:
+            cookie_jar = CookieJar()
+        self._cookie_jar = cookie_jar
+        if pool is None:
+            pool = AsyncConnectionPool()
+        self._pool = pool
+        self._ssl_context = ssl_context
+
+    _prepare_request = staticmethod(http.HttpClient._prepare_request)
+
+    _process_response = staticmethod(http.HttpClient._process_response)
+
+    _compress_request = http.HttpClient._compress_request
+
+    def _authorization(self):
+        credentials = '%s:%s' % (self._username, self._password)
+        credentials = base64.b64encode(credentials.encode('utf-8'))
+        return 'Basic ' + credentials.decode('ascii')
+
+    async def _connect(self, scheme, host, port):
+        context = None
+        if scheme == 'https':
+            context = self._ssl_context or ssl.create_default_context()
+        return await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=context),
+            self._connect_timeout)
+
+    async def _send(self, request):
+        """Send a request and receive its response on a pooled connection"""
+        parts = urlsplit(request.full_url)
+        if not parts.hostname:
+            raise URLError('no host given')
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+
+        headers = dict(request.unredirected_hdrs)
+        headers.update((k, v) for k, v in request.headers.items()
+                       if k not in headers)
+        headers['Host'] = parts.netloc.rsplit('@', 1)[-1]
+        headers['Connection'] = 'keep-alive'
+        if request.data is not None:
+            headers['Content-Length'] = str(len(request.data))
+        selector = request.selector or '/'
+        head = ['%s %s HTTP/1.1' % (request.get_method(), selector)]
+        head.extend('%s: %s' % (name.title(), value)
+                    for name, value in headers.items())
+        data = ('\r\n'.join(head) + '\r\n\r\n').encode('iso-8859-1')
+        if request.data is not None:
+            data += request.data
+
+        while True:
+            connection = self._pool.get(key)
+            reused = connection is not None
+            if connection is None:
+                try:
+                    connection = await self._connect(parts.scheme,
+                                                     parts.hostname, port)
+                except asyncio.TimeoutError:
+                    raise http.RequestTimeout('connect timed out')
+                except OSError as err:
+                    raise URLError(err)
+
+            reader, writer = connection
+            try:
+                writer.write(data)
+                await asyncio.wait_for(writer.drain(), self._read_timeout)
+                status, reason, response_headers, body, will_close = \
+                    await _read_response(reader, request.get_method(),
+                                         self._read_timeout)
+            except (ConnectionError, httplib.BadStatusLine,
+                    asyncio.IncompleteReadError) as err:
+                writer.close()
+                if reused:
+                    continue
+                raise URLError(err)
+            except asyncio.TimeoutError:
+                writer.close()
+                raise http.RequestTimeout('read timed out')
+            except BaseException:
+                writer.close()
+                raise
+
+            break
+
+        if will_close:
+            writer.close()
+        else:
+            self._pool.put(key, connection)
+
+        return AsyncHttpResponse(request.full_url, status, reason,
+                                 response_headers, body)
+
+    _handle_response = http.HttpClient._handle_response
+
+    def _build_request(self, method, uri, data, headers):
+        request = self._prepare_request(method, uri, data)
+        self._compress_request(request)
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        if self._username is not None and self._password is not None:
+            request.add_unredirected_header('Authorization',
+                                            self._authorization())
+        return request
+
+    async def _acquire_token(self, host):
+        """Wait for a token of the rate limiter without blocking the loop"""
+        limiter = self._rate_limiter
+        waited = 0
+        while True:
+            delay = limiter.poll(host)
+            if delay == 0:
+                return
+
+            if not limiter.blocking or (limiter.timeout is not None and
+                                        waited + delay > limiter.timeout):
+                raise ratelimit.RateLimitExceeded(host)
+
+            await asyncio.sleep(delay)
+            waited += delay
+
+    async def _open(self, request):
+        """Send a request, following redirects like urllib does"""
+        netloc = urlsplit(request.full_url).netloc
+        for _ in range(self.MAX_REDIRECTS + 1):
+            self._cookie_jar.add_cookie_header(request)
+            response = await self._send(request)
+            self._cookie_jar.extract_cookies(response, request)
+
+            location = response.headers.get('location')
+            method = request.get_method()
+            if response.status not in (301, 302, 303, 307, 308) or \
+                    not location:
+                break
+
+            # Same rules as urllib.request.HTTPRedirectHandler
+            if response.status in (301, 302, 303) and method == 'POST':
+                request.data = None
+                request.set_method('GET')
+                request.remove_header('Content-type')
+                request.remove_header('Content-encoding')
+            elif method not in ('GET', 'HEAD'):
+                break
+            target = urljoin(request.full_url, location)
+            if urlsplit(target).netloc != netloc:
+                # Don't send the credentials to a different server
+                request.remove_header('Authorization')
+            request.full_url = target
+            request.remove_header('Cookie')
+
+        return response
+
+    async def _request(self, method, uri, data, headers=None, **kwargs):
+        """Request and exception handling
+
+        Carries out a request with a given method (GET, POST, PUT) on
+        a given URI with optional data (data only makes sense for POST
+        and PUT requests and should be None for GET requests).
+
+        Failed requests are retried according to the retry policy in
+        the same way as HttpClient does it.
+        """
+        return await _with_deadline(
+            self._send_with_retries(method, uri, data, headers),
+            self._deadline)
+
+    async def _send_with_retries(self, method, uri, data, headers):
+        policy = self._retry_policy
+        host = urlsplit(uri).netloc
+        started = http._now()
+        attempt = 0
+        while True:
+            attempt += 1
+            status = retry_after = None
+            # As in HttpClient._send: no trial request is left pending
+            checked = False
+            try:
+                if policy is not None:
+                    policy.check(host)
+                    checked = True
+                if self._rate_limiter is not None:
+                    await self._acquire_token(host)
+                response = await self._open(
+                    self._build_request(method, uri, data, headers))
+                status = response.status
+                if 200 <= status < 300:
+                    if policy is not None:
+                        policy.record(host, status)
+                        checked = False
+                    return self._handle_response(method, uri, response)
+                retry_after = response.headers.get('Retry-After')
+                error = http._status_error(status)
+            except (httplib.HTTPException, OSError,
+                    http.RequestTimeout) as network_error:
+                error = network_error
+            except Exception as error:
+                # Not retried, e.g. an open circuit or an undecodable body
+                error.attempts = attempt
+                raise
+            finally:
+                if checked:
+                    policy.release(host)
+
+            error.attempts = attempt
+            if policy is None:
+                raise error
+
+            policy.record(host, status)
+            delay = policy.next_delay(method, status, attempt,
+                                      http._now() - started,
+                                      retry.parse_retry_after(retry_after))
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+
+    async def GET(self, uri):
+        """Convenience method for carrying out a GET request"""
+        return await self._request('GET', uri, None)
+
+    async def POST(self, uri, data):
+        """Convenience method for carrying out a POST request"""
+        return await self._request('POST', uri, data)
+
+    async def PUT(self, uri, data):
+        """Convenience method for carrying out a PUT request"""
+        return await self._request('PUT', uri, data)
+
+    async def close(self):
+        """Close all idle connections of this client's pool"""
+        self._pool.clear()
+
+
+class AsyncJsonClient(AsyncHttpClient):
+    """asyncio equivalent of json.JsonClient"""
+
+    encode = staticmethod(json.JsonClient.encode)
+
+    decode = staticmethod(json.JsonClient.decode)
+
+    _prepare_request = staticmethod(json.JsonClient._prepare_request)
+
+    _process_response = staticmethod(json.JsonClient._process_response)
+
+    _cache_key = json.JsonClient._cache_key
+
+    _conditional_headers = json.JsonClient._conditional_headers
+
+    _handle_response = json.JsonClient._handle_response
+
+    def __init__(self, username=None, password=None, cache=None, **kwargs):
+        AsyncHttpClient.__init__(self, username, password, **kwargs)
+        self._cache = cache
+
+    async def GET(self, uri):
+        if self._cache is None:
+            return await AsyncHttpClient.GET(self, uri)
+
+        cached = self._cache.get(self._cache_key(uri))
+        if cached is None:
+            return await self._request('GET', uri, None)
+
+        try:
+            return await self._request('GET', uri, None,
+                                       self._conditional_headers(cached))
+        except http.NotModified:
+            return cached[2]
+
+
+class AsyncSimpleClient(simple.SimpleClient):
+    """asyncio equivalent of simple.SimpleClient"""
+
+    def __init__(self, username, password, root_url=mygpoclient.ROOT_URL,
+                 client_class=AsyncJsonClient, **kwargs):
+        simple.SimpleClient.__init__(self, username, password, root_url,
+                                     client_class, **kwargs)
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def get_subscriptions(self, device_id):
+        uri = self._locator.subscriptions_uri(device_id, self.FORMAT)
+        return await self._client.GET(uri)
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def put_subscriptions(self, device_id, urls):
+        uri = self._locator.subscriptions_uri(device_id, self.FORMAT)
+        return (await self._client.PUT(uri, urls)) is None
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def get_suggestions(self, count=10):
+        uri = self._locator.suggestions_uri(count, self.FORMAT)
+        return simple.PODCAST_SCHEMA.build_list(
+            await self._client.GET(uri))
+
+    async def close(self):
+        """Close the idle connections of the underlying client"""
+        await self._client.close()
+
+
+def _not_streaming(name, replacement):
+    """Replace a streaming iter_* method of the blocking clients
+
+    Responses are read completely here, so the method raises
+    NotImplementedError, which names the coroutine to use instead.
+    """
+    def method(self, *args, **kwargs):
+        raise NotImplementedError('%s is not available in asyncio clients, '
+                                  'use %s instead' % (name, replacement))
+    method.__name__ = name
+    return method
+
+
+class AsyncPublicClient(public.PublicClient):
+    """asyncio equivalent of public.PublicClient"""
+
+    def __init__(self, root_url=mygpoclient.ROOT_URL,
+                 client_class=AsyncJsonClient, **kwargs):
+        public.PublicClient.__init__(self, root_url, client_class, **kwargs)
+
+    @_accepts_deadline
+    async def get_toplist(self, count=mygpoclient.TOPLIST_DEFAULT):
+        uri = self._locator.toplist_uri(count, self.FORMAT)
+        return simple.PODCAST_SCHEMA.build_list(
+            await self._client.GET(uri))
+
+    @_accepts_deadline
+    async def search_podcasts(self, query):
+        uri = self._locator.search_uri(query, self.FORMAT)
+        return simple.PODCAST_SCHEMA.build_list(
+            await self._client.GET(uri))
+
+    @_accepts_deadline
+    async def get_podcasts_of_a_tag(self, tag,
+                                    count=mygpoclient.TOPLIST_DEFAULT):
+        uri = self._locator.podcasts_of_a_tag_uri(tag, count)
+        return simple.PODCAST_SCHEMA.build_list(
+            await self._client.GET(uri))
+
+    iter_toplist = _not_streaming('iter_toplist', 'get_toplist')
+    iter_search_podcasts = _not_streaming('iter_search_podcasts',
+                                          'search_podcasts')
+    iter_podcasts_of_a_tag = _not_streaming('iter_podcasts_of_a_tag',
+                                            'get_podcasts_of_a_tag')
+
+    @_accepts_deadline
+    async def get_toptags(self, count=mygpoclient.TOPLIST_DEFAULT):
+        uri = self._locator.toptags_uri(count)
+        return public.TAG_SCHEMA.build_list(await self._client.GET(uri))
+
+    @_accepts_deadline
+    async def get_podcast_data(self, podcast_uri):
+        uri = self._locator.podcast_data_uri(podcast_uri)
+        return simple.PODCAST_SCHEMA.build(await self._client.GET(uri))
+
+    @_accepts_deadline
+    async def get_episode_data(self, podcast_uri, episode_uri):
+        uri = self._locator.episode_data_uri(podcast_uri, episode_uri)
+        return public.EPISODE_SCHEMA.build(await self._client.GET(uri))
+
+    async def close(self):
+        """Close the idle connections of the underlying client"""
+        await self._client.close()
+
+
+class AsyncMygPodderClient(AsyncSimpleClient):
+    """asyncio equivalent of api.MygPodderClient"""
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def get_subscriptions(self, device):
+        device = getattr(device, 'device_id', device)
+        return await AsyncSimpleClient.get_subscriptions(self, device)
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def put_subscriptions(self, device, urls):
+        device = getattr(device, 'device_id', device)
+        return await AsyncSimpleClient.put_subscriptions(self, device, urls)
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def update_subscriptions(self, device_id, add_urls=[],
+                                   remove_urls=[]):
+        uri = self._locator.add_remove_subscriptions_uri(device_id)
+        data = api._subscription_update(add_urls, remove_urls)
+        return api._parse_update_result(await self._client.POST(uri, data))
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def sync_subscriptions(self, device_id, urls, known_urls=None):
+        device_id = getattr(device_id, 'device_id', device_id)
+        if known_urls is None:
+            urls = api._url_list(urls, 'urls')
+            if not await self.put_subscriptions(device_id, urls):
+                return api.SyncResult(None, [], None)
+            return api.SyncResult(set(urls), [], None)
+
+        add_urls, remove_urls = api._subscription_delta(urls, known_urls)
+        if not add_urls and not remove_urls:
+            return api.SyncResult(known_urls, [], None)
+
+        result = await self.update_subscriptions(device_id, add_urls,
+                                                 remove_urls)
+        api._apply_subscription_update(known_urls, add_urls, remove_urls,
+                                       result)
+        return api.SyncResult(known_urls, result.update_urls, result.since)
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def pull_subscriptions(self, device_id, since=None):
+        uri = self._locator.subscription_updates_uri(device_id, since)
+        return api._parse_subscription_changes(await self._client.GET(uri))
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def upload_episode_actions(self, actions=[]):
+        uri = self._locator.upload_episode_actions_uri()
+        data = api.EPISODE_ACTION_ENCODER.encode(actions)
+        return api._parse_timestamp(await self._client.POST(uri, data))
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def download_episode_actions(self, since=None,
+                                       podcast=None, device_id=None):
+        uri = self._locator.download_episode_actions_uri(since,
+                                                         podcast, device_id)
+        return api._parse_episode_action_changes(
+            await self._client.GET(uri))
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def update_device_settings(self, device_id, caption=None,
+                                     type=None):
+        uri = self._locator.device_settings_uri(device_id)
+        data = api._device_settings(caption, type)
+        return (await self._client.POST(uri, data)) is None
+
+    @_accepts_deadline
+    @simple.needs_credentials
+    async def get_devices(self):
+        uri = self._locator.device_list_uri()
+        return api._parse_devices(await self._client.GET(uri))
+
+    @_accepts_deadline
+    async def get_favorite_episodes(self):
+        uri = self._locator.favorite_episodes_uri()
+        return public.EPISODE_SCHEMA.build_list(
+            await self._client.GET(uri))
+
+    @_accepts_deadline
+    async def get_settings(self, type, scope_param1=None, scope_param2=None):
+        uri = self._locator.settings_uri(type, scope_param1, scope_param2)
+        return await self._client.GET(uri)
+
+    @_accepts_deadline
+    async def set_settings(self, type, scope_param1,
+                           scope_param2, set={}, remove=[]):
+        uri = self._locator.settings_uri(type, scope_param1, scope_param2)
+        data = api.SETTINGS_ENCODER.encode_values((set, remove))
+        return await self._client.POST(uri, data)
+
+
+# Copy the documentation of the blocking methods to their async mirrors
+for _async_class, _class in ((AsyncSimpleClient, simple.SimpleClient),
+                             (AsyncPublicClient, public.PublicClient),
+                             (AsyncMygPodderClient, api.MygPodderClient)):
+    for _name, _method in vars(_async_class).items():
+        _blocking = getattr(_class, _name, None)
+        if _method.__doc__ is None and _blocking is not None:
+            _method.__doc__ = _blocking.__doc__
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import base64
+import gzip
+import json
+
+from mygpoclient import aio
+from mygpoclient import api
+from mygpoclient import cache
+from mygpoclient import http
+from mygpoclient import ratelimit
+from mygpoclient import retry
+from mygpoclient import simple
+from mygpoclient.json import JsonException
+
+import unittest
+
+USERNAME = 'john'
+PASSWORD = 'secret'
+
+SUBSCRIPTIONS = ['http://example.com/test.rss',
+                 'http://feeds.example.org/1/feed.atom']
+
+TOPTAGS = [{'tag': 'linux', 'usage': 42}, {'tag': 'music', 'usage': 23}]
+
+DEVICES = [{'id': 'n900', 'caption': 'Phone', 'type': 'mobile',
+            'subscriptions': 2}]
+
+ACTIONS = {'timestamp': 1262103016, 'actions': [
+    {'podcast': SUBSCRIPTIONS[0], 'episode': 'http://example.com/1.mp3',
+     'action': 'play', 'position': 10, 'started': 0, 'total': 100,
+     'timestamp': '2009-12-12T09:00:00'},
+]}
+
+
+class StandInServer(object):
+    """Minimal asyncio gpodder.net stand-in speaking HTTP/1.1"""
+
+    def __init__(self):
+        self.connections = 0
+        self.storage = {}
+        self.flaky = 2
+        self.etag_requests = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle,
+                                                  '127.0.0.1', 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return 'http://127.0.0.1:%d' % port
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _route(self, method, path, headers, body):
+        authorization = 'Basic ' + base64.b64encode(
+            ('%s:%s' % (USERNAME, PASSWORD)).encode('utf-8')).decode('ascii')
+        if path == '/flaky':
+            self.flaky -= 1
+            if self.flaky >= 0:
+                return 503, {'Retry-After': '0'}, b''
+            return 200, {}, b'"OK"'
+        if path == '/slow':
+            return 200, {}, b'"OK"'
+        if path == '/corrupt':
+            return 200, {'Content-Encoding': 'gzip'}, b'not gzip at all'
+        if path == '/invalidjson':
+            return 200, {}, b'not json at all'
+        if path == '/etag':
+            self.etag_requests += 1
+            if headers.get('if-none-match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, b''
+            return 200, {'ETag': '"v1"'}, json.dumps(TOPTAGS).encode('utf-8')
+        if path.startswith('/redirect'):
+            return 302, {'Location': path[len('/redirect'):]}, b''
+        if path == '/api/2/tags/2.json':
+            body = json.dumps(TOPTAGS).encode('utf-8')
+            if 'gzip' in headers.get('accept-encoding', ''):
+                return 200, {'Content-Encoding': 'gzip'}, gzip.compress(body)
+            return 200, {}, body
+        if headers.get('authorization') != authorization:
+            return 401, {}, b''
+        if path.startswith('/subscriptions/john/'):
+            if method == 'PUT':
+                self.storage[path] = body
+                return 200, {}, b''
+            return 200, {}, self.storage.get(
+                path, json.dumps(SUBSCRIPTIONS).encode('utf-8'))
+        if path == '/api/2/devices/john.json':
+            return 200, {}, json.dumps(DEVICES).encode('utf-8')
+        if path.startswith('/api/2/episodes/john.json'):
+            if method == 'POST':
+                return 200, {}, b'{"timestamp": 1262103017}'
+            return 200, {}, json.dumps(ACTIONS).encode('utf-8')
+        return 404, {}, b''
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode('ascii').split(' ', 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b''):
+                        break
+                    name, value = header.decode('ascii').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get('content-length', 0)))
+                if path == '/slow':
+                    await asyncio.sleep(1)
+                status, extra, body = self._route(method, path, headers,
+                                                  body)
+                head = ['HTTP/1.1 %d Stand-In' % status,
+                        'Content-Length: %d' % len(body)]
+                head.extend('%s: %s' % item for item in extra.items())
+                writer.write(('\r\n'.join(head) + '\r\n\r\n')
+                             .encode('ascii') + body)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+class Test_AsyncMygPodderClient(unittest.TestCase):
+
+    def run_with_server(self, test):
+        async def main():
+            server = StandInServer()
+            root_url = await server.start()
+            client = aio.AsyncMygPodderClient(USERNAME, PASSWORD, root_url)
+            try:
+                return await test(server, client, root_url)
+            finally:
+                await client.close()
+                await server.stop()
+
+        return asyncio.run(main())
+
+    def test_getSubscriptions(self):
+        async def test(server, client, root_url):
+            self.assertEqual(await client.get_subscriptions('n900'),
+                             SUBSCRIPTIONS)
+
+        self.run_with_server(test)
+
+    def test_putSubscriptions_thenGetSubscriptions(self):
+        async def test(server, client, root_url):
+            device = api.PodcastDevice('n900', 'Phone', 'mobile', 0)
+            self.assertTrue(await client.put_subscriptions(device,
+                                                           SUBSCRIPTIONS[:1]))
+            self.assertEqual(await client.get_subscriptions(device),
+                             SUBSCRIPTIONS[:1])
+
+        self.run_with_server(test)
+
+    def test_getDevices_returnsPodcastDevices(self):
+        async def test(server, client, root_url):
+            devices = await client.get_devices()
+            self.assertEqual([d.device_id for d in devices], ['n900'])
+
+        self.run_with_server(test)
+
+    def test_episodeActions(self):
+        async def test(server, client, root_url):
+            changes = await client.download_episode_actions()
+            self.assertEqual(changes.since, 1262103016)
+            self.assertEqual(changes.actions[0].position, 10)
+            since = await client.upload_episode_actions(changes.actions)
+            self.assertEqual(since, 1262103017)
+
+        self.run_with_server(test)
+
+    def test_connectionIsReused(self):
+        async def test(server, client, root_url):
+            for _ in range(5):
+                await client.get_devices()
+            self.assertEqual(server.connections, 1)
+
+        self.run_with_server(test)
+
+    def test_concurrentRequests(self):
+        async def test(server, client, root_url):
+            results = await asyncio.gather(
+                *(client.get_subscriptions('n900') for _ in range(100)))
+            self.assertEqual(results, [SUBSCRIPTIONS] * 100)
+
+        self.run_with_server(test)
+
+    def test_notFound(self):
+        async def test(server, client, root_url):
+            with self.assertRaises(http.NotFound):
+                await client.get_settings('account')
+
+        self.run_with_server(test)
+
+    def test_corruptBody_raisesUnknownResponse(self):
+        async def test(server, client, root_url):
+            with self.assertRaises(http.UnknownResponse) as context:
+                await client._client.GET(root_url + '/corrupt')
+            self.assertEqual(context.exception.attempts, 1)
+
+        self.run_with_server(test)
+
+    def test_invalidJson_reportsAttempts(self):
+        async def test(server, client, root_url):
+            with self.assertRaises(JsonException) as context:
+                await client._client.GET(root_url + '/invalidjson')
+            self.assertEqual(context.exception.attempts, 1)
+
+        self.run_with_server(test)
+
+    def test_wrongPassword_raisesUnauthorized(self):
+        async def test(server, client, root_url):
+            client = aio.AsyncMygPodderClient(USERNAME, 'wrong', root_url)
+            with self.assertRaises(http.Unauthorized):
+                await client.get_devices()
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_retryPolicy_retriesServerErrors(self):
+        async def test(server, client, root_url):
+            client = aio.AsyncJsonClient(
+                retry_policy=retry.RetryPolicy(backoff_base=0))
+            self.assertEqual(await client.GET(root_url + '/flaky'), 'OK')
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_rateLimiter_waitsForTokens(self):
+        async def test(server, client, root_url):
+            limiter = ratelimit.RateLimiter(rate=100, burst=1)
+            client = aio.AsyncPublicClient(root_url, rate_limiter=limiter)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await asyncio.gather(*(client.get_toptags(2) for _ in range(5)))
+            self.assertGreaterEqual(loop.time() - start, 0.03)
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_rateLimiter_nonBlocking_raisesRateLimitExceeded(self):
+        async def test(server, client, root_url):
+            limiter = ratelimit.RateLimiter(rate=0.001, burst=1,
+                                            blocking=False)
+            client = aio.AsyncPublicClient(root_url, rate_limiter=limiter)
+            await client.get_toptags(2)
+            with self.assertRaises(ratelimit.RateLimitExceeded):
+                await client.get_toptags(2)
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_readTimeout_raisesRequestTimeout(self):
+        async def test(server, client, root_url):
+            client = aio.AsyncJsonClient(read_timeout=.2)
+            with self.assertRaises(http.RequestTimeout):
+                await client.GET(root_url + '/slow')
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_deadline_raisesRequestTimeout(self):
+        async def test(server, client, root_url):
+            policy = retry.RetryPolicy(backoff_base=0)
+            client = aio.AsyncJsonClient(read_timeout=.2, deadline=.5,
+                                         retry_policy=policy)
+            start = asyncio.get_running_loop().time()
+            with self.assertRaises(http.RequestTimeout):
+                await client.GET(root_url + '/slow')
+            self.assertLess(asyncio.get_running_loop().time() - start, .9)
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_cancelledTrialRequest_doesNotBlockCircuit(self):
+        async def test(server, client, root_url):
+            breaker = retry.CircuitBreaker(failure_threshold=1,
+                                           reset_timeout=.1)
+            policy = retry.RetryPolicy(max_attempts=1,
+                                       circuit_breaker=breaker)
+            client = aio.AsyncJsonClient(read_timeout=.2,
+                                         retry_policy=policy)
+            with self.assertRaises(http.RequestTimeout):
+                await client.GET(root_url + '/slow')
+
+            # The deadline cancels the trial request while it waits
+            await asyncio.sleep(.15)
+            hasty = aio.AsyncJsonClient(deadline=.1, retry_policy=policy)
+            with self.assertRaises(http.RequestTimeout):
+                await hasty.GET(root_url + '/slow')
+            self.assertEqual(await client.GET(root_url + '/api/2/tags/2.json'),
+                             TOPTAGS)
+            await client.close()
+            await hasty.close()
+
+        self.run_with_server(test)
+
+    def test_deadline_perCall(self):
+        async def test(server, client, root_url):
+            devices = await client.get_devices(deadline=5)
+            self.assertEqual([d.device_id for d in devices], ['n900'])
+            with self.assertRaises(http.RequestTimeout):
+                await client.get_devices(deadline=0)
+
+        self.run_with_server(test)
+
+    def test_cache_servesNotModifiedFromCache(self):
+        async def test(server, client, root_url):
+            client = aio.AsyncJsonClient(cache=cache.MemoryCache())
+            self.assertEqual(await client.GET(root_url + '/etag'), TOPTAGS)
+            self.assertEqual(await client.GET(root_url + '/etag'), TOPTAGS)
+            self.assertEqual(server.etag_requests, 2)
+            await client.close()
+
+        self.run_with_server(test)
+
+    def test_missingCredentials(self):
+        client = aio.AsyncMygPodderClient(None, None)
+        self.assertRaises(simple.MissingCredentials, client.get_devices)
+
+
+class Test_AsyncPublicClient(unittest.TestCase):
+
+    def test_getToptags_followsRedirect(self):
+        async def main():
+            server = StandInServer()
+            root_url = await server.start()
+            client = aio.AsyncPublicClient(root_url)
+            try:
+                tags = await client.get_toptags(2)
+                self.assertEqual([t.tag for t in tags], ['linux', 'music'])
+                tags = await client._client.GET(root_url +
+                                                '/redirect/api/2/tags/2.json')
+                self.assertEqual(tags, TOPTAGS)
+            finally:
+                await client.close()
+                await server.stop()
+
+        asyncio.run(main())
+
+    def test_streamingMethods_areNotAvailable(self):
+        client = aio.AsyncPublicClient()
+        with self.assertRaises(NotImplementedError) as context:
+            client.iter_toplist(10)
+        self.assertIn('get_toplist', str(context.exception))
+        self.assertRaises(NotImplementedError, client.iter_search_podcasts,
+                          'linux')
+        self.assertRaises(NotImplementedError,
+                          client.iter_podcasts_of_a_tag, 'linux')
@@ -15,16 +15,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-try:
-    # Python 2
-    str = unicode
-except BaseException:
-    # Python 3
-    pass
+from concurrent import futures
+
+import collections
+import itertools
+
+import mygpoclient
 
+from mygpoclient import download
+from mygpoclient import http
+from mygpoclient import json
 from mygpoclient import util
 from mygpoclient import simple
 from mygpoclient import public
+from mygpoclient import upload
 
 
 # Additional error types for the advanced API client
@@ -32,6 +36,22 @@ class InvalidResponse(Exception):
     pass
 
 
+class InvalidEpisodeActions(ValueError):
+    """Raised by EpisodeAction.from_dictionaries for invalid actions
+
+    Attributes:
+    errors - List of (index, message) tuples for the invalid actions
+    actions - List of the valid actions, in their original order
+    """
+
+    def __init__(self, errors, actions):
+        index, message = errors[0]
+        ValueError.__init__(self, '%d invalid actions, the first at index '
+                            '%d: %s' % (len(errors), index, message))
+        self.errors = errors
+        self.actions = actions
+
+
 class UpdateResult(object):
     """Container for subscription update results
 
@@ -45,6 +65,23 @@ class UpdateResult(object):
         self.since = since
 
 
+class SyncResult(object):
+    """Container for subscription sync results
+
+    Attributes:
+    urls - The set of URLs on the server (the known_urls for the next
+           sync), or None if the upload of the whole list failed
+    update_urls - A list of (old_url, new_url) tuples
+    since - A timestamp value for use in future requests (None if the
+            whole list was uploaded)
+    """
+
+    def __init__(self, urls, update_urls, since):
+        self.urls = urls
+        self.update_urls = update_urls
+        self.since = since
+
+
 class SubscriptionChanges(object):
     """Container for subscription changes
 
@@ -64,7 +101,8 @@ class EpisodeActionChanges(object):
     """Container for added episode actions
 
     Attributes:
-    actions - A list of EpisodeAction objects
+    actions - A list (or generator, see iter_episode_actions) of
+              EpisodeAction objects
     since - A timestamp value for use in future requests
     """
 
@@ -83,6 +121,7 @@ class PodcastDevice(object):
     subscriptions - The number of podcasts this device is subscribed to
     """
     VALID_TYPES = ('desktop', 'laptop', 'mobile', 'server', 'other')
+    __slots__ = ('device_id', 'caption', 'type', 'subscriptions')
 
     def __init__(self, device_id, caption, type, subscriptions):
         # Check if the device type is valid
@@ -137,12 +176,28 @@ class EpisodeAction(object):
     The attribute "position" is only valid for "play" action types.
     """
     VALID_ACTIONS = ('download', 'play', 'delete', 'new', 'flattr')
+    __slots__ = ('podcast', 'episode', 'action', 'device', 'timestamp',
+                 'started', 'position', 'total')
 
     def __init__(self, podcast, episode, action,
                  device=None, timestamp=None,
                  started=None, position=None, total=None):
+        started, position, total = self._validate(action, timestamp, started,
+                                                  position, total)
+        self.podcast = podcast
+        self.episode = episode
+        self.action = action
+        self.device = device
+        self.timestamp = timestamp
+        self.started = started
+        self.position = position
+        self.total = total
+
+    @classmethod
+    def _validate(cls, action, timestamp, started, position, total):
+        """Check the values of an action, returning the converted numbers"""
         # Check if the action is valid
-        if action not in self.VALID_ACTIONS:
+        if action not in cls.VALID_ACTIONS:
             raise ValueError(
                 'Invalid action type "%s" (see VALID_ACTIONS)' %
                 action)
@@ -160,7 +215,7 @@ class EpisodeAction(object):
 
         # Check the format of the timestamp value
         if timestamp is not None:
-            if util.iso8601_to_datetime(timestamp) is None:
+            if not util.is_iso8601(timestamp):
                 raise ValueError(
                     'Timestamp has to be in ISO 8601 format but was %s' %
                     timestamp)
@@ -196,14 +251,7 @@ class EpisodeAction(object):
                     'Total must be an integer value (seconds) but was %s' %
                     total)
 
-        self.podcast = podcast
-        self.episode = episode
-        self.action = action
-        self.device = device
-        self.timestamp = timestamp
-        self.started = started
-        self.position = position
-        self.total = total
+        return started, position, total
 
     @classmethod
     def from_dictionary(cls, d):
@@ -211,20 +259,252 @@ class EpisodeAction(object):
                    d.get('device'), d.get('timestamp'),
                    d.get('started'), d.get('position'), d.get('total'))
 
+    @classmethod
+    def from_dictionaries(cls, dicts, trusted=False):
+        """Create EpisodeAction objects from many dictionaries at once
+
+        All dictionaries are checked in a single pass. If any of them
+        are invalid, InvalidEpisodeActions is raised at the end, with
+        the errors of all invalid dictionaries (by index) and the
+        actions of the valid ones.
+
+        With trusted=True, only the mandatory keys are checked, and the
+        values are used as they are. This is meant for data that has
+        already been checked, e.g. by the server or when it was queued.
+
+        >>> try:
+        ...     EpisodeAction.from_dictionaries([
+        ...         {'podcast': 'a', 'episode': 'b', 'action': 'play',
+        ...          'position': '10'},
+        ...         {'podcast': 'a', 'episode': 'c', 'action': 'jump'},
+        ...         {'podcast': 'a', 'action': 'new'}])
+        ... except InvalidEpisodeActions as error:
+        ...     print(error.errors)
+        ...     print([action.position for action in error.actions])
+        [(1, 'Invalid action type "jump" (see VALID_ACTIONS)'), (2, "Missing key 'episode'")]
+        [10]
+        """
+        actions = []
+        errors = []
+        validate = cls._validate
+        new = cls.__new__
+        for index, d in enumerate(dicts):
+            try:
+                podcast, episode, action = (d['podcast'], d['episode'],
+                                            d['action'])
+                device, timestamp = d.get('device'), d.get('timestamp')
+                started, position, total = (d.get('started'),
+                                            d.get('position'), d.get('total'))
+                if not trusted:
+                    started, position, total = validate(
+                        action, timestamp, started, position, total)
+            except KeyError as error:
+                errors.append((index, 'Missing key %s' % error))
+                continue
+            except (ValueError, TypeError) as error:
+                errors.append((index, str(error)))
+                continue
+
+            episode_action = new(cls)
+            episode_action.podcast = podcast
+            episode_action.episode = episode
+            episode_action.action = action
+            episode_action.device = device
+            episode_action.timestamp = timestamp
+            episode_action.started = started
+            episode_action.position = position
+            episode_action.total = total
+            actions.append(episode_action)
+
+        if errors:
+            raise InvalidEpisodeActions(errors, actions)
+        return actions
+
     def to_dictionary(self):
-        d = {}
+        return EPISODE_ACTION_ENCODER.to_dict(self)
+
+
+# Expected shapes of the device list and episode action responses
+DEVICE_SCHEMA = json.Schema(PodcastDevice,
+                            ('id', 'caption', 'type', 'subscriptions'),
+                            error=InvalidResponse,
+                            message='Missing keys in device list response')
+
+EPISODE_ACTION_SCHEMA = json.Schema(EpisodeAction,
+                                    ('podcast', 'episode', 'action'),
+                                    ('device', 'timestamp', 'started',
+                                     'position', 'total'),
+                                    error=InvalidResponse,
+                                    message='Missing keys in action list '
+                                            'response',
+                                    interned=('podcast', 'action', 'device'))
+
+# How episode actions are uploaded (see EpisodeAction.to_dictionary)
+EPISODE_ACTION_ENCODER = json.ObjectEncoder(('podcast', 'episode', 'action'),
+                                            ('device', 'timestamp', 'started',
+                                             'position', 'total'))
+
+# How the settings of a device (the caption and type of a PodcastDevice)
+# and other settings are uploaded
+DEVICE_SETTINGS_ENCODER = json.ObjectEncoder((), ('caption', 'type'))
+SETTINGS_ENCODER = json.ObjectEncoder(('set', 'remove'))
+
+
+# Request and response handling shared by the blocking and asyncio clients
+def _url_list(urls, name):
+    """Get a list of the URLs in an iterable, checking that they're str"""
+    if not isinstance(urls, str):
+        urls = list(urls)
+        if all(map(str.__instancecheck__, urls)):
+            return urls
+
+    raise ValueError('%s must be a list of strings but was %s' % (name, urls))
+
+
+def _subscription_update(add_urls, remove_urls):
+    return {'add': _url_list(add_urls, 'add_urls'),
+            'remove': _url_list(remove_urls, 'remove_urls')}
+
+
+def _subscription_delta(urls, known_urls):
+    """Get the URLs to add and to remove to get from known_urls to urls
+
+    >>> _subscription_delta(['a', 'b', 'c'], {'c', 'd'})
+    (['a', 'b'], ['d'])
+    """
+    urls = set(_url_list(urls, 'urls'))
+    return sorted(urls.difference(known_urls)), sorted(
+        known_urls.difference(urls))
+
+
+def _apply_subscription_update(known_urls, add_urls, remove_urls, result):
+    """Update the set of URLs on the server after uploading changes
+
+    The URLs that the server rewrote (see UpdateResult) are replaced,
+    and those it rejected (rewritten to an empty URL) are removed.
+
+    >>> known_urls = {'a', 'b'}
+    >>> _apply_subscription_update(known_urls, ['c ', 'x'], ['b'],
+    ...                            UpdateResult([('c ', 'c'), ('x', '')], 1))
+    >>> sorted(known_urls)
+    ['a', 'c']
+    """
+    known_urls.difference_update(remove_urls)
+    known_urls.update(add_urls)
+    for old_url, new_url in result.update_urls:
+        if old_url != new_url:
+            known_urls.discard(old_url)
+            if new_url:
+                known_urls.add(new_url)
+
+
+def _parse_timestamp(response):
+    if response is None:
+        raise InvalidResponse('Got empty response')
+
+    if 'timestamp' not in response:
+        raise InvalidResponse('Response does not contain timestamp')
+
+    try:
+        return int(response['timestamp'])
+    except ValueError:
+        raise InvalidResponse(
+            'Invalid value %s for timestamp in response' %
+            response['timestamp'])
+
+
+def _parse_update_result(response):
+    since = _parse_timestamp(response)
+
+    if 'update_urls' not in response:
+        raise InvalidResponse('Response does not contain update_urls')
+
+    try:
+        update_urls = [(a, b) for a, b in response['update_urls']]
+    except BaseException:
+        raise InvalidResponse(
+            'Invalid format of update_urls in response: %s' %
+            response['update_urls'])
+
+    if not all(isinstance(a, str) and isinstance(b, str)
+               for a, b in update_urls):
+        raise InvalidResponse(
+            'Invalid format of update_urls in response: %s' %
+            update_urls)
+
+    return UpdateResult(update_urls, since)
+
+
+def _parse_subscription_changes(data):
+    if data is None:
+        raise InvalidResponse('Got empty response')
+
+    if 'add' not in data:
+        raise InvalidResponse('List of added podcasts not in response')
+
+    if 'remove' not in data:
+        raise InvalidResponse('List of removed podcasts not in response')
+
+    if 'timestamp' not in data:
+        raise InvalidResponse('Timestamp missing from response')
 
-        for mandatory in ('podcast', 'episode', 'action'):
-            value = getattr(self, mandatory)
-            d[mandatory] = value
+    if not all(isinstance(x, str) for x in data['add']):
+        raise InvalidResponse(
+            'Invalid value(s) in list of added podcasts: %s' %
+            data['add'])
 
-        for optional in ('device', 'timestamp',
-                         'started', 'position', 'total'):
-            value = getattr(self, optional)
-            if value is not None:
-                d[optional] = value
+    if not all(isinstance(x, str) for x in data['remove']):
+        raise InvalidResponse(
+            'Invalid value(s) in list of removed podcasts: %s' %
+            data['remove'])
 
-        return d
+    try:
+        since = int(data['timestamp'])
+    except ValueError:
+        raise InvalidResponse(
+            'Timestamp has invalid format in response: %s' %
+            data['timestamp'])
+
+    return SubscriptionChanges(data['add'], data['remove'], since)
+
+
+def _parse_episode_action_changes(data):
+    if data is None:
+        raise InvalidResponse('Got empty response')
+
+    if 'actions' not in data:
+        raise InvalidResponse('Response does not contain actions')
+
+    if 'timestamp' not in data:
+        raise InvalidResponse('Response does not contain timestamp')
+
+    try:
+        since = int(data['timestamp'])
+    except ValueError:
+        raise InvalidResponse('Invalid value for timestamp: ' +
+                              data['timestamp'])
+
+    actions = EPISODE_ACTION_SCHEMA.build_list(data['actions'])
+    return EpisodeActionChanges(actions, since)
+
+
+def _stream_episode_actions(dicts, members, changes):
+    """Yield EpisodeAction objects, then set the timestamp of changes"""
+    for d in dicts:
+        yield EPISODE_ACTION_SCHEMA.build(d)
+
+    changes.since = _parse_timestamp(members)
+
+
+def _device_settings(caption, type):
+    return DEVICE_SETTINGS_ENCODER.encode_values((caption, type))
+
+
+def _parse_devices(dicts):
+    if dicts is None:
+        raise InvalidResponse('No response received')
+
+    return DEVICE_SCHEMA.build_list(dicts)
 
 
 class MygPodderClient(simple.SimpleClient):
@@ -235,18 +515,50 @@ class MygPodderClient(simple.SimpleClient):
     for a smaller class that only implements the Simple API.
     """
 
+    def __init__(self, username, password, root_url=mygpoclient.ROOT_URL,
+                 client_class=json.JsonClient, store=None, **kwargs):
+        """Creates a new API client
+
+        The parameters are those of SimpleClient, plus store, an
+        optional store.SyncStore. With a store, the devices and
+        subscriptions that are downloaded or uploaded are recorded in
+        it, and the refresh_* methods only download the changes since
+        the last refresh.
+        """
+        simple.SimpleClient.__init__(self, username, password, root_url,
+                                     client_class, **kwargs)
+        self.store = store
+
+    def _needs_store(self):
+        if self.store is None:
+            raise ValueError('No store attached to this client')
+        return self.store
+
+    @http.accepts_deadline
     @simple.needs_credentials
     def get_subscriptions(self, device):
         # Overloaded to accept PodcastDevice objects as arguments
         device = getattr(device, 'device_id', device)
-        return simple.SimpleClient.get_subscriptions(self, device)
+        urls = simple.SimpleClient.get_subscriptions(self, device)
+        if self.store is not None:
+            self.store.set_subscriptions(self.username, device, urls)
+        return urls
 
+    @http.accepts_deadline
     @simple.needs_credentials
     def put_subscriptions(self, device, urls):
         # Overloaded to accept PodcastDevice objects as arguments
         device = getattr(device, 'device_id', device)
-        return simple.SimpleClient.put_subscriptions(self, device, urls)
+        if self.store is None:
+            return simple.SimpleClient.put_subscriptions(self, device, urls)
 
+        urls = _url_list(urls, 'urls')
+        result = simple.SimpleClient.put_subscriptions(self, device, urls)
+        if result:
+            self.store.set_subscriptions(self.username, device, urls)
+        return result
+
+    @http.accepts_deadline
     @simple.needs_credentials
     def update_subscriptions(self, device_id, add_urls=[], remove_urls=[]):
         """Update the subscription list for a given device.
@@ -260,51 +572,46 @@ class MygPodderClient(simple.SimpleClient):
         subscription list so that new_url is used instead of old_url.
         """
         uri = self._locator.add_remove_subscriptions_uri(device_id)
-
-        if not all(isinstance(x, str) for x in add_urls):
-            raise ValueError(
-                'add_urls must be a list of strings but was %s' %
-                add_urls)
-
-        if not all(isinstance(x, str) for x in remove_urls):
-            raise ValueError(
-                'remove_urls must be a list of strings but was %s' %
-                remove_urls)
-
-        data = {'add': add_urls, 'remove': remove_urls}
-        response = self._client.POST(uri, data)
-
-        if response is None:
-            raise InvalidResponse('Got empty response')
-
-        if 'timestamp' not in response:
-            raise InvalidResponse('Response does not contain timestamp')
-
-        try:
-            since = int(response['timestamp'])
-        except ValueError:
-            raise InvalidResponse(
-                'Invalid value %s for timestamp in response' %
-                response['timestamp'])
-
-        if 'update_urls' not in response:
-            raise InvalidResponse('Response does not contain update_urls')
-
-        try:
-            update_urls = [(a, b) for a, b in response['update_urls']]
-        except BaseException:
-            raise InvalidResponse(
-                'Invalid format of update_urls in response: %s' %
-                response['update_urls'])
-
-        if not all(isinstance(a, str) and isinstance(b, str)
-                   for a, b in update_urls):
-            raise InvalidResponse(
-                'Invalid format of update_urls in response: %s' %
-                update_urls)
-
-        return UpdateResult(update_urls, since)
-
+        data = _subscription_update(add_urls, remove_urls)
+        result = _parse_update_result(self._client.POST(uri, data))
+        if self.store is not None:
+            self.store.update_subscriptions(self.username, device_id,
+                                            data['add'], data['remove'],
+                                            result.update_urls)
+        return result
+
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def sync_subscriptions(self, device_id, urls, known_urls=None):
+        """Make the subscription list of a device on the server urls
+
+        known_urls is the set of URLs on the server after the last sync
+        (the urls attribute of its SyncResult). Only the URLs that have
+        been added or removed since are uploaded (nothing if there are
+        none), and known_urls is updated in place, including the URLs
+        that the server rewrote. Without known_urls, the whole list is
+        uploaded with put_subscriptions.
+
+        Returns a SyncResult. As with update_subscriptions, the client
+        should use new_url instead of old_url for every (old_url,
+        new_url) tuple in its update_urls.
+        """
+        device_id = getattr(device_id, 'device_id', device_id)
+        if known_urls is None:
+            urls = _url_list(urls, 'urls')
+            if not self.put_subscriptions(device_id, urls):
+                return SyncResult(None, [], None)
+            return SyncResult(set(urls), [], None)
+
+        add_urls, remove_urls = _subscription_delta(urls, known_urls)
+        if not add_urls and not remove_urls:
+            return SyncResult(known_urls, [], None)
+
+        result = self.update_subscriptions(device_id, add_urls, remove_urls)
+        _apply_subscription_update(known_urls, add_urls, remove_urls, result)
+        return SyncResult(known_urls, result.update_urls, result.since)
+
+    @http.accepts_deadline
     @simple.needs_credentials
     def pull_subscriptions(self, device_id, since=None):
         """Downloads subscriptions since the time of the last update
@@ -318,64 +625,122 @@ class MygPodderClient(simple.SimpleClient):
         that can be used for future calls to this method.
         """
         uri = self._locator.subscription_updates_uri(device_id, since)
-        data = self._client.GET(uri)
+        return _parse_subscription_changes(self._client.GET(uri))
 
-        if data is None:
-            raise InvalidResponse('Got empty response')
-
-        if 'add' not in data:
-            raise InvalidResponse('List of added podcasts not in response')
-
-        if 'remove' not in data:
-            raise InvalidResponse('List of removed podcasts not in response')
-
-        if 'timestamp' not in data:
-            raise InvalidResponse('Timestamp missing from response')
-
-        if not all(isinstance(x, str) for x in data['add']):
-            raise InvalidResponse(
-                'Invalid value(s) in list of added podcasts: %s' %
-                data['add'])
-
-        if not all(isinstance(x, str) for x in data['remove']):
-            raise InvalidResponse(
-                'Invalid value(s) in list of removed podcasts: %s' %
-                data['remove'])
-
-        try:
-            since = int(data['timestamp'])
-        except ValueError:
-            raise InvalidResponse(
-                'Timestamp has invalid format in response: %s' %
-                data['timestamp'])
-
-        return SubscriptionChanges(data['add'], data['remove'], since)
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def refresh_subscriptions(self, device_id):
+        """Bring the stored subscriptions of a device up to date
 
+        Pulls the subscription changes since the last refresh and applies
+        them to the store. The first time, all subscriptions are pulled
+        and replace the stored ones. Returns the SubscriptionChanges object.
+        """
+        store = self._needs_store()
+        device_id = getattr(device_id, 'device_id', device_id)
+        since = store.subscriptions_since(self.username, device_id)
+        changes = self.pull_subscriptions(device_id, since)
+        if since is None:
+            store.set_subscriptions(self.username, device_id, changes.add,
+                                    since=changes.since)
+        else:
+            store.update_subscriptions(self.username, device_id, changes.add,
+                                       changes.remove, since=changes.since)
+        return changes
+
+    @http.accepts_deadline
     @simple.needs_credentials
-    def upload_episode_actions(self, actions=[]):
+    def upload_episode_actions(self, actions=[], stream=False):
         """Uploads a list of EpisodeAction objects to the server
 
+        If stream is True, actions can be any iterable (e.g. a generator)
+        and the actions are encoded while they are sent with chunked
+        transfer encoding, so memory use does not grow with the number
+        of actions. Streamed uploads are not retried.
+
         Returns the timestamp that can be used for retrieving changes.
         """
         uri = self._locator.upload_episode_actions_uri()
-        actions = [action.to_dictionary() for action in actions]
-        response = self._client.POST(uri, actions)
-
-        if response is None:
-            raise InvalidResponse('Got empty response')
+        if stream:
+            return _parse_timestamp(self._client.POST_items(
+                uri, actions, EPISODE_ACTION_ENCODER))
 
-        if 'timestamp' not in response:
-            raise InvalidResponse('Response does not contain timestamp')
-
-        try:
-            since = int(response['timestamp'])
-        except ValueError:
-            raise InvalidResponse(
-                'Invalid value %s for timestamp in response' %
-                response['timestamp'])
+        data = EPISODE_ACTION_ENCODER.encode(actions)
+        return _parse_timestamp(self._client.POST(uri, data))
 
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def upload_episode_actions_chunked(self, actions, max_actions=1000,
+                                       max_bytes=None, in_flight=2,
+                                       checkpoint=None):
+        """Uploads EpisodeAction objects in chunks
+
+        actions can be any iterable. It's split into chunks of at most
+        max_actions actions and max_bytes bytes (see upload.iter_chunks),
+        and up to in_flight chunks are uploaded at the same time.
+
+        If checkpoint (a filename) is given, the number of actions that
+        have been acknowledged so far is recorded in it (see
+        upload.Checkpoint), counting only chunks whose predecessors were
+        acknowledged as well. If the upload fails, calling this method
+        again with the same actions and checkpoint skips those actions.
+        Chunks that were acknowledged after the first failed chunk are
+        uploaded again then. The checkpoint is removed at the end.
+
+        Returns the timestamp that can be used for retrieving changes
+        (the newest one of all chunks, as they may be processed in any
+        order).
+        """
+        uri = self._locator.upload_episode_actions_uri()
+        if checkpoint is not None:
+            checkpoint = upload.Checkpoint(checkpoint)
+            done, since = checkpoint.load()
+            actions = itertools.islice(actions, done, None)
+        else:
+            done, since = 0, None
+
+        def post(data):
+            return _parse_timestamp(self._client.POST(uri, data))
+
+        def acknowledge(count, timestamp):
+            if since is not None:
+                timestamp = max(since, timestamp)
+            if checkpoint is not None:
+                checkpoint.save(done + count, timestamp)
+            return done + count, timestamp
+
+        chunks = upload.iter_chunks(actions, EPISODE_ACTION_ENCODER,
+                                    max_actions, max_bytes)
+        if in_flight <= 1:
+            for count, data in chunks:
+                done, since = acknowledge(count, post(data))
+        else:
+            # Chunks are acknowledged in order, while later ones are sent
+            send = http.bind_deadline(post)
+            with futures.ThreadPoolExecutor(in_flight) as executor:
+                pending = collections.deque()
+                try:
+                    for count, data in chunks:
+                        if len(pending) == in_flight:
+                            oldest, future = pending.popleft()
+                            done, since = acknowledge(oldest, future.result())
+                        pending.append((count, executor.submit(send, data)))
+
+                    while pending:
+                        oldest, future = pending.popleft()
+                        done, since = acknowledge(oldest, future.result())
+                finally:
+                    for _, future in pending:
+                        future.cancel()
+
+        if since is None:
+            # Nothing to upload, but the caller still needs a timestamp
+            since = post(b'[]')
+        if checkpoint is not None:
+            checkpoint.remove()
         return since
 
+    @http.accepts_deadline
     @simple.needs_credentials
     def download_episode_actions(self, since=None,
                                  podcast=None, device_id=None):
@@ -387,31 +752,93 @@ class MygPodderClient(simple.SimpleClient):
         """
         uri = self._locator.download_episode_actions_uri(since,
                                                          podcast, device_id)
-        data = self._client.GET(uri)
-
-        if data is None:
-            raise InvalidResponse('Got empty response')
-
-        if 'actions' not in data:
-            raise InvalidResponse('Response does not contain actions')
+        return _parse_episode_action_changes(self._client.GET(uri))
 
-        if 'timestamp' not in data:
-            raise InvalidResponse('Response does not contain timestamp')
-
-        try:
-            since = int(data['timestamp'])
-        except ValueError:
-            raise InvalidResponse('Invalid value for timestamp: ' +
-                                  data['timestamp'])
-
-        dicts = data['actions']
-        try:
-            actions = [EpisodeAction.from_dictionary(d) for d in dicts]
-        except KeyError:
-            raise InvalidResponse('Missing keys in action list response')
-
-        return EpisodeActionChanges(actions, since)
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def iter_episode_actions(self, since=None, podcast=None, device_id=None):
+        """Downloads EpisodeAction objects one at a time
+
+        Like download_episode_actions, but the "actions" attribute of
+        the returned EpisodeActionChanges object is a generator that
+        decodes the actions while the response is read, so memory use
+        does not grow with the number of actions. The "since" attribute
+        is None until all actions have been read.
+        """
+        uri = self._locator.download_episode_actions_uri(since,
+                                                         podcast, device_id)
+        members = {}
+        dicts = self._client.GET_items(uri, 'actions', members)
+        changes = EpisodeActionChanges(None, None)
+        changes.actions = _stream_episode_actions(dicts, members, changes)
+        return changes
 
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def iter_episode_action_batches(self, since=None, podcast=None,
+                                    device_id=None, batch_size=1000,
+                                    watermark=None):
+        """Downloads EpisodeAction objects in batches
+
+        Yields EpisodeActionChanges objects with lists of at most
+        batch_size actions, decoded while the response is read (see
+        iter_episode_actions). The "since" attribute is None, except
+        for the last batch (which may be empty).
+
+        If watermark (a filename) is given, the progress is recorded in
+        it (see download.Watermark) whenever the consumer asks for the
+        next batch, and when all batches have been consumed. If it
+        exists, it's used instead of since, so a download that was
+        interrupted continues after the last consumed batch, and a
+        finished one continues with the new actions. If the server's
+        response has changed in the meantime (the last consumed action
+        isn't at the same position), all actions since the watermark's
+        since value are downloaded again instead.
+        """
+        offset, last_action = 0, None
+        if watermark is not None:
+            watermark = download.Watermark(watermark)
+            since, offset, last_action = watermark.load(since)
+
+        changes = self.iter_episode_actions(since, podcast, device_id)
+        actions = download.resume(changes.actions, offset, last_action)
+        if actions is None:
+            changes.actions.close()
+            offset = 0
+            changes = self.iter_episode_actions(since, podcast, device_id)
+            actions = changes.actions
+
+        for batch, last in download.iter_batches(actions, batch_size):
+            yield EpisodeActionChanges(batch, changes.since if last else None)
+            offset += len(batch)
+            if watermark is not None and not last:
+                watermark.save(since, offset, download.fingerprint(batch[-1]))
+
+        if watermark is not None:
+            watermark.save(changes.since, 0)
+
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def refresh_episode_actions(self, batch_size=1000):
+        """Bring the stored episode actions up to date
+
+        Downloads the episode actions since the last refresh (all of
+        them the first time) and folds them into the store, batch_size
+        actions at a time, so memory use stays bounded. The since value
+        is stored with the last batch. Returns the number of stored
+        actions that changed.
+        """
+        store = self._needs_store()
+        since = store.episode_actions_since(self.username)
+        changes = self.iter_episode_actions(since)
+        changed = 0
+        for batch, last in download.iter_batches(changes.actions,
+                                                 batch_size):
+            changed += len(store.add_episode_actions(
+                self.username, batch, changes.since if last else None))
+        return changed
+
+    @http.accepts_deadline
     @simple.needs_credentials
     def update_device_settings(self, device_id, caption=None, type=None):
         """Update the description of a device on the server
@@ -427,13 +854,10 @@ class MygPodderClient(simple.SimpleClient):
         Returns True if the request succeeded, False otherwise.
         """
         uri = self._locator.device_settings_uri(device_id)
-        data = {}
-        if caption is not None:
-            data['caption'] = caption
-        if type is not None:
-            data['type'] = type
+        data = _device_settings(caption, type)
         return self._client.POST(uri, data) is None
 
+    @http.accepts_deadline
     @simple.needs_credentials
     def get_devices(self):
         """Returns a list of this user's PodcastDevice objects
@@ -443,29 +867,63 @@ class MygPodderClient(simple.SimpleClient):
         the subscription list from.
         """
         uri = self._locator.device_list_uri()
-        dicts = self._client.GET(uri)
-        if dicts is None:
-            raise InvalidResponse('No response received')
+        devices = _parse_devices(self._client.GET(uri))
+        if self.store is not None:
+            self.store.set_devices(self.username, devices)
+        return devices
 
-        try:
-            return [PodcastDevice.from_dictionary(d) for d in dicts]
-        except KeyError:
-            raise InvalidResponse('Missing keys in device list response')
+    @http.accepts_deadline
+    @simple.needs_credentials
+    def get_device_subscriptions(self, devices=None, jobs=4):
+        """Get the subscriptions of several devices concurrently
+
+        devices is a list of device IDs or PodcastDevice objects (all
+        devices of the user if None). The subscriptions are downloaded
+        with get_subscriptions, up to jobs devices at the same time.
 
+        Returns an OrderedDict that maps the device IDs to the lists
+        of URLs, in the order of devices.
+        """
+        if devices is None:
+            devices = self.get_devices()
+        device_ids = [getattr(device, 'device_id', device)
+                      for device in devices]
+
+        if jobs <= 1 or len(device_ids) <= 1:
+            return collections.OrderedDict(
+                (device_id, self.get_subscriptions(device_id))
+                for device_id in device_ids)
+
+        workers = min(jobs, len(device_ids))
+        get_subscriptions = http.bind_deadline(self.get_subscriptions)
+        with futures.ThreadPoolExecutor(workers) as executor:
+            pending = [executor.submit(get_subscriptions, device_id)
+                       for device_id in device_ids]
+            try:
+                return collections.OrderedDict(
+                    (device_id, future.result())
+                    for device_id, future in zip(device_ids, pending))
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @http.accepts_deadline
     def get_favorite_episodes(self):
         """Returns a List of Episode Objects containing the Users
         favorite Episodes"""
         uri = self._locator.favorite_episodes_uri()
-        return [public.Episode.from_dict(d) for d in self._client.GET(uri)]
+        return public.EPISODE_SCHEMA.build_list(self._client.GET(uri))
 
+    @http.accepts_deadline
     def get_settings(self, type, scope_param1=None, scope_param2=None):
         """Returns a Dictionary with the set settings for the type & specified scope"""
         uri = self._locator.settings_uri(type, scope_param1, scope_param2)
         return self._client.GET(uri)
 
+    @http.accepts_deadline
     def set_settings(self, type, scope_param1,
                      scope_param2, set={}, remove=[]):
         """Returns a Dictionary with the set settings for the type & specified scope"""
         uri = self._locator.settings_uri(type, scope_param1, scope_param2)
-        data = {"set": set, "remove": remove}
+        data = SETTINGS_ENCODER.encode_values((set, remove))
         return self._client.POST(uri, data)
@@ -16,8 +16,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from mygpoclient import api
+from mygpoclient import download
+from mygpoclient import http
+from mygpoclient import json
+from mygpoclient import store
 from mygpoclient import testing
+from mygpoclient import upload
 
+import os
+import pickle
+import shutil
+import tempfile
+import threading
 import unittest
 
 # Example data for testing purposes
@@ -186,6 +196,72 @@ class Test_EpisodeAction(unittest.TestCase):
         self.assertEqual(dictionary['position'], self.VALID_POSITION)
         self.assertEqual(dictionary['total'], self.VALID_TOTAL)
 
+    def test_fromDictionaries_createsActions(self):
+        dicts = [
+            {'podcast': FEED_URL_1, 'episode': EPISODE_URL_1,
+             'action': 'download', 'device': DEVICE_ID_1},
+            {'podcast': FEED_URL_2, 'episode': EPISODE_URL_2,
+             'action': 'play', 'timestamp': self.XML_TIMESTAMP,
+             'started': '5', 'position': 10, 'total': 100},
+        ]
+        actions = api.EpisodeAction.from_dictionaries(dicts)
+        self.assertEqual([a.to_dictionary() for a in actions],
+                         [api.EpisodeAction.from_dictionary(d).to_dictionary()
+                          for d in dicts])
+        self.assertEqual(actions[1].started, 5)
+
+    def test_fromDictionaries_reportsAllErrors(self):
+        dicts = [
+            {'podcast': FEED_URL_1, 'episode': EPISODE_URL_1,
+             'action': 'download', 'position': 10},
+            {'podcast': FEED_URL_1, 'episode': EPISODE_URL_1,
+             'action': 'new'},
+            {'podcast': FEED_URL_1, 'episode': EPISODE_URL_2,
+             'action': 'play', 'timestamp': 'now'},
+            {'podcast': FEED_URL_1, 'action': 'new'},
+        ]
+        with self.assertRaises(api.InvalidEpisodeActions) as context:
+            api.EpisodeAction.from_dictionaries(dicts)
+        errors = context.exception.errors
+        self.assertEqual([index for index, _ in errors], [0, 2, 3])
+        self.assertEqual(errors[2][1], "Missing key 'episode'")
+        for index, message in errors[:2]:
+            with self.assertRaises(ValueError) as single:
+                api.EpisodeAction.from_dictionary(dicts[index])
+            self.assertEqual(message, str(single.exception))
+        self.assertEqual([a.action for a in context.exception.actions],
+                         ['new'])
+
+    def test_fromDictionaries_trusted_skipsValidation(self):
+        dicts = [{'podcast': FEED_URL_1, 'episode': EPISODE_URL_1,
+                  'action': 'download', 'position': 10}]
+        actions = api.EpisodeAction.from_dictionaries(dicts, trusted=True)
+        self.assertEqual(actions[0].position, 10)
+        self.assertRaises(api.InvalidEpisodeActions,
+                          api.EpisodeAction.from_dictionaries,
+                          [{'podcast': FEED_URL_1}], trusted=True)
+
+    def test_hasSlots_andPicklesWithAllAttributes(self):
+        action = api.EpisodeAction(FEED_URL_3, EPISODE_URL_4, 'play',
+                                   DEVICE_ID_1, self.XML_TIMESTAMP, self.VALID_STARTED,
+                                   self.VALID_POSITION, self.VALID_TOTAL)
+        self.assertFalse(hasattr(action, '__dict__'))
+        copy = pickle.loads(pickle.dumps(action, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.to_dictionary(), action.to_dictionary())
+
+    def test_schema_internsRepeatedStrings(self):
+        data = json.JsonClient.decode(b"""[
+            {"podcast": "http://example.com/feed.rss", "episode": "a",
+             "action": "download", "device": "phone"},
+            {"podcast": "http://example.com/feed.rss", "episode": "b",
+             "action": "download", "device": "phone"}
+        ]""")
+        first, second = api.EPISODE_ACTION_SCHEMA.build_list(data)
+        self.assertTrue(first.podcast is second.podcast)
+        self.assertTrue(first.action is second.action)
+        self.assertTrue(first.device is second.device)
+        self.assertFalse(first.episode is second.episode)
+
 
 class Test_MygPodderClient(unittest.TestCase):
     ADD = [
@@ -341,6 +417,51 @@ class Test_MygPodderClient(unittest.TestCase):
         self.assert_http_request_count(1)
         self.assertTrue(self.has_posted_json_data(self.ADD_REMOVE_AS_JSON_UPLOAD))
 
+    def test_updateSubscriptions_acceptsIterables(self):
+        self.set_http_response_value(b"""
+        {"timestamp": 1262103016, "update_urls": []}
+        """)
+        self.client.update_subscriptions(DEVICE_ID_1, iter(self.ADD),
+                                         tuple(self.REMOVE))
+        self.assertTrue(self.has_posted_json_data(self.ADD_REMOVE_AS_JSON_UPLOAD))
+
+    def test_updateSubscriptions_raisesValueError_onString(self):
+        self.assertRaises(ValueError, self.client.update_subscriptions,
+                          DEVICE_ID_1, FEED_URL_1, [])
+
+    def test_syncSubscriptions_withoutKnownUrls_putsWholeList(self):
+        self.set_http_response_value(b'')
+        result = self.client.sync_subscriptions(DEVICE_ID_1, iter(self.ADD))
+        self.assertEqual(result.urls, set(self.ADD))
+        self.assertEqual((result.update_urls, result.since), ([], None))
+        self.assertTrue(self.has_put_json_data(self.ADD))
+
+    def test_syncSubscriptions_uploadsChanges_andAppliesRewrites(self):
+        self.set_http_response_value(b"""
+        {"timestamp": 1262103016, "update_urls": [
+            ["http://example.co.uk/episodes.xml",
+             "http://example.co.uk/episodes.rss"]
+        ]}
+        """)
+        known_urls = set([FEED_URL_1, FEED_URL_2, FEED_URL_4])
+        result = self.client.sync_subscriptions(
+            DEVICE_ID_1, [FEED_URL_1, FEED_URL_3], known_urls)
+        self.assertTrue(self.has_posted_json_data({
+            'add': [FEED_URL_3], 'remove': [FEED_URL_2, FEED_URL_4]}))
+        self.assertTrue(result.urls is known_urls)
+        self.assertEqual(known_urls, set([
+            FEED_URL_1, 'http://example.co.uk/episodes.rss']))
+        self.assertEqual(result.update_urls, [
+            (FEED_URL_3, 'http://example.co.uk/episodes.rss')])
+        self.assertEqual(result.since, self.SINCE)
+
+    def test_syncSubscriptions_withoutChanges_sendsNothing(self):
+        known_urls = set(self.ADD)
+        result = self.client.sync_subscriptions(DEVICE_ID_1, self.ADD,
+                                                known_urls)
+        self.assertEqual(result.urls, set(self.ADD))
+        self.assert_http_request_count(0)
+
     def test_pullSubscriptions_raisesInvalidResponse_onEmptyResponse(self):
         self.set_http_response_value(b'')
         self.assertRaises(api.InvalidResponse,
@@ -475,6 +596,16 @@ class Test_MygPodderClient(unittest.TestCase):
         self.assert_http_request_count(1)
         self.assertTrue(self.has_posted_json_data(self.ACTIONS_AS_JSON_UPLOAD))
 
+    def test_uploadEpisodeActions_stream_acceptsGenerator(self):
+        self.set_http_response_value(b"""
+        {"timestamp": 1262103016}
+        """)
+        actions = (action for action in self.ACTIONS)
+        result = self.client.upload_episode_actions(actions, stream=True)
+        self.assertEqual(result, self.SINCE)
+        self.assert_http_request_count(1)
+        self.assertTrue(self.has_posted_json_data(self.ACTIONS_AS_JSON_UPLOAD))
+
     def test_downloadEpisodeActions_raisesInvalidResponse_onEmptyResponse(
             self):
         self.set_http_response_value(b'')
@@ -546,6 +677,37 @@ class Test_MygPodderClient(unittest.TestCase):
         self.assertEqual(changes.since, self.SINCE)
         self.assert_http_request_count(1)
 
+    def test_iterEpisodeActions_yieldsActionsThenSetsSince(self):
+        self.set_http_response_value(b"""
+        {"actions": [
+            {"podcast": "a", "episode": "b", "action": "download"},
+            {"podcast": "x", "episode": "y", "action": "play"}
+        ], "timestamp": 1262103016}
+        """)
+        changes = self.client.iter_episode_actions()
+        self.assertEqual(changes.since, None)
+        actions = list(changes.actions)
+        self.assertEqual([a.episode for a in actions], ['b', 'y'])
+        self.assertEqual(actions[1].action, 'play')
+        self.assertEqual(changes.since, self.SINCE)
+        self.assert_http_request_count(1)
+
+    def test_iterEpisodeActions_raisesInvalidResponse_onIncompleteActions(
+            self):
+        self.set_http_response_value(b"""
+        {"actions": [
+            {"podcast": "x", "episode": "y"}
+        ], "timestamp": 1262103016}
+        """)
+        changes = self.client.iter_episode_actions()
+        self.assertRaises(api.InvalidResponse, list, changes.actions)
+
+    def test_iterEpisodeActions_raisesInvalidResponse_onMissingTimestamp(
+            self):
+        self.set_http_response_value(b'{"actions": []}')
+        changes = self.client.iter_episode_actions()
+        self.assertRaises(api.InvalidResponse, list, changes.actions)
+
     def test_updateDeviceSettings_withNothing(self):
         self.set_http_response_value(b'')
         result = self.client.update_device_settings(DEVICE_ID_1)
@@ -569,6 +731,13 @@ class Test_MygPodderClient(unittest.TestCase):
         self.assert_http_request_count(1)
         self.assertTrue(self.has_posted_json_data({'type': 'desktop'}))
 
+    def test_setSettings_postsSetAndRemove(self):
+        self.set_http_response_value(b'{}')
+        self.client.set_settings('account', None, None,
+                                 set={'public': False}, remove=['x'])
+        self.assertTrue(self.has_posted_json_data({
+            'set': {'public': False}, 'remove': ['x']}))
+
     def test_updateDeviceSettings_withCaptionAndType(self):
         self.set_http_response_value(b'')
         result = self.client.update_device_settings(DEVICE_ID_1,
@@ -665,3 +834,337 @@ class Test_MygPodderClient(unittest.TestCase):
         self.assertEqual(
             episode2.website,
             'http://feedproxy.google.com/~r/coverville/~3/5UK8-PZmmMQ/')
+
+
+class CountingJsonClient(testing.FakeJsonClient):
+    """Answers uploads with increasing timestamps, fails the nth POST"""
+
+    def __init__(self, fail_at=None):
+        testing.FakeJsonClient.__init__(self)
+        self.fail_at = fail_at
+        self._lock = threading.Lock()
+        self.remaining = []
+
+    def POST(self, uri, data):
+        with self._lock:
+            self.requests.append(('POST', uri, json.JsonClient.decode(data)))
+            self.remaining.append(http.remaining_time())
+            number = len(self.requests)
+        if number == self.fail_at:
+            raise IOError('connection reset')
+        return {'timestamp': 1000 + number}
+
+
+class ReversedJsonClient(CountingJsonClient):
+    """Answers later uploads with older timestamps"""
+
+    def POST(self, uri, data):
+        result = CountingJsonClient.POST(self, uri, data)
+        return {'timestamp': 3000 - result['timestamp']}
+
+
+class Test_MygPodderClient_uploadChunked(unittest.TestCase):
+    ACTIONS = [api.EpisodeAction(FEED_URL_1, 'http://example.com/%d.mp3' % i,
+                                 'download') for i in range(10)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, 'upload.checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def upload(self, fake_client, actions, **kwargs):
+        client = api.MygPodderClient('user01', 's3cret',
+                                     client_class=fake_client)
+        return client.upload_episode_actions_chunked(actions, **kwargs)
+
+    def uploaded(self, fake_client):
+        return [d['episode'] for _, _, data in fake_client.requests
+                for d in data]
+
+    def test_uploadsChunks_andReturnsTimestampOfLast(self):
+        for in_flight in (1, 3):
+            fake_client = CountingJsonClient()
+            since = self.upload(fake_client, iter(self.ACTIONS),
+                                max_actions=3, in_flight=in_flight)
+            self.assertEqual(len(fake_client.requests), 4)
+            self.assertEqual(sorted(self.uploaded(fake_client)),
+                             sorted(a.episode for a in self.ACTIONS))
+            self.assertEqual(since, 1004)
+
+    def test_noActions_returnsTimestamp(self):
+        fake_client = CountingJsonClient()
+        self.assertEqual(self.upload(fake_client, []), 1001)
+        self.assertEqual(fake_client.requests[0][2], [])
+
+    def test_deadline_appliesToConcurrentChunks(self):
+        fake_client = CountingJsonClient()
+        self.upload(fake_client, self.ACTIONS, max_actions=2, in_flight=2,
+                    deadline=30)
+        self.assertEqual(len(fake_client.remaining), 5)
+        self.assertTrue(all(remaining is not None and remaining <= 30
+                            for remaining in fake_client.remaining))
+
+    def test_olderTimestampOfLaterChunk_isIgnored(self):
+        for in_flight in (1, 2):
+            fake_client = ReversedJsonClient()
+            self.assertEqual(self.upload(fake_client, self.ACTIONS,
+                                         max_actions=4, in_flight=in_flight),
+                             1999)
+
+    def test_failedUpload_isResumedFromCheckpoint(self):
+        fake_client = CountingJsonClient(fail_at=3)
+        self.assertRaises(IOError, self.upload, fake_client, self.ACTIONS,
+                          max_actions=2, in_flight=1,
+                          checkpoint=self.checkpoint)
+        self.assertEqual(upload.Checkpoint(self.checkpoint).load(),
+                         (4, 1002))
+
+        fake_client = CountingJsonClient()
+        since = self.upload(fake_client, self.ACTIONS, max_actions=2,
+                            checkpoint=self.checkpoint)
+        self.assertEqual(self.uploaded(fake_client),
+                         [a.episode for a in self.ACTIONS[4:]])
+        self.assertEqual(since, 1003)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class Test_MygPodderClient_downloadBatches(unittest.TestCase):
+    RESPONSE = json.JsonClient.encode({
+        'actions': [{'podcast': FEED_URL_1, 'episode': str(i),
+                     'action': 'download'} for i in range(5)],
+        'timestamp': 1262103016,
+    })
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.watermark = os.path.join(self.directory, 'actions.watermark')
+        self.fake_client = testing.FakeJsonClient()
+        self.fake_client.response_value = self.RESPONSE
+        self.client = api.MygPodderClient('user01', 's3cret',
+                                          client_class=self.fake_client)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_yieldsBatches_withSinceOnLast(self):
+        batches = list(self.client.iter_episode_action_batches(
+            batch_size=2))
+        self.assertEqual([[a.episode for a in changes.actions]
+                          for changes in batches],
+                         [['0', '1'], ['2', '3'], ['4']])
+        self.assertEqual([changes.since for changes in batches],
+                         [None, None, 1262103016])
+
+    def test_noActions_yieldsEmptyBatchWithSince(self):
+        self.fake_client.response_value = b'{"actions": [], "timestamp": 12}'
+        batches = list(self.client.iter_episode_action_batches())
+        self.assertEqual([(changes.actions, changes.since)
+                          for changes in batches], [([], 12)])
+
+    def test_interruptedDownload_continuesAfterConsumedBatch(self):
+        batches = self.client.iter_episode_action_batches(
+            since=10, batch_size=2, watermark=self.watermark)
+        next(batches)
+        self.assertFalse(os.path.exists(self.watermark))
+        next(batches)
+        batches.close()
+        self.assertEqual(download.Watermark(self.watermark).load(),
+                         (10, 2, [FEED_URL_1, '1', 'download', None, None]))
+
+        batches = list(self.client.iter_episode_action_batches(
+            since=None, batch_size=2, watermark=self.watermark))
+        self.assertEqual([a.episode for a in batches[0].actions],
+                         ['2', '3'])
+        self.assertEqual(len(batches), 2)
+        self.assertTrue(self.fake_client.requests[-1][1].endswith(
+            'since=10'))
+        self.assertEqual(download.Watermark(self.watermark).load(),
+                         (1262103016, 0, None))
+
+        list(self.client.iter_episode_action_batches(
+            watermark=self.watermark))
+        self.assertTrue(self.fake_client.requests[-1][1].endswith(
+            'since=1262103016'))
+
+    def test_deadline_appliesWhileBatchesAreMade(self):
+        remaining = []
+        get_items = self.fake_client.GET_items
+
+        def GET_items(*args):
+            remaining.append(http.remaining_time())
+            return get_items(*args)
+
+        self.fake_client.GET_items = GET_items
+        batches = self.client.iter_episode_action_batches(batch_size=2,
+                                                          deadline=30)
+        self.assertEqual(len(next(batches).actions), 2)
+        self.assertEqual(http.remaining_time(), None)
+        self.assertEqual(len(list(batches)), 2)
+        self.assertTrue(remaining[0] is not None and remaining[0] <= 30)
+
+    def test_changedResponse_isDownloadedAgain(self):
+        # The action at the offset isn't the one consumed before
+        download.Watermark(self.watermark).save(
+            10, 2, [FEED_URL_1, '3', 'download', None, None])
+        batches = list(self.client.iter_episode_action_batches(
+            batch_size=2, watermark=self.watermark))
+        self.assertEqual([a.episode for changes in batches
+                          for a in changes.actions],
+                         ['0', '1', '2', '3', '4'])
+        self.assertEqual([uri for _, uri, _ in self.fake_client.requests],
+                         [self.fake_client.requests[0][1]] * 2)
+        self.assertTrue(self.fake_client.requests[0][1].endswith('since=10'))
+
+
+class Test_MygPodderClient_withStore(unittest.TestCase):
+    USERNAME = 'user01'
+
+    def setUp(self):
+        self.store = store.SyncStore(':memory:')
+        self.fake_client = testing.FakeJsonClient()
+        self.client = api.MygPodderClient(self.USERNAME, 's3cret',
+                                          client_class=self.fake_client,
+                                          store=self.store)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_refreshSubscriptions_pullsChangesSinceLastRefresh(self):
+        self.fake_client.response_value = json.JsonClient.encode({
+            'add': [FEED_URL_1, FEED_URL_2], 'remove': [],
+            'timestamp': 1000})
+        self.client.refresh_subscriptions(DEVICE_ID_1)
+        self.fake_client.response_value = json.JsonClient.encode({
+            'add': [FEED_URL_3], 'remove': [FEED_URL_1], 'timestamp': 2000})
+        changes = self.client.refresh_subscriptions(DEVICE_ID_1)
+        self.assertEqual(changes.since, 2000)
+
+        uris = [uri for _, uri, _ in self.fake_client.requests]
+        self.assertFalse('since=' in uris[0])
+        self.assertTrue(uris[1].endswith('?since=1000'))
+        self.assertEqual(self.store.subscriptions(self.USERNAME, DEVICE_ID_1),
+                         sorted([FEED_URL_2, FEED_URL_3]))
+        self.assertEqual(
+            self.store.subscriptions_since(self.USERNAME, DEVICE_ID_1), 2000)
+
+    def test_firstRefresh_replacesStoredSubscriptions(self):
+        self.store.set_subscriptions(self.USERNAME, DEVICE_ID_1,
+                                     [FEED_URL_1, FEED_URL_2])
+        self.fake_client.response_value = json.JsonClient.encode({
+            'add': [FEED_URL_2, FEED_URL_3], 'remove': [],
+            'timestamp': 1000})
+        self.client.refresh_subscriptions(DEVICE_ID_1)
+        self.assertEqual(self.store.subscriptions(self.USERNAME, DEVICE_ID_1),
+                         sorted([FEED_URL_2, FEED_URL_3]))
+
+    def test_refreshEpisodeActions_downloadsChangesSinceLastRefresh(self):
+        self.fake_client.response_value = json.JsonClient.encode({
+            'actions': [{'podcast': FEED_URL_1, 'episode': EPISODE_URL_1,
+                         'action': 'play', 'position': 60}],
+            'timestamp': 1000})
+        self.assertEqual(self.client.refresh_episode_actions(), 1)
+        self.fake_client.response_value = b'{"actions": [], "timestamp": 2000}'
+        self.assertEqual(self.client.refresh_episode_actions(), 0)
+
+        self.assertTrue(self.fake_client.requests[1][1].endswith(
+            '?since=1000'))
+        self.assertEqual(self.store.episode_actions_since(self.USERNAME),
+                         2000)
+        action = self.store.last_action(self.USERNAME, FEED_URL_1,
+                                        EPISODE_URL_1)
+        self.assertEqual(action.position, 60)
+
+    def test_uploadedAndDownloadedState_isRecorded(self):
+        self.fake_client.response_value = json.JsonClient.encode([
+            {'id': DEVICE_ID_1, 'caption': 'Phone', 'type': 'mobile',
+             'subscriptions': 1}])
+        self.client.get_devices()
+        self.assertEqual([d.device_id for d in
+                          self.store.devices(self.USERNAME)], [DEVICE_ID_1])
+
+        self.fake_client.response_value = b''
+        self.client.put_subscriptions(DEVICE_ID_1, iter([FEED_URL_1]))
+        self.assertEqual(self.store.subscriptions(self.USERNAME, DEVICE_ID_1),
+                         [FEED_URL_1])
+
+        self.fake_client.response_value = json.JsonClient.encode({
+            'timestamp': 1000, 'update_urls': [[FEED_URL_3 + ' ', FEED_URL_3]]})
+        self.client.update_subscriptions(DEVICE_ID_1, [FEED_URL_3 + ' '],
+                                         [FEED_URL_1])
+        self.assertEqual(self.store.subscriptions(self.USERNAME, DEVICE_ID_1),
+                         [FEED_URL_3])
+
+    def test_refreshWithoutStore_raisesValueError(self):
+        client = api.MygPodderClient(self.USERNAME, 's3cret',
+                                     client_class=self.fake_client)
+        self.assertRaises(ValueError, client.refresh_episode_actions)
+
+
+class DevicesJsonClient(testing.FakeJsonClient):
+    """Answers with the subscriptions of every device after all ask"""
+
+    def __init__(self, subscriptions, concurrent=1):
+        testing.FakeJsonClient.__init__(self)
+        self.subscriptions = subscriptions
+        self.concurrent = concurrent
+        self.condition = threading.Condition()
+        self.remaining = []
+
+    def GET(self, uri):
+        with self.condition:
+            self.requests.append(('GET', uri, None))
+            self.remaining.append(http.remaining_time())
+            self.condition.notify_all()
+            # Only answer once enough requests are in flight
+            if not self.condition.wait_for(
+                    lambda: len(self.requests) >= self.concurrent, 5):
+                raise IOError('requests are not concurrent')
+
+        if uri.endswith('/devices/user01.json'):
+            return [{'id': device_id, 'caption': '', 'type': 'mobile',
+                     'subscriptions': len(urls)}
+                    for device_id, urls in self.subscriptions.items()]
+        device_id = uri.rsplit('/', 1)[1][:-len('.json')]
+        return self.subscriptions[device_id]
+
+
+class Test_MygPodderClient_getDeviceSubscriptions(unittest.TestCase):
+    SUBSCRIPTIONS = {DEVICE_ID_1: [FEED_URL_1, FEED_URL_2],
+                     DEVICE_ID_2: [FEED_URL_3], 'laptop': []}
+
+    def client(self, fake_client):
+        return api.MygPodderClient('user01', 's3cret',
+                                   client_class=fake_client)
+
+    def test_fetchesDevicesConcurrently_inOrder(self):
+        fake_client = DevicesJsonClient(self.SUBSCRIPTIONS, concurrent=3)
+        device_ids = ['laptop', DEVICE_ID_2, DEVICE_ID_1]
+        result = self.client(fake_client).get_device_subscriptions(
+            device_ids, jobs=3)
+        self.assertEqual(list(result.items()),
+                         [(device_id, self.SUBSCRIPTIONS[device_id])
+                          for device_id in device_ids])
+
+    def test_deadline_appliesToWorkers(self):
+        fake_client = DevicesJsonClient(self.SUBSCRIPTIONS, concurrent=3)
+        self.client(fake_client).get_device_subscriptions(
+            list(self.SUBSCRIPTIONS), jobs=3, deadline=30)
+        self.assertEqual(len(fake_client.remaining), 3)
+        self.assertTrue(all(remaining is not None and remaining <= 30
+                            for remaining in fake_client.remaining))
+
+    def test_allDevices_withOneJob(self):
+        fake_client = DevicesJsonClient(self.SUBSCRIPTIONS)
+        result = self.client(fake_client).get_device_subscriptions(jobs=1)
+        self.assertEqual(dict(result), self.SUBSCRIPTIONS)
+        self.assertEqual(len(fake_client.requests), 4)
+
+    def test_acceptsPodcastDevices_andRaisesErrors(self):
+        fake_client = DevicesJsonClient(self.SUBSCRIPTIONS)
+        devices = [api.PodcastDevice(DEVICE_ID_1, '', 'mobile', 2),
+                   api.PodcastDevice('unknown', '', 'mobile', 0)]
+        self.assertRaises(KeyError,
+                          self.client(fake_client).get_device_subscriptions,
+                          devices, jobs=2)
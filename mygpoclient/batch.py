@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Columnar storage for large numbers of episode actions
+
+An EpisodeActionBatch keeps every attribute of its actions in a column
+instead of keeping one object per action:
+
+ - started, position and total are int64 arrays (NULL if not set)
+ - the timestamp is a float64 array of seconds since the epoch (UTC,
+   NaN if not set)
+ - podcast, episode, action and device are dictionary-encoded: every
+   distinct string is stored once, and an int32 array holds the code
+   of the string (its index in the categories) for every action
+
+Filtering compares the codes or numbers of a whole column at a time,
+without creating EpisodeAction objects:
+
+    batch = EpisodeActionBatch.from_actions(changes.actions)
+    played = batch.filter(podcast=url, action='play', since=1262103016)
+
+If NumPy is installed, as_numpy returns zero-copy views of the columns.
+"""
+
+import array
+import itertools
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mygpoclient import api
+from mygpoclient import util
+
+
+def _timestamp_to_epoch(timestamp):
+    """Convert an ISO 8601 timestamp to seconds since the epoch
+
+    >>> _timestamp_to_epoch('2009-12-29T19:25:33')
+    1262114733.0
+    >>> _timestamp_to_epoch(None)
+    nan
+    """
+    if timestamp is None:
+        return float('nan')
+
+    epoch = util.iso8601_to_epoch(timestamp)
+    if epoch is None:
+        raise ValueError(
+            'Timestamp has to be in ISO 8601 format but was %s' % timestamp)
+
+    return epoch
+
+
+def _epoch_to_timestamp(epoch):
+    """Convert seconds since the epoch to an ISO 8601 timestamp
+
+    >>> _epoch_to_timestamp(1262114733.0)
+    '2009-12-29T19:25:33'
+    >>> _epoch_to_timestamp(1262114733.5)
+    '2009-12-29T19:25:33.5'
+    >>> _epoch_to_timestamp(float('nan')) is None
+    True
+    """
+    if epoch != epoch:
+        return None
+
+    dt = util.epoch_to_datetime(epoch)
+    timestamp = util.datetime_to_iso8601(dt)
+    if dt.microsecond:
+        timestamp += ('.%06d' % dt.microsecond).rstrip('0')
+    return timestamp
+
+
+class _StringColumn(object):
+    """Dictionary-encoded column of strings (or None)"""
+
+    def __init__(self, categories=None):
+        self.categories = list(categories or [])
+        self.codes = array.array('i')
+        self._index = dict((value, code)
+                           for code, value in enumerate(self.categories))
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def code(self, value):
+        """Get the code of value, or None if it's not in the column"""
+        return self._index.get(value)
+
+
+class EpisodeActionBatch(object):
+    """Columnar container for episode actions
+
+    >>> batch = EpisodeActionBatch.from_dicts([
+    ...     {'podcast': 'a', 'episode': 'a1', 'action': 'download'},
+    ...     {'podcast': 'b', 'episode': 'b1', 'action': 'play',
+    ...      'position': 10, 'timestamp': '2009-12-29T19:25:33'},
+    ...     {'podcast': 'a', 'episode': 'a2', 'action': 'play',
+    ...      'position': 20, 'timestamp': '2009-12-30T19:25:33'},
+    ... ])
+    >>> len(batch)
+    3
+    >>> batch.categories('podcast'), list(batch.codes('podcast'))
+    (['a', 'b'], [0, 1, 0])
+    >>> [action.episode for action in batch.filter(podcast='a')]
+    ['a1', 'a2']
+    >>> batch.filter(action='play', since=1262200000).to_dicts()[0]['episode']
+    'a2'
+    """
+    NULL = -2 ** 63
+    STRING_COLUMNS = ('podcast', 'episode', 'action', 'device')
+    NUMBER_COLUMNS = ('started', 'position', 'total')
+
+    def __init__(self):
+        self._strings = dict((name, _StringColumn())
+                             for name in self.STRING_COLUMNS)
+        self._numbers = dict((name, array.array('q'))
+                             for name in self.NUMBER_COLUMNS)
+        self._numbers['timestamp'] = array.array('d')
+
+    @classmethod
+    def from_actions(cls, actions):
+        """Create a batch from EpisodeAction objects"""
+        batch = cls()
+        batch.extend(actions)
+        return batch
+
+    @classmethod
+    def from_dicts(cls, dicts):
+        """Create a batch from actions in the JSON format of the API
+
+        Raises ValueError if an action has a missing key or a value of
+        the wrong type.
+        """
+        batch = cls()
+        for d in dicts:
+            try:
+                batch._append(d['podcast'], d['episode'], d['action'],
+                              d.get('device'), d.get('timestamp'),
+                              d.get('started'), d.get('position'),
+                              d.get('total'))
+            except KeyError as error:
+                raise ValueError('Missing key %s in action' % error)
+        return batch
+
+    def _append(self, podcast, episode, action, device, timestamp,
+                started, position, total):
+        # Convert all values before changing any column
+        numbers = [self.NULL if value is None else int(value)
+                   for value in (started, position, total)]
+        epoch = _timestamp_to_epoch(timestamp)
+
+        for name, value in zip(self.STRING_COLUMNS,
+                               (podcast, episode, action, device)):
+            self._strings[name].append(value)
+        for name, value in zip(self.NUMBER_COLUMNS, numbers):
+            self._numbers[name].append(value)
+        self._numbers['timestamp'].append(epoch)
+
+    def append(self, action):
+        """Add an EpisodeAction object"""
+        self._append(action.podcast, action.episode, action.action,
+                     action.device, action.timestamp, action.started,
+                     action.position, action.total)
+
+    def extend(self, actions):
+        """Add EpisodeAction objects"""
+        for action in actions:
+            self.append(action)
+
+    def __len__(self):
+        return len(self._numbers['timestamp'])
+
+    def __getitem__(self, index):
+        """Get the action at index as EpisodeAction object"""
+        values = []
+        for name in self.STRING_COLUMNS:
+            column = self._strings[name]
+            values.append(column.categories[column.codes[index]])
+        values.append(_epoch_to_timestamp(self._numbers['timestamp'][index]))
+        for name in self.NUMBER_COLUMNS:
+            value = self._numbers[name][index]
+            values.append(None if value == self.NULL else value)
+        return api.EpisodeAction(*values)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_actions(self):
+        """Get all actions as list of EpisodeAction objects"""
+        return list(self)
+
+    def to_dicts(self):
+        """Get all actions in the JSON format of the API (for uploads)"""
+        return [action.to_dictionary() for action in self]
+
+    def codes(self, name):
+        """Get the codes (int32 array) of a string column"""
+        return self._strings[name].codes
+
+    def categories(self, name):
+        """Get the distinct strings of a string column, in code order"""
+        return self._strings[name].categories
+
+    def column(self, name):
+        """Get a number column (array) or the values of a string column"""
+        if name in self._strings:
+            column = self._strings[name]
+            return [column.categories[code] for code in column.codes]
+        return self._numbers[name]
+
+    def as_numpy(self, name):
+        """Get a column as NumPy array that shares its memory
+
+        Number columns are returned as they are, and string columns as
+        their codes. While such arrays exist, the batch can't grow.
+        """
+        if numpy is None:
+            raise RuntimeError('NumPy is not installed')
+
+        if name in self._strings:
+            column = self._strings[name].codes
+        else:
+            column = self._numbers[name]
+        return numpy.frombuffer(column, dtype=column.typecode)
+
+    def take(self, indices):
+        """Create a batch of the actions at indices (in that order)"""
+        batch = self.__class__()
+        indices = list(indices)
+        for name, column in self._strings.items():
+            taken = batch._strings[name] = _StringColumn(column.categories)
+            taken.codes = array.array('i', map(column.codes.__getitem__,
+                                               indices))
+        for name, column in self._numbers.items():
+            batch._numbers[name] = array.array(
+                column.typecode, map(column.__getitem__, indices))
+        return batch
+
+    def filter(self, podcast=None, device=None, action=None, since=None,
+               until=None):
+        """Create a batch of the matching actions
+
+        Actions match if their podcast, device and action are equal to
+        the given values, and their timestamp is in [since, until) (in
+        seconds since the epoch). Parameters that are None are ignored.
+        """
+        masks = []
+        for name, value in (('podcast', podcast), ('device', device),
+                            ('action', action)):
+            if value is None:
+                continue
+
+            code = self._strings[name].code(value)
+            if code is None:
+                return self.take([])
+            masks.append((self._strings[name].codes, operator.eq, code))
+
+        timestamps = self._numbers['timestamp']
+        if since is not None:
+            masks.append((timestamps, operator.ge, float(since)))
+        if until is not None:
+            masks.append((timestamps, operator.lt, float(until)))
+
+        if numpy is not None:
+            selected = numpy.ones(len(self), dtype=bool)
+            for column, compare, value in masks:
+                view = numpy.frombuffer(column, dtype=column.typecode)
+                selected &= compare(view, value)
+            return self.take(numpy.flatnonzero(selected).tolist())
+
+        indices = range(len(self))
+        for column, compare, value in masks:
+            values = map(column.__getitem__, indices)
+            indices = list(itertools.compress(
+                indices, map(compare, values, itertools.repeat(value))))
+        return self.take(indices)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from mygpoclient import api
+from mygpoclient import batch
+
+import unittest
+
+FEED_URL_1 = 'http://example.com/test.rss'
+FEED_URL_2 = 'http://feeds.example.org/1/feed.atom'
+
+ACTIONS = [
+    api.EpisodeAction(FEED_URL_1, 'http://example.com/1.mp3', 'download',
+                      'phone', '2009-12-12T09:00:00'),
+    api.EpisodeAction(FEED_URL_1, 'http://example.com/1.mp3', 'play',
+                      'phone', '2009-12-12T10:00:00', 0, 120, 3600),
+    api.EpisodeAction(FEED_URL_2, 'http://example.org/a.ogg', 'play',
+                      'laptop', '2009-12-13T08:30:00.5', None, 60),
+    api.EpisodeAction(FEED_URL_2, 'http://example.org/b.ogg', 'new'),
+]
+
+
+class Test_EpisodeActionBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = batch.EpisodeActionBatch.from_actions(ACTIONS)
+
+    def test_fromActions_toDicts_roundTrip(self):
+        self.assertEqual(len(self.batch), 4)
+        self.assertEqual(self.batch.to_dicts(),
+                         [a.to_dictionary() for a in ACTIONS])
+
+    def test_fromDicts_toActions_roundTrip(self):
+        dicts = [a.to_dictionary() for a in ACTIONS]
+        actions = batch.EpisodeActionBatch.from_dicts(dicts).to_actions()
+        self.assertEqual([a.to_dictionary() for a in actions], dicts)
+
+    def test_stringColumns_areDictionaryEncoded(self):
+        self.assertEqual(self.batch.categories('podcast'),
+                         [FEED_URL_1, FEED_URL_2])
+        self.assertEqual(list(self.batch.codes('podcast')), [0, 0, 1, 1])
+        self.assertEqual(self.batch.categories('device'),
+                         ['phone', 'laptop', None])
+        self.assertEqual(self.batch.column('action'),
+                         ['download', 'play', 'play', 'new'])
+
+    def test_numberColumns_useNullForMissingValues(self):
+        NULL = batch.EpisodeActionBatch.NULL
+        self.assertEqual(list(self.batch.column('position')),
+                         [NULL, 120, 60, NULL])
+        timestamps = self.batch.column('timestamp')
+        self.assertEqual(timestamps[1] - timestamps[0], 3600)
+        self.assertTrue(timestamps[3] != timestamps[3])
+
+    def test_filter_byPodcastAndDevice(self):
+        played = self.batch.filter(podcast=FEED_URL_1, action='play')
+        self.assertEqual([a.position for a in played], [120])
+        laptop = self.batch.filter(device='laptop')
+        self.assertEqual([a.episode for a in laptop],
+                         ['http://example.org/a.ogg'])
+
+    def test_filter_byTimeRange(self):
+        start = batch._timestamp_to_epoch('2009-12-12T10:00:00')
+        end = batch._timestamp_to_epoch('2009-12-13T08:30:00.5')
+        actions = self.batch.filter(since=start, until=end)
+        self.assertEqual([a.action for a in actions], ['play'])
+        self.assertEqual(len(self.batch.filter(since=start)), 2)
+
+    def test_filter_unknownValue_returnsEmptyBatch(self):
+        self.assertEqual(len(self.batch.filter(podcast='http://x.invalid/')),
+                         0)
+
+    def test_take_reordersActions(self):
+        taken = self.batch.take([3, 0])
+        self.assertEqual([a.action for a in taken], ['new', 'download'])
+        self.assertEqual(taken[-1].timestamp, '2009-12-12T09:00:00')
+
+    def test_fromDicts_missingKey_raisesValueError(self):
+        self.assertRaises(ValueError, batch.EpisodeActionBatch.from_dicts,
+                          [{'podcast': FEED_URL_1, 'action': 'new'}])
+
+    def test_invalidValue_raisesValueError_withoutAddingAction(self):
+        dicts = [{'podcast': FEED_URL_1, 'episode': 'e', 'action': 'play',
+                  'timestamp': 'yesterday'}]
+        self.assertRaises(ValueError, batch.EpisodeActionBatch.from_dicts,
+                          dicts)
+        self.assertRaises(ValueError, self.batch._append, FEED_URL_1, 'e',
+                          'play', None, None, None, 'ten', None)
+        self.assertEqual(len(self.batch), 4)
+        self.assertEqual(len(self.batch.codes('episode')), 4)
+
+    @unittest.skipIf(batch.numpy is None, 'NumPy is not installed')
+    def test_asNumpy_sharesMemory(self):
+        positions = self.batch.as_numpy('position')
+        self.assertEqual(positions[1], 120)
+        self.batch.column('position')[1] = 150
+        self.assertEqual(positions[1], 150)
+        self.assertEqual(list(self.batch.as_numpy('podcast')), [0, 0, 1, 1])
+
+    @unittest.skipIf(batch.numpy is not None, 'NumPy is installed')
+    def test_asNumpy_withoutNumpy_raisesRuntimeError(self):
+        self.assertRaises(RuntimeError, self.batch.as_numpy, 'position')
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Response caches for conditional GET requests
+
+A cache keeps the validators (ETag and Last-Modified) of a response
+together with its decoded body. JsonClient sends the validators with
+later requests for the same URI, and if the server answers with "304
+Not Modified", the body is taken from the cache without downloading or
+parsing it again:
+
+    client = MygPodderClient(username, password, cache=MemoryCache())
+
+Entries are stored pickled, so every hit returns a fresh copy of the
+body, and the size of an entry is the size of its pickle. If the total
+size exceeds max_size bytes, the least recently used entries are evicted.
+"""
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+
+class MemoryCache(object):
+    """Cache that keeps the entries in memory
+
+    >>> cache = MemoryCache(max_size=1024)
+    >>> cache.set('http://gpodder.net/toplist/5.json', '"x"', None, [1, 2])
+    >>> cache.get('http://gpodder.net/toplist/5.json')
+    ('"x"', None, [1, 2])
+    >>> cache.get('http://gpodder.net/toplist/10.json') is None
+    True
+    """
+    DEFAULT_MAX_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        """Get (etag, last_modified, value) for key, or None"""
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is None:
+                return None
+            self._entries[key] = data
+
+        return pickle.loads(data)
+
+    def set(self, key, etag, last_modified, value):
+        """Store the validators and the decoded body for key"""
+        data = pickle.dumps((etag, last_modified, value),
+                            pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            if len(data) > self.max_size:
+                return
+
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FileCache(object):
+    """Cache that keeps the entries as files in a directory
+
+    Entries survive the process, so a nightly job can revalidate what it
+    downloaded the night before. The least recently used entries (by
+    modification time of their files) are evicted first. The directory
+    should not be shared with other files, and as the entries are
+    pickled, it must not be writable by other users.
+    """
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+    SUFFIX = '.cache'
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # filename -> size in bytes, least recently used first
+        self._files = collections.OrderedDict()
+        files = []
+        for filename in os.listdir(directory):
+            if filename.endswith(self.SUFFIX):
+                stat = os.stat(os.path.join(directory, filename))
+                files.append((stat.st_mtime, filename, stat.st_size))
+        for _, filename, size in sorted(files):
+            self._files[filename] = size
+        self.size = sum(self._files.values())
+
+    def _filename(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return digest + self.SUFFIX
+
+    def _remove(self, filename):
+        self.size -= self._files.pop(filename)
+        try:
+            os.unlink(os.path.join(self.directory, filename))
+        except OSError:
+            pass
+
+    def get(self, key):
+        """Get (etag, last_modified, value) for key, or None"""
+        filename = self._filename(key)
+        path = os.path.join(self.directory, filename)
+        with self._lock:
+            if filename not in self._files:
+                return None
+
+            try:
+                with open(path, 'rb') as fp:
+                    stored_key, etag, last_modified, value = pickle.load(fp)
+            except Exception:
+                # Missing or corrupt file
+                self._remove(filename)
+                return None
+
+            if stored_key != key:
+                return None
+
+            self._files[filename] = self._files.pop(filename)
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+        return etag, last_modified, value
+
+    def set(self, key, etag, last_modified, value):
+        """Store the validators and the decoded body for key"""
+        filename = self._filename(key)
+        data = pickle.dumps((key, etag, last_modified, value),
+                            pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if filename in self._files:
+                self._remove(filename)
+            if len(data) > self.max_size:
+                return
+
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    fp.write(data)
+                os.replace(tmp, os.path.join(self.directory, filename))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+            self._files[filename] = len(data)
+            self.size += len(data)
+            while self.size > self.max_size:
+                self._remove(next(iter(self._files)))
+
+    def clear(self):
+        with self._lock:
+            for filename in list(self._files):
+                self._remove(filename)
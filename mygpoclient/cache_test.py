@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+
+from mygpoclient import cache
+
+import unittest
+
+VALUE = [{'url': 'http://example.com/feed.rss', 'subscribers': 42}]
+
+
+class CacheTests(object):
+    def test_get_returnsStoredEntry(self):
+        self.cache.set('a', '"etag"', 'Sat, 01 Jan 2000 00:00:00 GMT', VALUE)
+        self.assertEqual(self.cache.get('a'),
+                         ('"etag"', 'Sat, 01 Jan 2000 00:00:00 GMT', VALUE))
+        self.assertEqual(self.cache.get('b'), None)
+
+    def test_get_returnsCopy(self):
+        self.cache.set('a', '"etag"', None, VALUE)
+        self.cache.get('a')[2].append('modified')
+        self.assertEqual(self.cache.get('a')[2], VALUE)
+
+    def test_set_replacesEntry(self):
+        self.cache.set('a', '"1"', None, VALUE)
+        size = self.cache.size
+        self.cache.set('a', '"2"', None, VALUE)
+        self.assertEqual(self.cache.get('a')[0], '"2"')
+        self.assertEqual(self.cache.size, size)
+
+    def test_leastRecentlyUsed_isEvicted(self):
+        self.cache.set('a', None, None, VALUE)
+        self.cache.max_size = self.cache.size * 2
+        self.cache.set('b', None, None, VALUE)
+        self.cache.get('a')
+        self.cache.set('c', None, None, VALUE)
+        self.assertNotEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.get('b'), None)
+        self.assertNotEqual(self.cache.get('c'), None)
+        self.assertTrue(self.cache.size <= self.cache.max_size)
+
+    def test_tooLargeEntry_isNotStored(self):
+        self.cache.max_size = 10
+        self.cache.set('a', None, None, VALUE)
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.size, 0)
+
+    def test_clear(self):
+        self.cache.set('a', None, None, VALUE)
+        self.cache.clear()
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.size, 0)
+
+
+class Test_MemoryCache(CacheTests, unittest.TestCase):
+    def setUp(self):
+        self.cache = cache.MemoryCache()
+
+
+class Test_FileCache(CacheTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = cache.FileCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_surviveRestart(self):
+        self.cache.set('a', '"etag"', None, VALUE)
+        self.assertEqual(cache.FileCache(self.directory).get('a'),
+                         ('"etag"', None, VALUE))
+
+    def test_corruptFile_isIgnored(self):
+        self.cache.set('a', '"etag"', None, VALUE)
+        for filename in os.listdir(self.directory):
+            with open(os.path.join(self.directory, filename), 'wb') as fp:
+                fp.write(b'garbage')
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.size, 0)
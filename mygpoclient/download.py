@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Batches and watermarks for downloads of many episode actions
+
+MygPodderClient.iter_episode_action_batches yields the actions of a
+download in batches (see iter_batches) and records every consumed batch
+in a Watermark, so a long download can be picked up after a restart:
+
+    for changes in client.iter_episode_action_batches(
+            batch_size=1000, watermark='actions.watermark'):
+        tracker.update_changes(changes)
+"""
+
+import itertools
+import os
+
+from mygpoclient import json
+from mygpoclient import util
+
+
+def iter_batches(items, batch_size):
+    """Split an iterable into lists of at most batch_size items
+
+    Yields (batch, last) tuples, where last is True for the last batch.
+    One item is read ahead to find out, but never a whole batch. An
+    empty iterable gives one empty batch.
+
+    >>> list(iter_batches(range(5), 2))
+    [([0, 1], False), ([2, 3], False), ([4], True)]
+    >>> list(iter_batches(range(4), 2))
+    [([0, 1], False), ([2, 3], True)]
+    >>> list(iter_batches([], 2))
+    [([], True)]
+    """
+    items = iter(items)
+    end = object()
+    item = next(items, end)
+    if item is end:
+        yield [], True
+        return
+
+    while item is not end:
+        batch = [item]
+        for item in items:
+            if len(batch) == batch_size:
+                break
+            batch.append(item)
+        else:
+            item = end
+        yield batch, item is end
+
+
+def fingerprint(action):
+    """Get a JSON-serializable summary of an EpisodeAction
+
+    Used to check that a resumed download is at the same action.
+    """
+    return [action.podcast, action.episode, action.action,
+            action.timestamp, action.device]
+
+
+def resume(actions, offset, last):
+    """Skip the actions that have been consumed before
+
+    Returns an iterator with the actions after the first offset ones,
+    or None if the action at offset doesn't have the fingerprint last
+    (i.e. the server's response has changed since).
+
+    >>> from mygpoclient.api import EpisodeAction
+    >>> actions = [EpisodeAction('http://a/', e, 'play') for e in 'abc']
+    >>> [a.episode for a in resume(actions, 2, fingerprint(actions[1]))]
+    ['c']
+    >>> resume(actions, 2, fingerprint(actions[0])) is None
+    True
+    """
+    actions = iter(actions)
+    if offset == 0:
+        return actions
+
+    for action in itertools.islice(actions, offset - 1, offset):
+        if fingerprint(action) == last:
+            return actions
+    return None
+
+
+class Watermark(object):
+    """File that records how far the episode actions have been read
+
+    It holds the since value of the download, the number of actions of
+    its response that have been consumed (the offset) and the
+    fingerprint of the last consumed action. Once all actions have been
+    consumed, it holds the new since value (with offset 0). The file is
+    replaced atomically.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self, since=None):
+        """Get (since, offset, last), or (since, 0, None) without one"""
+        try:
+            with open(self.filename, 'rb') as fp:
+                data = json.JsonClient.decode(fp.read())
+        except (IOError, OSError):
+            if os.path.exists(self.filename):
+                raise
+            return since, 0, None
+
+        return data['since'], data['offset'], data.get('last')
+
+    def save(self, since, offset, last=None):
+        data = json.JsonClient.encode({'since': since, 'offset': offset,
+                                       'last': last})
+        util.replace_file(self.filename, data)
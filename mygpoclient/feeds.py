@@ -15,33 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import absolute_import
-
-import time
-
-try:
-    # Python 3
-    from urllib.parse import urljoin, urlencode
-
-except ImportError:
-    # Python 2
-    from urlparse import urljoin
-    from urllib import urlencode
-
-from datetime import datetime
-from email import utils
+from urllib.parse import urljoin, urlencode
 
 import mygpoclient.json
 
-try:
-    # Prefer the usage of the simplejson module, as it
-    # is most likely newer if it's installed as module
-    # than the built-in json module (and is mandatory
-    # in Python versions before 2.6, anyway).
-    import simplejson as json
-except ImportError:
-    # Python 2.6 ships the "json" module by default
-    import json
+from mygpoclient import util
 
 
 BASE_URL = 'http://mygpo-feedservice.appspot.com'
@@ -75,11 +53,17 @@ class FeedServiceResponse(list):
 
 
 class FeedserviceClient(mygpoclient.json.JsonClient):
-    """A special-cased JsonClient for mygpo-feedservice"""
+    """A special-cased JsonClient for mygpo-feedservice
+
+    Additional keyword arguments (such as rate_limiter) are passed on
+    to JsonClient. Responses are decoded with the default codec of the
+    json module (see mygpoclient.json.get_codec).
+    """
 
-    def __init__(self, username=None, password=None, base_url=BASE_URL):
+    def __init__(self, username=None, password=None, base_url=BASE_URL,
+                 **kwargs):
         self._base_url = base_url
-        super(FeedserviceClient, self).__init__(username, password)
+        super(FeedserviceClient, self).__init__(username, password, **kwargs)
 
     def _prepare_request(self, method, uri, data):
         """Sets headers required by mygpo-feedservice
@@ -96,7 +80,6 @@ class FeedserviceClient(mygpoclient.json.JsonClient):
         request = mygpoclient.http.HttpClient._prepare_request(
             method, uri, post_data)
         request.add_header('Accept', 'application/json')
-        request.add_header('Accept-Encoding', 'gzip')
 
         last_modified = data.get('last_modified', None)
         if last_modified is not None:
@@ -156,16 +139,15 @@ class FeedserviceClient(mygpoclient.json.JsonClient):
     @staticmethod
     def parse_header_date(date_str):
         """
-        Parses dates in RFC2822 format to datetime objects
+        Parses dates in RFC2822 format to datetime objects (in UTC)
         """
         if not date_str:
             return None
-        ts = time.mktime(utils.parsedate(date_str))
-        return datetime.utcfromtimestamp(ts)
+        return util.rfc2822_to_datetime(date_str)
 
     @staticmethod
     def format_header_date(datetime_obj):
         """
-        Formats the given datetime object for use in HTTP headers
+        Formats the given datetime object (in UTC) for use in HTTP headers
         """
-        return utils.formatdate(time.mktime(datetime_obj.timetuple()))
+        return util.datetime_to_rfc2822(datetime_obj)
@@ -15,41 +15,392 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-try:
-    from urllib import request
-    from urllib.error import HTTPError
-    from http.cookiejar import CookieJar
-
-except ImportError:
-    import urllib2 as request
-    from urllib2 import HTTPError
-    from cookielib import CookieJar
+from urllib import request
+from urllib.error import HTTPError, URLError
+from http.cookiejar import CookieJar, LWPCookieJar, LoadError
+from http import client as httplib
+
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import zlib
 
 import mygpoclient
 
+from mygpoclient import ratelimit
+from mygpoclient import retry
+
+# Monotonic clock for measuring idle times
+_now = time.monotonic
+
+# Content codings that the server may use for response bodies
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# Size of the blocks in which response bodies are read and decoded
+CHUNK_SIZE = 64 * 1024
+
+
+class ContentDecoder(object):
+    """Incremental decoder for the Content-Encoding of a response
+
+    Supports gzip and deflate (both with and without zlib header) as
+    well as the identity encoding. The body can be passed in blocks as
+    it is received, so the full compressed body is never in memory.
+    Corrupt bodies raise UnknownResponse.
+
+    >>> body = zlib.compress(b'x' * 1000)
+    >>> decoder = ContentDecoder('deflate')
+    >>> data = decoder.decode(body[:10]) + decoder.decode(body[10:])
+    >>> data + decoder.flush() == b'x' * 1000
+    True
+    >>> ContentDecoder(None).decode(b'plain')
+    b'plain'
+    """
+
+    def __init__(self, encoding):
+        encoding = (encoding or 'identity').strip().lower()
+        # True until the first two bytes of a deflate body show if it
+        # has a zlib header; they are kept in _head until then
+        self._deflate = (encoding == 'deflate')
+        self._head = b''
+        if encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self._deflate:
+            self._decompressor = zlib.decompressobj()
+        elif encoding == 'identity':
+            self._decompressor = None
+        else:
+            raise UnknownResponse('Unsupported content encoding: ' +
+                                  encoding)
+
+    def decode(self, data):
+        """Decode the next block of the body"""
+        if self._decompressor is None:
+            return data
+
+        try:
+            if self._deflate:
+                return self._decode_head(data)
+            return self._decompressor.decompress(data)
+        except zlib.error as error:
+            raise UnknownResponse('Invalid compressed body: %s' % error)
+
+    def _decode_head(self, data):
+        self._head += data
+        if len(self._head) < 2:
+            return b''
+
+        data, self._head = self._head, b''
+        self._deflate = False
+        try:
+            return self._decompressor.decompress(data)
+        except zlib.error:
+            # Some servers send raw deflate data without zlib header
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressor.decompress(data)
+
+    def flush(self):
+        """Get the remaining decoded data at the end of the body"""
+        if self._decompressor is None:
+            return b''
+        try:
+            return (self._decompressor.decompress(self._head) +
+                    self._decompressor.flush())
+        except zlib.error as error:
+            raise UnknownResponse('Invalid compressed body: %s' % error)
+
+
+# Per-thread state: the deadline of the requests made by the thread
+_local = threading.local()
+
+
+def remaining_time():
+    """Get the seconds left until the current deadline (or None)
+
+    >>> remaining_time() is None
+    True
+    >>> with deadline(30):
+    ...     0 < remaining_time() <= 30
+    True
+    """
+    current = getattr(_local, 'deadline', None)
+    if current is None:
+        return None
+    return current - _now()
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Limit the total time of all requests made in a with block
+
+    All requests made by the current thread inside the block, including
+    retries, redirects, authentication and reading the response body,
+    have to be finished within seconds, otherwise RequestTimeout is
+    raised. A nested deadline can only shorten the outer deadline, and
+    None does not add a deadline.
+    """
+    outer = getattr(_local, 'deadline', None)
+    current = outer
+    if seconds is not None:
+        current = _now() + seconds
+        if outer is not None:
+            current = min(current, outer)
+
+    _local.deadline = current
+    try:
+        yield
+    finally:
+        _local.deadline = outer
+
+
+def accepts_deadline(f):
+    """Add an optional "deadline" keyword argument (in seconds) to f
+
+    If f returns a generator, the deadline starts when f is called and
+    applies whenever the generator runs, but not to its consumer.
+    """
+
+    @functools.wraps(f)
+    def _wrapper(*args, **kwargs):
+        seconds = kwargs.pop('deadline', None)
+        end = None if seconds is None else _now() + seconds
+        with deadline(seconds):
+            result = f(*args, **kwargs)
+        if inspect.isgenerator(result):
+            return _generator_with_deadline(result, end)
+        return result
+
+    return _wrapper
+
+
+def _generator_with_deadline(generator, end):
+    """Run generator under a deadline that ends at end (or None)"""
+    try:
+        while True:
+            with deadline(None if end is None else end - _now()):
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        generator.close()
+
+
+def bind_deadline(f):
+    """Make f run under the current thread's deadline in any thread
+
+    Used for the work that is handed to a thread pool, so that the
+    requests of the workers count towards the deadline of the caller.
+
+    >>> with deadline(30):
+    ...     remaining = bind_deadline(remaining_time)
+    >>> 0 < remaining() <= 30
+    True
+    """
+    current = getattr(_local, 'deadline', None)
+
+    @functools.wraps(f)
+    def _wrapper(*args, **kwargs):
+        outer = getattr(_local, 'deadline', None)
+        _local.deadline = current
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _local.deadline = outer
+
+    return _wrapper
+
+
+def _socket_timeout(timeout):
+    """Limit a socket timeout to the time left until the deadline
+
+    A timeout of None means the default socket timeout. Raises
+    RequestTimeout if the deadline has already passed.
+    """
+    if timeout is None:
+        timeout = socket.getdefaulttimeout()
+
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise RequestTimeout('deadline exceeded')
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def _is_stream(data):
+    """Check if a request body is an iterable of blocks of bytes
+
+    Such bodies are sent with chunked transfer encoding while they are
+    being produced, instead of being held in memory as a whole.
+    """
+    return data is not None and not isinstance(data, (bytes, bytearray,
+                                                      type(u'')))
+
+
+def _gzip_blocks(blocks):
+    """Compress an iterable of blocks of bytes with gzip on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        block = compressor.compress(block)
+        if block:
+            yield block
+    yield compressor.flush()
+
+
+def iter_content(response, chunk_size=CHUNK_SIZE):
+    """Read the body of a response in decoded blocks
+
+    The Content-Encoding of the response (if any) is undone block by
+    block while the body is read, so even large compressed responses
+    only need memory for a single block.
+    """
+    headers = getattr(response, 'headers', None)
+    decoder = ContentDecoder(headers and headers.get('Content-Encoding'))
+    while True:
+        data = response.read(chunk_size)
+        if not data:
+            break
+        data = decoder.decode(data)
+        if data:
+            yield data
+
+    data = decoder.flush()
+    if data:
+        yield data
+
 
 class SimpleHttpPasswordManager(request.HTTPPasswordMgr):
     """Simplified password manager for urllib2
 
-    This class always provides the username/password combination that
-    is passed to it as constructor argument, independent of the realm
-    or authuri that is used.
+    This class provides the username/password combination that is
+    passed to it as constructor argument for every realm, but only for
+    the servers (scheme, host and port) of the URIs registered with
+    add_uri, so the credentials are never sent to other servers (e.g.
+    when a request is redirected).
+
+    The credentials are sent pre-emptively with every request (so that
+    authenticated requests don't need an extra round-trip to receive
+    the 401 challenge first), unless preemptive is set to False.
+
+    >>> manager = SimpleHttpPasswordManager('john', 'secret')
+    >>> manager.add_uri('https://gpodder.net/api/2/devices/john.json')
+    >>> manager.is_authenticated('https://gpodder.net/subscriptions/john')
+    True
+    >>> manager.is_authenticated('http://gpodder.net/subscriptions/john')
+    False
+    >>> manager.find_user_password(None, 'https://example.com/')
+    (None, None)
     """
 
     # The maximum number of authentication retries
     MAX_RETRIES = 3
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, preemptive=True):
         self._username = username
         self._password = password
+        self._preemptive = preemptive
         self._count = 0
+        self._authorities = set()
+
+    def _is_registered(self, uri):
+        return self.reduce_uri(uri)[0] in self._authorities
+
+    def add_uri(self, uri):
+        """Allow sending the credentials to the server of uri"""
+        self._authorities.add(self.reduce_uri(uri)[0])
 
     def find_user_password(self, realm, authuri):
-        self._count += 1
-        if self._count > self.MAX_RETRIES:
+        if not self._is_registered(authuri):
             return None, None
+
+        # Pre-emptive lookups have no realm and don't count as retries
+        if realm is not None:
+            self._count += 1
+            if self._count > self.MAX_RETRIES:
+                return None, None
         return self._username, self._password
 
+    def is_authenticated(self, authuri):
+        """Used by HTTPBasicAuthHandler to decide on pre-emptive auth"""
+        return self._preemptive and self._is_registered(authuri)
+
+    def update_authenticated(self, uri, is_authenticated=False):
+        # Errors such as 404 must not disable pre-emptive authentication
+        pass
+
+
+class PersistentCookieJar(LWPCookieJar):
+    """Cookie jar that is kept in a file across processes
+
+    Existing cookies are loaded from the file on creation, and the file
+    is (atomically) rewritten whenever the server changes a cookie.
+    Session cookies are stored as well, so that a login session can be
+    reused by later processes, or by several workers at the same time.
+
+    Use for_account to get the jar for a given user and server.
+    """
+
+    def __init__(self, filename):
+        LWPCookieJar.__init__(self, filename)
+        if os.path.exists(filename):
+            try:
+                self.load(ignore_discard=True)
+            except (IOError, LoadError):
+                # Start with an empty jar if the file is corrupt
+                pass
+
+    @classmethod
+    def for_account(cls, directory, username, root_url):
+        """Get the cookie jar for a username and server in directory
+
+        >>> a = PersistentCookieJar.for_account('/tmp', 'john', 'gpodder.net')
+        >>> b = PersistentCookieJar.for_account('/tmp', 'jane', 'gpodder.net')
+        >>> a.filename == b.filename
+        False
+        """
+        key = '%s\n%s' % (username, root_url)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return cls(os.path.join(directory, 'cookies-%s.lwp' % digest))
+
+    def _snapshot(self):
+        return set((c.domain, c.path, c.name, c.value, c.expires)
+                   for c in self)
+
+    def extract_cookies(self, response, request):
+        self._cookies_lock.acquire()
+        try:
+            before = self._snapshot()
+            LWPCookieJar.extract_cookies(self, response, request)
+            if self._snapshot() != before:
+                self.save()
+        finally:
+            self._cookies_lock.release()
+
+    def save(self, filename=None, ignore_discard=True, ignore_expires=False):
+        """Write the cookies to a temporary file and move it in place"""
+        if filename is None:
+            filename = self.filename
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or '.')
+        os.close(fd)
+        try:
+            LWPCookieJar.save(self, tmp, ignore_discard, ignore_expires)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
 
 class HttpRequest(request.Request):
     """Request object with customizable method
@@ -81,6 +432,247 @@ class HttpRequest(request.Request):
             return request.Request.get_method(self)
 
 
+class ConnectionPool(object):
+    """Pool of idle HTTP/1.1 keep-alive connections
+
+    Connections are kept per host (and connection type) after their
+    response has been read completely, and are handed out again for
+    later requests to the same host, which saves the TCP (and TLS)
+    handshake for every request after the first one.
+
+    At most maxsize idle connections are kept for every host, and
+    connections that have been idle for more than idle_timeout seconds
+    are closed instead of being reused. A pool can be shared between
+    several HttpClient instances (also across threads).
+
+    >>> pool = ConnectionPool(maxsize=2, idle_timeout=10)
+    >>> pool.get('example.org') is None
+    True
+    """
+    DEFAULT_MAXSIZE = 10
+    DEFAULT_IDLE_TIMEOUT = 30
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    @staticmethod
+    def _is_dropped(connection):
+        """Check if the server has closed an idle connection
+
+        An idle keep-alive socket should never become readable, so if
+        it does, the server has either closed it or sent garbage.
+        """
+        sock = connection.sock
+        if sock is None:
+            return True
+
+        try:
+            if hasattr(select, 'poll'):
+                # Unlike select, poll works for descriptors >= FD_SETSIZE
+                poller = select.poll()
+                poller.register(sock, select.POLLIN)
+                return bool(poller.poll(0))
+
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (ValueError, select.error):
+            return True
+
+        return bool(readable)
+
+    def get(self, key):
+        """Get an idle connection for key, or None if there is none"""
+        now = _now()
+        with self._lock:
+            connections = self._idle.get(key, [])
+            while connections:
+                connection, released = connections.pop()
+                if now - released > self.idle_timeout:
+                    # All remaining connections have been idle even longer
+                    expired = [connection] + [c for c, _ in connections]
+                    del connections[:]
+                    for connection in expired:
+                        connection.close()
+                elif self._is_dropped(connection):
+                    connection.close()
+                else:
+                    return connection
+
+        return None
+
+    def put(self, key, connection):
+        """Return a connection with no outstanding response to the pool"""
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.maxsize:
+                connections.append((connection, _now()))
+                return
+
+        connection.close()
+
+    def clear(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+
+class _PooledHTTPResponse(httplib.HTTPResponse):
+    """HTTP response that returns its connection to the pool
+
+    The connection is only released once the response body has been
+    read completely, and only if the server has not asked to close the
+    connection. Responses that are closed early discard the connection.
+
+    While a deadline is set, the body is read one block at a time as it
+    arrives, and the socket timeout is limited to the time left before
+    each block.
+    """
+    _release = None
+    _sock = None
+    _read_timeout = None
+
+    def read(self, amt=None):
+        if self._sock is None or remaining_time() is None:
+            return httplib.HTTPResponse.read(self, amt)
+
+        blocks = []
+        size = 0
+        while amt is None or size < amt:
+            self._sock.settimeout(_socket_timeout(self._read_timeout))
+            block = self.read1(CHUNK_SIZE if amt is None else amt - size)
+            if not block:
+                break
+            blocks.append(block)
+            size += len(block)
+            if self.length == 0:
+                # Unlike read, read1 doesn't release a finished response
+                self._close_conn()
+
+        return b''.join(blocks)
+
+    def _close_conn(self):
+        release, self._release = self._release, None
+        httplib.HTTPResponse._close_conn(self)
+        if release is not None and not self.will_close:
+            release()
+
+    def close(self):
+        # Unread data left on the connection, so it can't be reused
+        self._release = None
+        httplib.HTTPResponse.close(self)
+
+
+class _KeepAliveMixin(object):
+    """Replacement for AbstractHTTPHandler.do_open that uses a pool"""
+
+    # Errors on a reused connection that mean the server has already
+    # closed it, in which case it's safe to retry on a fresh connection
+    STALE_ERRORS = (httplib.BadStatusLine, ConnectionError)
+
+    # Socket timeouts in seconds (None means the default socket timeout)
+    connect_timeout = None
+    read_timeout = None
+
+    def do_open(self, http_class, req, **http_conn_args):
+        host = req.host
+        if not host:
+            raise URLError('no host given')
+        connect_timeout = _socket_timeout(self.connect_timeout)
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update((k, v) for k, v in req.headers.items()
+                       if k not in headers)
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        tunnel_headers = {}
+        if req._tunnel_host and 'Proxy-Authorization' in headers:
+            # Proxy-Authorization should not be sent to origin server
+            tunnel_headers['Proxy-Authorization'] = \
+                headers.pop('Proxy-Authorization')
+
+        key = (http_class, host, req._tunnel_host)
+        while True:
+            if _is_stream(req.data):
+                # A streamed body can't be sent again after a stale
+                # connection fails, so don't risk reusing one
+                connection = None
+            else:
+                connection = self._pool.get(key)
+            reused = connection is not None
+            if connection is None:
+                connection = http_class(host, timeout=connect_timeout,
+                                        **http_conn_args)
+                connection.response_class = _PooledHTTPResponse
+                connection.set_debuglevel(self._debuglevel)
+                if req._tunnel_host:
+                    connection.set_tunnel(req._tunnel_host,
+                                          headers=tunnel_headers)
+
+            try:
+                try:
+                    if connection.sock is None:
+                        connection.connect()
+                    connection.sock.settimeout(
+                        _socket_timeout(self.read_timeout))
+                    connection.request(
+                        req.get_method(), req.selector, req.data, headers,
+                        encode_chunked=req.has_header('Transfer-encoding'))
+                except self.STALE_ERRORS:
+                    raise
+                except OSError as err:
+                    raise URLError(err)
+                response = connection.getresponse()
+            except self.STALE_ERRORS as err:
+                connection.close()
+                if reused:
+                    continue
+                raise URLError(err)
+            except BaseException:
+                connection.close()
+                raise
+
+            break
+
+        response._release = functools.partial(self._pool.put, key,
+                                              connection)
+        response._sock = connection.sock
+        response._read_timeout = self.read_timeout
+        response.url = req.get_full_url()
+        response.msg = response.reason
+        return response
+
+
+class PooledHTTPHandler(_KeepAliveMixin, request.HTTPHandler):
+    """urllib handler for http:// URLs that reuses pooled connections"""
+
+    def __init__(self, pool, debuglevel=0, connect_timeout=None,
+                 read_timeout=None):
+        request.HTTPHandler.__init__(self, debuglevel)
+        self._pool = pool
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+
+if hasattr(request, 'HTTPSHandler'):
+    class PooledHTTPSHandler(_KeepAliveMixin, request.HTTPSHandler):
+        """urllib handler for https:// URLs that reuses pooled connections"""
+
+        def __init__(self, pool, debuglevel=0, context=None,
+                     connect_timeout=None, read_timeout=None):
+            request.HTTPSHandler.__init__(self, debuglevel, context)
+            self._pool = pool
+            self.connect_timeout = connect_timeout
+            self.read_timeout = read_timeout
+
+
 # Possible exceptions that will be raised by HttpClient
 class Unauthorized(Exception):
     pass
@@ -98,25 +690,105 @@ class UnknownResponse(Exception):
     pass
 
 
+class NotModified(UnknownResponse):
+    """Raised for "304 Not Modified" responses to conditional requests"""
+    pass
+
+
+class RequestTimeout(Exception):
+    """Raised if the server or the deadline of a request timed out"""
+    pass
+
+
+def _status_error(code):
+    """Get the exception for a HTTP error status code"""
+    if code == 404:
+        return NotFound()
+    elif code == 401:
+        return Unauthorized()
+    elif code == 400:
+        return BadRequest()
+    elif code == 304:
+        return NotModified(code)
+    else:
+        return UnknownResponse(code)
+
+
+def _network_error(error):
+    """Replace connect and read timeouts with RequestTimeout"""
+    reason = getattr(error, 'reason', error)
+    if isinstance(reason, socket.timeout):
+        return RequestTimeout(str(reason))
+    return error
+
+
 class HttpClient(object):
     """A comfortable HTTP client
 
     This class hides the gory details of the underlying HTTP protocol
     from the rest of the code by providing a simple interface for doing
     requests and handling authentication.
+
+    Connections are kept open and reused for later requests to the
+    same host. The optional pool parameter can be used to pass in a
+    ConnectionPool that is shared with other clients; by default, each
+    client gets its own pool.
+
+    The optional cookie_jar parameter can be used to keep the session
+    cookies in a PersistentCookieJar, so that they can be reused by
+    other processes.
+
+    If compress_threshold is set, request bodies of at least that many
+    bytes are sent gzip-compressed (Content-Encoding: gzip). Smaller
+    bodies are sent as-is, as compressing them isn't worth the effort.
+
+    Request data can also be an iterable of blocks of bytes, which is
+    sent with chunked transfer encoding while it is being iterated.
+
+    Failed requests are retried as decided by retry_policy (see the
+    retry.RetryPolicy class); by default, requests are not retried.
+    Requests with an iterable body are never retried.
+
+    Every request (and every retry) takes a token from rate_limiter (a
+    ratelimit.RateLimiter, which can be shared between clients) if set.
+
+    The connect_timeout and read_timeout (in seconds) limit the time
+    for connecting to the server and for waiting for data from it. A
+    deadline limits the total time of each request, including retries,
+    redirects and reading the body. Timeouts raise RequestTimeout (see
+    also the deadline function for limiting a group of requests).
     """
 
-    def __init__(self, username=None, password=None):
+    def __init__(self, username=None, password=None, pool=None,
+                 cookie_jar=None, compress_threshold=None, retry_policy=None,
+                 rate_limiter=None, connect_timeout=None, read_timeout=None,
+                 deadline=None):
         self._username = username
         self._password = password
-        self._cookie_jar = CookieJar()
-        cookie_handler = request.HTTPCookieProcessor(self._cookie_jar)
+        self._compress_threshold = compress_threshold
+        self._retry_policy = retry_policy
+        self._rate_limiter = rate_limiter
+        self._deadline = deadline
+        if cookie_jar is None:
+            cookie_jar = CookieJar()
+        self._cookie_jar = cookie_jar
+        if pool is None:
+            pool = ConnectionPool()
+        self._pool = pool
+
+        timeouts = dict(connect_timeout=connect_timeout,
+                        read_timeout=read_timeout)
+        handlers = [PooledHTTPHandler(pool, **timeouts),
+                    request.HTTPCookieProcessor(self._cookie_jar)]
+        if hasattr(request, 'HTTPSHandler'):
+            handlers.append(PooledHTTPSHandler(pool, **timeouts))
+        self._password_manager = None
         if username is not None and password is not None:
-            password_manager = SimpleHttpPasswordManager(username, password)
-            auth_handler = request.HTTPBasicAuthHandler(password_manager)
-            self._opener = request.build_opener(auth_handler, cookie_handler)
-        else:
-            self._opener = request.build_opener(cookie_handler)
+            self._password_manager = SimpleHttpPasswordManager(username,
+                                                               password)
+            handlers.append(request.HTTPBasicAuthHandler(
+                self._password_manager))
+        self._opener = request.build_opener(*handlers)
 
     @staticmethod
     def _prepare_request(method, uri, data):
@@ -129,32 +801,164 @@ class HttpClient(object):
 
         request.set_method(method)
         request.add_header('User-agent', mygpoclient.user_agent)
+        request.add_header('Accept-Encoding', ACCEPT_ENCODING)
         return request
 
+    def _compress_request(self, request):
+        """Compress the request body if it's above the threshold
+
+        Streamed bodies have no known size, so they are always
+        compressed (while they are sent) if a threshold is set.
+        """
+        data = request.data
+        if self._compress_threshold is None or data is None:
+            return
+
+        if _is_stream(data):
+            request.data = _gzip_blocks(data)
+        elif isinstance(data, bytes) and len(data) >= self._compress_threshold:
+            compressor = zlib.compressobj(6, zlib.DEFLATED,
+                                          16 + zlib.MAX_WBITS)
+            request.data = compressor.compress(data) + compressor.flush()
+        else:
+            return
+
+        request.add_header('Content-Encoding', 'gzip')
+
     @staticmethod
     def _process_response(response):
-        return response.read()
+        headers = getattr(response, 'headers', None)
+        if not (headers and headers.get('Content-Encoding')):
+            return response.read()
+        return b''.join(iter_content(response))
+
+    def _handle_response(self, method, uri, response):
+        """Get the result of a successful request from its response"""
+        return self._process_response(response)
+
+    @staticmethod
+    def _stream_response(response):
+        """Yield the decoded body blocks and close the response"""
+        try:
+            for block in iter_content(response):
+                yield block
+        finally:
+            response.close()
 
-    def _request(self, method, uri, data, **kwargs):
+    def _request(self, method, uri, data, headers=None, stream=False,
+                 **kwargs):
         """Request and exception handling
 
         Carries out a request with a given method (GET, POST, PUT) on
         a given URI with optional data (data only makes sense for POST
         and PUT requests and should be None for GET requests).
+        Additional request headers can be passed in as a dict.
+
+        If stream is True, a generator of the (decoded) body blocks is
+        returned instead of the processed body. The body is only read
+        when the generator is consumed (outside of any deadline), and
+        errors while reading it are neither mapped nor retried.
+
+        Exceptions raised by this method have an "attempts" attribute
+        with the number of attempts made according to the retry policy.
         """
+        if self._password_manager is not None:
+            # Credentials go to the requested server, not redirect targets
+            self._password_manager.add_uri(uri)
         request = self._prepare_request(method, uri, data)
-        try:
-            response = self._opener.open(request)
-        except HTTPError as http_error:
-            if http_error.code == 404:
-                raise NotFound()
-            elif http_error.code == 401:
-                raise Unauthorized()
-            elif http_error.code == 400:
-                raise BadRequest()
+        self._compress_request(request)
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        with deadline(self._deadline):
+            return self._send(method, uri, request, stream)
+
+    def _acquire_token(self, host):
+        """Take a token of the rate limiter, waiting until the deadline
+
+        Raises RateLimitExceeded if the limiter doesn't give a token in
+        time, or RequestTimeout if the deadline expires first.
+        """
+        limiter = self._rate_limiter
+        timeout = limiter.timeout
+        remaining = remaining_time()
+        if remaining is not None and (timeout is None or remaining < timeout):
+            if not limiter.acquire(host, timeout=max(remaining, 0)):
+                if not limiter.blocking:
+                    raise ratelimit.RateLimitExceeded(host)
+                raise RequestTimeout('deadline exceeded')
+        elif not limiter.acquire(host):
+            raise ratelimit.RateLimitExceeded(host)
+
+    def _send(self, method, uri, request, stream=False):
+        """Send a request, retrying it according to the retry policy"""
+        policy = self._retry_policy
+        started = _now()
+        attempt = 0
+        while True:
+            attempt += 1
+            status = retry_after = None
+            # True while an attempt is under way that the policy allowed
+            # with check, but whose outcome hasn't been recorded yet
+            checked = sent = False
+            try:
+                if policy is not None:
+                    policy.check(request.host)
+                    checked = True
+                if self._rate_limiter is not None:
+                    self._acquire_token(request.host)
+                sent = True
+                response = self._opener.open(request)
+                if policy is not None:
+                    # The server answered, whatever is wrong with the body
+                    policy.record(request.host, response.status)
+                    checked = False
+                if stream:
+                    result = self._stream_response(response)
+                else:
+                    result = self._handle_response(method, uri, response)
+            except RequestTimeout as error:
+                if checked and sent:
+                    policy.record(request.host)
+                    checked = False
+                error.attempts = attempt
+                raise
+            except HTTPError as http_error:
+                # Drain the error body, so the connection can be reused
+                http_error.read()
+                status = http_error.code
+                if http_error.headers is not None:
+                    retry_after = http_error.headers.get('Retry-After')
+                error = _status_error(status)
+            except (httplib.HTTPException, OSError) as network_error:
+                error = _network_error(network_error)
+            except Exception as error:
+                # Not retried, e.g. an open circuit or an undecodable body
+                error.attempts = attempt
+                raise
             else:
-                raise UnknownResponse(http_error.code)
-        return self._process_response(response)
+                return result
+            finally:
+                if checked:
+                    # Never leave a trial request of the circuit breaker
+                    # pending; errors are recorded below
+                    policy.release(request.host)
+
+            error.attempts = attempt
+            if policy is None:
+                raise error
+
+            policy.record(request.host, status)
+            if _is_stream(request.data):
+                # The body has been consumed, so it can't be sent again
+                raise error
+
+            delay = policy.next_delay(method, status, attempt,
+                                      _now() - started,
+                                      retry.parse_retry_after(retry_after))
+            remaining = remaining_time()
+            if delay is None or (remaining is not None and delay >= remaining):
+                raise error
+            time.sleep(delay)
 
     def GET(self, uri):
         """Convenience method for carrying out a GET request"""
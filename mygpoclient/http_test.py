@@ -17,21 +17,27 @@
 
 import codecs
 import base64
+import gzip
+import zlib
 
 from mygpoclient.http import (HttpClient, Unauthorized, BadRequest,
-                              UnknownResponse, NotFound)
-
+                              UnknownResponse, NotFound, ConnectionPool,
+                              ContentDecoder, PersistentCookieJar,
+                              RequestTimeout, deadline)
+from mygpoclient.json import JsonClient, JsonException
+from mygpoclient.ratelimit import RateLimiter, RateLimitExceeded
+from mygpoclient.retry import RetryPolicy, CircuitBreaker, CircuitOpen
+
+import os
+import shutil
+import socket
+import tempfile
+import time
 import unittest
 import multiprocessing
 
-try:
-    # Python 3
-    from http.server import BaseHTTPRequestHandler, HTTPServer
-
-except ImportError:
-    # Python 2
-    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
-    str = unicode
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 
 
 def http_server(port, username, password, response):
@@ -50,7 +56,7 @@ def http_server(port, username, password, response):
                 return True
 
         def _check_auth(self):
-            if self.path.startswith('/auth'):
+            if self.path.startswith('/auth') or self.path.startswith('/preauth'):
                 authorization = self.headers.get('authorization', None)
                 if authorization is not None:
                     auth_type, credentials = authorization.split(None, 1)
@@ -63,9 +69,11 @@ def http_server(port, username, password, response):
                             return True
 
                 self.send_response(401)
-                self.send_header(
-                    'WWW-Authenticate',
-                    'Basic realm="Fake HTTP Server"')
+                if not self.path.startswith('/preauth'):
+                    # Without a challenge, only pre-emptive auth works
+                    self.send_header(
+                        'WWW-Authenticate',
+                        'Basic realm="Fake HTTP Server"')
                 self.end_headers()
                 return False
 
@@ -84,15 +92,45 @@ def http_server(port, username, password, response):
                 self.send_response(444)
                 self.end_headers()
                 return False
+            elif self.path.startswith('/unavailable'):
+                self.send_response(503)
+                self.end_headers()
+                return False
+            elif self.path.startswith('/flaky'):
+                # Fail the first two requests to every flaky path
+                key = ('flaky', self.path)
+                storage[key] = storage.get(key, 0) + 1
+                if storage[key] <= 2:
+                    self.send_response(503)
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return False
 
             return True
 
+        def _read_body(self):
+            if self.headers.get('transfer-encoding') != 'chunked':
+                return self.rfile.read(int(self.headers.get('content-length')))
+
+            blocks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                blocks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    return b''.join(blocks)
+
         def do_POST(self):
             if not self._checks():
                 return
 
-            input_data = self.rfile.read(
-                int(self.headers.get('content-length')))
+            input_data = self._read_body()
+            if self.headers.get('content-encoding') == 'gzip':
+                input_data = gzip.decompress(input_data)
+            elif self.path.startswith('/compressed'):
+                self.send_response(400)
+                self.end_headers()
+                return
             self.send_response(200)
             self.end_headers()
             self.wfile.write(
@@ -115,6 +153,26 @@ def http_server(port, username, password, response):
             if not self._checks():
                 return
 
+            accept_encoding = self.headers.get('accept-encoding', '')
+            if self.path.startswith('/gzip') and 'gzip' in accept_encoding:
+                self.send_response(200)
+                self.send_header('Content-Encoding', 'gzip')
+                self.end_headers()
+                self.wfile.write(gzip.compress(response * 1000))
+                return
+            elif self.path.startswith('/deflate'):
+                self.send_response(200)
+                self.send_header('Content-Encoding', 'deflate')
+                self.end_headers()
+                self.wfile.write(zlib.compress(response * 1000))
+                return
+            elif self.path.startswith('/corrupt'):
+                self.send_response(200)
+                self.send_header('Content-Encoding', 'gzip')
+                self.end_headers()
+                self.wfile.write(b'not gzip at all')
+                return
+
             self.send_response(200)
             self.end_headers()
             if self.path in storage:
@@ -128,6 +186,85 @@ def http_server(port, username, password, response):
     HTTPServer(('127.0.0.1', port), Handler).serve_forever()
 
 
+def keepalive_http_server(port):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = 5
+
+        def do_GET(self):
+            # Answer with the client's port to identify the connection
+            body = str(self.client_address[1]).encode('utf-8')
+            if self.path.startswith('/cookie'):
+                body = self.headers.get('cookie', '').encode('utf-8')
+            elif self.path.startswith('/authorization'):
+                body = self.headers.get('authorization', '').encode('utf-8')
+            elif self.path.startswith('/redirect?to='):
+                self.send_response(302)
+                self.send_header('Location', self.path[len('/redirect?to='):])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            elif self.path.startswith('/slow'):
+                time.sleep(1)
+            elif self.path.startswith('/trickle'):
+                # Send ten bytes of body over one second
+                self.send_response(200)
+                self.send_header('Content-Length', '10')
+                self.end_headers()
+                for _ in range(10):
+                    self.wfile.write(b'.')
+                    self.wfile.flush()
+                    time.sleep(.1)
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            if self.path.startswith('/cookie/set'):
+                self.send_header('Set-Cookie', 'sessionid=s3cr3t; Path=/')
+            self.end_headers()
+            self.wfile.write(body)
+
+            # Drop the connection without announcing it to the client
+            if self.path.startswith('/drop'):
+                self.close_connection = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('content-length')))
+            self.do_GET()
+
+        def log_request(*args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    Server(('127.0.0.1', port), Handler).serve_forever()
+
+
+class Test_ContentDecoder(unittest.TestCase):
+
+    def decode(self, encoding, blocks):
+        decoder = ContentDecoder(encoding)
+        return b''.join(decoder.decode(block) for block in blocks) + \
+            decoder.flush()
+
+    def test_rawDeflate_withShortFirstBlock(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        body = compressor.compress(b'x' * 1000) + compressor.flush()
+        self.assertEqual(self.decode('deflate', [body[:1], body[1:]]),
+                         b'x' * 1000)
+
+    def test_zlibDeflate_withShortFirstBlock(self):
+        body = zlib.compress(b'x' * 1000)
+        self.assertEqual(self.decode('deflate', [body[:1], body[1:]]),
+                         b'x' * 1000)
+
+    def test_corruptBody_raisesUnknownResponse(self):
+        self.assertRaises(UnknownResponse, self.decode, 'gzip',
+                          [b'not gzip at all'])
+        self.assertRaises(UnknownResponse, self.decode, 'deflate',
+                          [b'\xff\xff\xff'])
+
+
 class Test_HttpClient(unittest.TestCase):
     USERNAME = 'john'
     PASSWORD = 'secret'
@@ -168,16 +305,88 @@ class Test_HttpClient(unittest.TestCase):
         path = self.URI_BASE + '/badrequest'
         self.assertRaises(BadRequest, client.GET, path)
 
+    def test_retryPolicy_retriesServerErrors(self):
+        client = HttpClient(retry_policy=RetryPolicy(backoff_base=0))
+        path = self.URI_BASE + '/flaky'
+        self.assertEqual(client.GET(path), self.RESPONSE)
+
+    def test_retryPolicy_reportsAttempts(self):
+        policy = RetryPolicy(max_attempts=3, backoff_base=0,
+                             circuit_breaker=None)
+        client = HttpClient(retry_policy=policy)
+        path = self.URI_BASE + '/unavailable'
+        with self.assertRaises(UnknownResponse) as context:
+            client.GET(path)
+        self.assertEqual(context.exception.attempts, 3)
+
+    def test_retryPolicy_doesNotRetryPOST(self):
+        client = HttpClient(retry_policy=RetryPolicy(backoff_base=0))
+        path = self.URI_BASE + '/flaky'
+        with self.assertRaises(UnknownResponse) as context:
+            client.POST(path, self.DUMMYDATA)
+        self.assertEqual(context.exception.attempts, 1)
+
+    def test_invalidJson_reportsAttempts(self):
+        client = JsonClient(retry_policy=RetryPolicy(backoff_base=0))
+        path = self.URI_BASE + '/noauth'
+        with self.assertRaises(JsonException) as context:
+            client.GET(path)
+        self.assertEqual(context.exception.attempts, 1)
+
+    def test_retryPolicy_opensCircuit(self):
+        policy = RetryPolicy(max_attempts=2, backoff_base=0)
+        policy.circuit_breaker.failure_threshold = 2
+        client = HttpClient(retry_policy=policy)
+        path = self.URI_BASE + '/unavailable'
+        self.assertRaises(UnknownResponse, client.GET, path)
+        self.assertRaises(CircuitOpen, client.GET, self.URI_BASE + '/noauth')
+
+    def test_rateLimiter_nonBlocking_raisesRateLimitExceeded(self):
+        limiter = RateLimiter(rate=0.001, burst=1, blocking=False)
+        client = HttpClient(rate_limiter=limiter)
+        path = self.URI_BASE + '/noauth'
+        self.assertEqual(client.GET(path), self.RESPONSE)
+        self.assertRaises(RateLimitExceeded, HttpClient(rate_limiter=limiter)
+                          .GET, path)
+
+    def test_stream_GET(self):
+        client = HttpClient()
+        for path in ('/noauth', '/gzip'):
+            blocks = client._request('GET', self.URI_BASE + path, None,
+                                     stream=True)
+            self.assertEqual(b''.join(blocks), client.GET(self.URI_BASE + path))
+
     def test_GET(self):
         client = HttpClient()
         path = self.URI_BASE + '/noauth'
         self.assertEqual(client.GET(path), self.RESPONSE)
 
+    def test_gzip_GET(self):
+        client = HttpClient()
+        path = self.URI_BASE + '/gzip'
+        self.assertEqual(client.GET(path), self.RESPONSE * 1000)
+
+    def test_deflate_GET(self):
+        client = HttpClient()
+        path = self.URI_BASE + '/deflate'
+        self.assertEqual(client.GET(path), self.RESPONSE * 1000)
+
+    def test_corruptBody_raisesUnknownResponse(self):
+        client = HttpClient()
+        with self.assertRaises(UnknownResponse) as context:
+            client.GET(self.URI_BASE + '/corrupt')
+        self.assertEqual(context.exception.attempts, 1)
+
     def test_authenticated_GET(self):
         client = HttpClient(self.USERNAME, self.PASSWORD)
         path = self.URI_BASE + '/auth'
         self.assertEqual(client.GET(path), self.RESPONSE)
 
+    def test_authenticated_GET_isPreemptive(self):
+        client = HttpClient(self.USERNAME, self.PASSWORD)
+        path = self.URI_BASE + '/preauth'
+        self.assertEqual(client.GET(path), self.RESPONSE)
+
     def test_unauthenticated_GET(self):
         client = HttpClient()
         path = self.URI_BASE + '/auth'
@@ -199,6 +408,43 @@ class Test_HttpClient(unittest.TestCase):
                 path, self.DUMMYDATA), codecs.encode(
                 self.DUMMYDATA.decode('utf-8'), 'rot-13').encode('utf-8'))
 
+    def test_compressed_POST(self):
+        client = HttpClient(compress_threshold=0)
+        path = self.URI_BASE + '/compressed'
+        self.assertEqual(
+            client.POST(
+                path, self.DUMMYDATA), codecs.encode(
+                self.DUMMYDATA.decode('utf-8'), 'rot-13').encode('utf-8'))
+
+    def test_POST_belowCompressThreshold_isNotCompressed(self):
+        client = HttpClient(compress_threshold=len(self.DUMMYDATA) + 1)
+        path = self.URI_BASE + '/compressed'
+        self.assertRaises(BadRequest, client.POST, path, self.DUMMYDATA)
+
+    def test_streamed_POST(self):
+        client = HttpClient()
+        path = self.URI_BASE + '/noauth'
+        blocks = (self.DUMMYDATA[i:i + 5]
+                  for i in range(0, len(self.DUMMYDATA), 5))
+        self.assertEqual(
+            client.POST(path, blocks), codecs.encode(
+                self.DUMMYDATA.decode('utf-8'), 'rot-13').encode('utf-8'))
+
+    def test_streamed_POST_isCompressed(self):
+        client = HttpClient(compress_threshold=len(self.DUMMYDATA) + 1)
+        path = self.URI_BASE + '/compressed'
+        self.assertEqual(
+            client.POST(path, iter([self.DUMMYDATA])), codecs.encode(
+                self.DUMMYDATA.decode('utf-8'), 'rot-13').encode('utf-8'))
+
+    def test_retryPolicy_doesNotRetryStreamedBody(self):
+        client = HttpClient(retry_policy=RetryPolicy(backoff_base=0,
+                                                     methods=('POST',)))
+        with self.assertRaises(UnknownResponse) as context:
+            client.POST(self.URI_BASE + '/flaky/stream',
+                        iter([self.DUMMYDATA]))
+        self.assertEqual(context.exception.attempts, 1)
+
     def test_unauthenticated_POST(self):
         client = HttpClient()
         path = self.URI_BASE + '/auth'
@@ -218,3 +464,235 @@ class Test_HttpClient(unittest.TestCase):
                 client.GET(path),
                 self.RESPONSE +
                 str(i).encode('utf-8'))
+
+
+class Test_ConnectionPool(unittest.TestCase):
+    PORT = 9877
+    URI_BASE = 'http://localhost:%(PORT)d' % locals()
+
+    def setUp(self):
+        self.server_process = multiprocessing.Process(
+            target=keepalive_http_server, args=(self.PORT,))
+        self.server_process.start()
+        import time
+        time.sleep(.1)
+
+    def tearDown(self):
+        self.server_process.terminate()
+        import time
+        time.sleep(.1)
+
+    def test_connectionIsReused(self):
+        client = HttpClient()
+        path = self.URI_BASE + '/keepalive'
+        first = client.GET(path)
+        self.assertEqual(client.GET(path), first)
+        self.assertEqual(client.POST(path, b'data'), first)
+
+    def test_sharedPool_reusesConnectionAcrossClients(self):
+        pool = ConnectionPool()
+        path = self.URI_BASE + '/keepalive'
+        self.assertEqual(HttpClient(pool=pool).GET(path),
+                         HttpClient(pool=pool).GET(path))
+
+    def test_idleTimeout_opensNewConnection(self):
+        client = HttpClient(pool=ConnectionPool(idle_timeout=-1))
+        path = self.URI_BASE + '/keepalive'
+        self.assertNotEqual(client.GET(path), client.GET(path))
+
+    def test_droppedConnection_reconnects(self):
+        client = HttpClient()
+        path = self.URI_BASE + '/drop'
+        first = client.GET(path)
+        import time
+        time.sleep(.1)
+        self.assertNotEqual(client.GET(path), first)
+
+    @unittest.skipUnless(hasattr(os, 'dup2') and hasattr(socket, 'socketpair'),
+                         'needs os.dup2 and socket.socketpair')
+    def test_idleConnection_withHighDescriptor_isNotDropped(self):
+        class Connection(object):
+            pass
+
+        left, right = socket.socketpair()
+        try:
+            high = os.dup2(left.fileno(), 1100) or 1100
+        except OSError:
+            self.skipTest('descriptor 1100 is not available')
+        connection = Connection()
+        connection.sock = socket.socket(fileno=high)
+        try:
+            self.assertFalse(ConnectionPool._is_dropped(connection))
+            right.close()
+            self.assertTrue(ConnectionPool._is_dropped(connection))
+        finally:
+            connection.sock.close()
+            left.close()
+
+    def test_staleConnection_isRetried(self):
+        class NoCheckPool(ConnectionPool):
+            @staticmethod
+            def _is_dropped(connection):
+                return False
+
+        client = HttpClient(pool=NoCheckPool())
+        path = self.URI_BASE + '/drop'
+        first = client.GET(path)
+        import time
+        time.sleep(.1)
+        self.assertNotEqual(client.GET(path), first)
+
+
+class Test_Timeouts(unittest.TestCase):
+    PORT = 9877
+    URI_BASE = 'http://localhost:%(PORT)d' % locals()
+
+    def setUp(self):
+        self.server_process = multiprocessing.Process(
+            target=keepalive_http_server, args=(self.PORT,))
+        self.server_process.start()
+        time.sleep(.1)
+
+    def tearDown(self):
+        self.server_process.terminate()
+        time.sleep(.1)
+
+    def test_readTimeout_raisesRequestTimeout(self):
+        client = HttpClient(read_timeout=.2)
+        with self.assertRaises(RequestTimeout) as context:
+            client.GET(self.URI_BASE + '/slow')
+        self.assertEqual(context.exception.attempts, 1)
+
+    def test_readTimeout_isRetried(self):
+        policy = RetryPolicy(max_attempts=2, backoff_base=0)
+        client = HttpClient(read_timeout=.2, retry_policy=policy)
+        with self.assertRaises(RequestTimeout) as context:
+            client.GET(self.URI_BASE + '/slow')
+        self.assertEqual(context.exception.attempts, 2)
+
+    def test_readTimeout_appliesToEachRead(self):
+        client = HttpClient(read_timeout=.5)
+        self.assertEqual(client.GET(self.URI_BASE + '/trickle'), b'.' * 10)
+
+    def test_deadline_coversBodyStreaming(self):
+        client = HttpClient(read_timeout=.5, deadline=.5)
+        started = time.time()
+        self.assertRaises(RequestTimeout, client.GET,
+                          self.URI_BASE + '/trickle')
+        self.assertLess(time.time() - started, .9)
+
+    def test_deadline_stopsRetries(self):
+        policy = RetryPolicy(max_attempts=10, backoff_base=0)
+        client = HttpClient(read_timeout=.2, deadline=.5, retry_policy=policy)
+        with self.assertRaises(RequestTimeout) as context:
+            client.GET(self.URI_BASE + '/slow')
+        self.assertLess(context.exception.attempts, 4)
+
+    def test_deadlineBlock_limitsAllRequests(self):
+        client = HttpClient()
+        path = self.URI_BASE + '/keepalive'
+        with deadline(.5):
+            client.GET(path)
+            self.assertRaises(RequestTimeout, client.GET,
+                              self.URI_BASE + '/slow')
+
+    def test_expiredDeadline_sendsNoRequest(self):
+        client = HttpClient()
+        with deadline(0):
+            self.assertRaises(RequestTimeout, client.GET,
+                              self.URI_BASE + '/keepalive')
+
+    def test_deadline_limitsRateLimiterWait(self):
+        limiter = RateLimiter(rate=.2, burst=1, timeout=5)
+        client = HttpClient(rate_limiter=limiter, deadline=.5)
+        path = self.URI_BASE + '/keepalive'
+        client.GET(path)
+        started = time.time()
+        self.assertRaises(RequestTimeout, client.GET, path)
+        self.assertLess(time.time() - started, .9)
+
+    def test_credentials_areNotSentToOtherHosts(self):
+        client = HttpClient('john', 'secret')
+        authorization = b'Basic ' + base64.b64encode(b'john:secret')
+        target = self.URI_BASE + '/authorization'
+        self.assertEqual(client.GET(self.URI_BASE + '/redirect?to=' + target),
+                         authorization)
+        other = 'http://127.0.0.1:%d/authorization' % self.PORT
+        self.assertEqual(client.GET(self.URI_BASE + '/redirect?to=' + other),
+                         b'')
+
+    def test_timedOutTrialRequest_doesNotBlockCircuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=.1)
+        policy = RetryPolicy(max_attempts=1, circuit_breaker=breaker)
+        client = HttpClient(read_timeout=.2, retry_policy=policy)
+        path = self.URI_BASE + '/keepalive'
+        self.assertRaises(RequestTimeout, client.GET, self.URI_BASE + '/slow')
+        self.assertRaises(CircuitOpen, client.GET, path)
+
+        # The trial request times out, which reopens the circuit
+        time.sleep(.15)
+        with deadline(0):
+            self.assertRaises(RequestTimeout, client.GET, path)
+        self.assertRaises(CircuitOpen, client.GET, path)
+
+        time.sleep(.15)
+        self.assertEqual(client.GET(path), client.GET(path))
+
+    def test_rateLimitedTrialRequest_doesNotBlockCircuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=.1)
+        policy = RetryPolicy(max_attempts=1, circuit_breaker=breaker)
+        limiter = RateLimiter(rate=1000, burst=1, blocking=False)
+        client = HttpClient(read_timeout=.2, retry_policy=policy,
+                            rate_limiter=limiter)
+        path = self.URI_BASE + '/keepalive'
+        self.assertRaises(RequestTimeout, client.GET, self.URI_BASE + '/slow')
+
+        time.sleep(.15)
+        limiter.acquire('localhost:%d' % self.PORT)
+        self.assertRaises(RateLimitExceeded, client.GET, path)
+        time.sleep(.01)
+        client.GET(path)
+
+    def test_connectionIsReusedAfterDeadline(self):
+        client = HttpClient(deadline=5)
+        path = self.URI_BASE + '/keepalive'
+        self.assertEqual(client.GET(path), client.GET(path))
+
+
+class Test_PersistentCookieJar(unittest.TestCase):
+    PORT = 9877
+    URI_BASE = 'http://localhost:%(PORT)d' % locals()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server_process = multiprocessing.Process(
+            target=keepalive_http_server, args=(self.PORT,))
+        self.server_process.start()
+        import time
+        time.sleep(.1)
+
+    def tearDown(self):
+        self.server_process.terminate()
+        shutil.rmtree(self.directory)
+        import time
+        time.sleep(.1)
+
+    def get_jar(self, username='john'):
+        return PersistentCookieJar.for_account(self.directory, username,
+                                               self.URI_BASE)
+
+    def test_sessionCookie_isReusedByNewJar(self):
+        client = HttpClient(cookie_jar=self.get_jar())
+        client.GET(self.URI_BASE + '/cookie/set')
+        self.assertTrue(os.path.exists(self.get_jar().filename))
+
+        client = HttpClient(cookie_jar=self.get_jar())
+        self.assertEqual(client.GET(self.URI_BASE + '/cookie'),
+                         b'sessionid=s3cr3t')
+
+    def test_otherAccount_doesNotShareCookies(self):
+        client = HttpClient(cookie_jar=self.get_jar())
+        client.GET(self.URI_BASE + '/cookie/set')
+
+        client = HttpClient(cookie_jar=self.get_jar('jane'))
+        self.assertEqual(client.GET(self.URI_BASE + '/cookie'), b'')
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Durable queue for uploading episode actions in the background
+
+An ActionJournal takes episode actions without blocking, writes them to
+an append-only file, and uploads them with upload_episode_actions from
+a background thread:
+
+    journal = ActionJournal('actions.journal', client)
+    journal.enqueue(EpisodeAction(podcast, episode, 'play', ...))
+    ...
+    journal.close(timeout=5)
+
+The file has one line per action (its JSON dictionary) and, after each
+acknowledged upload, a line with the number of actions that have been
+acknowledged. Actions that have been written are uploaded again after
+a crash, unless their acknowledgement was written, so an action might
+be uploaded twice, but is never lost once it's on disk.
+
+Batches that the server rejects with "400 Bad Request" are not
+retried, but appended to a second file with one action per line, which
+is named after the journal with '.rejected' appended by default.
+"""
+
+import collections
+import itertools
+import os
+import random
+import threading
+import time
+
+from mygpoclient import api
+from mygpoclient import http
+from mygpoclient import json
+
+# Monotonic clock for measuring delays
+_now = time.monotonic
+
+
+def _encode(action):
+    return json.JsonClient.encode(action.to_dictionary()) + b'\n'
+
+
+def _is_rejection(error):
+    """Check if an upload failed because the server rejected the batch
+
+    Only "400 Bad Request" is about the batch itself. Anything else
+    (e.g. network errors, server errors, a wrong password or a response
+    that can't be decoded) would fail for every batch, so it's retried.
+
+    >>> _is_rejection(http.BadRequest())
+    True
+    >>> _is_rejection(http.Unauthorized())
+    False
+    """
+    return isinstance(error, http.BadRequest)
+
+
+def _recover(filename):
+    """Get the actions of a journal that haven't been acknowledged
+
+    A partly written last line (from a crash) is ignored.
+    """
+    try:
+        with open(filename, 'rb') as fp:
+            data = fp.read()
+    except (IOError, OSError):
+        if os.path.exists(filename):
+            raise
+        return []
+
+    dicts = []
+    acknowledged = 0
+    for line in data.split(b'\n')[:-1]:
+        value = json.JsonClient.decode(line)
+        if isinstance(value, int):
+            acknowledged += value
+        else:
+            dicts.append(value)
+
+    return api.EpisodeAction.from_dictionaries(dicts[acknowledged:],
+                                               trusted=True)
+
+
+class ActionJournal(object):
+    """Write-ahead journal that uploads episode actions in batches
+
+    enqueue only adds the actions to a buffer. A committer thread writes
+    everything that has been buffered with a single write and fsync
+    (group commit), waiting up to commit_delay seconds for more actions
+    first. A flusher thread uploads the written actions in order, in
+    batches of up to batch_size actions, starting at most flush_interval
+    seconds after the first one was written.
+
+    Failed uploads are retried after an exponential backoff with full
+    jitter (as in retry.RetryPolicy, starting at backoff_base and capped
+    at backoff_max seconds). The exception is kept in last_error until
+    an upload succeeds. A batch that the server rejected (see
+    _is_rejection) is appended to the rejected file and passed to
+    on_reject(actions, error) if given, and the journal goes on with
+    the next batch. Actions are never dropped.
+
+    After an upload, the actions are acknowledged in the file. Once the
+    acknowledged actions outnumber the others, the file is rewritten
+    with the actions that are left (it's emptied if there are none).
+    The actions that are left from an earlier run are uploaded first.
+    """
+
+    def __init__(self, filename, client, batch_size=1000, commit_delay=0,
+                 flush_interval=1, backoff_base=1, backoff_max=300,
+                 rejected=None, on_reject=None, random=random.random):
+        self.filename = filename
+        self.rejected = rejected or filename + '.rejected'
+        self.on_reject = on_reject
+        self.client = client
+        self.batch_size = batch_size
+        self.commit_delay = commit_delay
+        self.flush_interval = flush_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.last_error = None
+        self._random = random
+
+        # Lock order: _file_lock, then _condition
+        self._file_lock = threading.Lock()
+        self._condition = threading.Condition(threading.Lock())
+        self._buffer = []
+        self._written = collections.deque()
+        self._acknowledged_in_file = 0
+        self._closing = False
+        # When close gives up waiting for uploads (None: never)
+        self._close_end = None
+        self._stopping = False
+
+        self._file = None
+        lines = [(action, _encode(action)) for action in _recover(filename)]
+        self._rewrite(lines)
+        self._written.extend(lines)
+        self._enqueued = self._committed = len(lines)
+        self._acknowledged = 0
+
+        self._threads = [threading.Thread(target=self._commit_loop),
+                         threading.Thread(target=self._flush_loop)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    @property
+    def pending(self):
+        """The number of actions that haven't been acknowledged yet"""
+        with self._condition:
+            return self._enqueued - self._acknowledged
+
+    def enqueue(self, action):
+        """Add an EpisodeAction without waiting for the disk or network
+
+        Returns its sequence number for wait_committed.
+        """
+        return self.enqueue_many([action])
+
+    def enqueue_many(self, actions):
+        """Add EpisodeAction objects (see enqueue)"""
+        lines = [(action, _encode(action)) for action in actions]
+        with self._condition:
+            if self._closing:
+                raise ValueError('Journal is closed')
+            self._buffer.extend(lines)
+            self._enqueued += len(lines)
+            self._condition.notify_all()
+            return self._enqueued
+
+    def wait_committed(self, sequence=None, timeout=None):
+        """Wait until the actions up to sequence are on disk
+
+        Without sequence, waits for all actions that have been enqueued.
+        Returns False if the timeout (in seconds) expired first.
+        """
+        with self._condition:
+            if sequence is None:
+                sequence = self._enqueued
+            return self._wait(lambda: self._committed >= sequence, timeout)
+
+    def flush(self, timeout=None):
+        """Wait until all enqueued actions have been acknowledged
+
+        Returns False if the timeout (in seconds) expired first.
+        """
+        with self._condition:
+            sequence = self._enqueued
+            return self._wait(lambda: self._acknowledged >= sequence,
+                              timeout)
+
+    def close(self, timeout=0):
+        """Stop the journal after waiting for uploads up to timeout
+
+        All enqueued actions are written to disk first. The actions
+        that are left are uploaded right away, but no upload is started
+        after timeout seconds (None waits for all of them). Actions that
+        haven't been acknowledged stay in the file for the next run.
+        """
+        end = None if timeout is None else _now() + timeout
+        with self._condition:
+            self._closing = True
+            self._close_end = end
+            self._condition.notify_all()
+        self._threads[0].join()
+        self.flush(None if end is None else max(0, end - _now()))
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        # An upload that is still running is abandoned (see _acknowledge)
+        self._threads[1].join(None if end is None else
+                              max(0, end - _now()))
+        with self._file_lock:
+            self._file.close()
+
+    def _wait(self, predicate, timeout):
+        # Must be called with _condition held
+        end = None if timeout is None else _now() + timeout
+        while not predicate():
+            remaining = None if end is None else end - _now()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._condition.wait(remaining)
+        return True
+
+    def _rewrite(self, lines):
+        # Must be called with _file_lock held (or from the constructor)
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        tmp = os.path.join(directory, '.%s.tmp' %
+                           os.path.basename(self.filename))
+        with open(tmp, 'wb') as fp:
+            fp.write(b''.join(line for _, line in lines))
+            fp.flush()
+            os.fsync(fp.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp, self.filename)
+        self._file = open(self.filename, 'ab')
+        self._acknowledged_in_file = 0
+
+    def _commit_loop(self):
+        while True:
+            with self._condition:
+                while not self._buffer and not self._closing:
+                    self._condition.wait()
+                if not self._buffer:
+                    return
+                if self.commit_delay:
+                    # Give other threads a chance to add to the group
+                    self._wait(lambda: self._closing, self.commit_delay)
+                lines, self._buffer = self._buffer, []
+                sequence = self._committed + len(lines)
+
+            with self._file_lock:
+                self._file.write(b''.join(line for _, line in lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                with self._condition:
+                    self._written.extend(lines)
+                    self._committed = sequence
+                    self._condition.notify_all()
+
+    def _close_expired(self):
+        # Must be called with _condition held
+        return self._close_end is not None and _now() >= self._close_end
+
+    def _next_batch(self):
+        # Must be called with _condition held; None means stop
+        start = None
+        while not self._stopping and not self._close_expired():
+            if len(self._written) >= self.batch_size:
+                break
+            if self._written:
+                if start is None:
+                    start = _now()
+                remaining = start + self.flush_interval - _now()
+                if remaining <= 0 or self._closing:
+                    break
+                self._condition.wait(remaining)
+            else:
+                start = None
+                self._condition.wait()
+        else:
+            return None
+
+        return [action for action, _ in
+                itertools.islice(self._written, self.batch_size)]
+
+    def _flush_loop(self):
+        failures = 0
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+            if batch is None:
+                return
+
+            try:
+                self.client.upload_episode_actions(batch)
+            except Exception as error:
+                self.last_error = error
+                if _is_rejection(error):
+                    failures = 0
+                    self._reject(batch, error)
+                    continue
+                failures += 1
+                delay = self._random() * min(
+                    self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+                with self._condition:
+                    self._wait(lambda: self._stopping, delay)
+                continue
+
+            failures = 0
+            self.last_error = None
+            self._acknowledge(len(batch))
+
+    def _reject(self, batch, error):
+        # Written before the acknowledgement, so a crash in between can
+        # only duplicate rejected actions
+        with open(self.rejected, 'ab') as fp:
+            fp.write(b''.join(_encode(action) for action in batch))
+            fp.flush()
+            os.fsync(fp.fileno())
+        if self.on_reject is not None:
+            self.on_reject(batch, error)
+        self._acknowledge(len(batch))
+
+    def _acknowledge(self, count):
+        with self._file_lock:
+            if self._file.closed:
+                # close gave up on this upload, so it's repeated next run
+                return
+
+            # Only this thread removes actions, and the committer adds
+            # them with _file_lock held, so _written matches the file
+            with self._condition:
+                for _ in range(count):
+                    self._written.popleft()
+
+            self._acknowledged_in_file += count
+            if self._acknowledged_in_file > len(self._written):
+                self._rewrite(list(self._written))
+            else:
+                self._file.write(b'%d\n' % count)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+            with self._condition:
+                self._acknowledged += count
+                self._condition.notify_all()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from mygpoclient import api
+from mygpoclient import http
+from mygpoclient import journal
+
+import unittest
+
+FEED_URL = 'http://example.com/test.rss'
+
+
+def make_actions(start, stop):
+    return [api.EpisodeAction(FEED_URL, 'http://example.com/%d.mp3' % i,
+                              'download') for i in range(start, stop)]
+
+
+class RecordingClient(object):
+    """Records uploaded batches, fails the first failures uploads"""
+
+    def __init__(self, failures=0, error=None):
+        self.failures = failures
+        self.error = error
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def upload_episode_actions(self, actions):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise self.error or IOError('network is unreachable')
+            self.batches.append([action.episode for action in actions])
+            return 1000 + len(self.batches)
+
+    def uploaded(self):
+        return [episode for batch in self.batches for episode in batch]
+
+
+class BlockingClient(RecordingClient):
+    """Records uploaded batches after release has been set"""
+
+    def __init__(self):
+        RecordingClient.__init__(self)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def upload_episode_actions(self, actions):
+        self.started.set()
+        self.release.wait(10)
+        return RecordingClient.upload_episode_actions(self, actions)
+
+
+class Test_ActionJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'actions.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, client, **kwargs):
+        kwargs.setdefault('flush_interval', 0.01)
+        kwargs.setdefault('backoff_base', 0.01)
+        return journal.ActionJournal(self.filename, client, **kwargs)
+
+    def read(self):
+        with open(self.filename, 'rb') as fp:
+            return fp.read()
+
+    def test_uploadsInBatches_andEmptiesJournal(self):
+        client = RecordingClient()
+        actions = make_actions(0, 25)
+        queue = self.open(client, batch_size=10)
+        for action in actions:
+            queue.enqueue(action)
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+
+        self.assertEqual(client.uploaded(), [a.episode for a in actions])
+        self.assertTrue(all(len(batch) <= 10 for batch in client.batches))
+        self.assertEqual(queue.pending, 0)
+        self.assertEqual(self.read(), b'')
+
+    def test_enqueuedActions_areWrittenBeforeUpload(self):
+        client = RecordingClient(failures=1000)
+        queue = self.open(client, backoff_max=0.01)
+        sequence = queue.enqueue_many(make_actions(0, 3))
+        self.assertTrue(queue.wait_committed(sequence, timeout=10))
+        self.assertEqual(self.read().count(b'\n'), 3)
+        self.assertFalse(queue.flush(timeout=0.1))
+        queue.close()
+        self.assertEqual(queue.pending, 3)
+        self.assertTrue(isinstance(queue.last_error, IOError))
+        self.assertRaises(ValueError, queue.enqueue, make_actions(3, 4)[0])
+
+    def test_failedUploads_areRetried(self):
+        client = RecordingClient(failures=2)
+        queue = self.open(client)
+        queue.enqueue_many(make_actions(0, 5))
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(0, 5)])
+        self.assertEqual(queue.last_error, None)
+
+    def test_recovery_uploadsUnacknowledgedActions(self):
+        # Five actions, three of them acknowledged, and a torn last line
+        lines = [journal._encode(action) for action in make_actions(0, 5)]
+        with open(self.filename, 'wb') as fp:
+            fp.write(b''.join(lines[:2]) + b'2\n' + b''.join(lines[2:]) +
+                     b'1\n' + lines[0][:10])
+
+        client = RecordingClient()
+        queue = self.open(client)
+        self.assertEqual(queue.pending, 2)
+        queue.enqueue_many(make_actions(5, 6))
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(3, 6)])
+
+    def test_closedJournal_isPickedUpByNextRun(self):
+        queue = self.open(RecordingClient(failures=1000), backoff_max=0.01)
+        queue.enqueue_many(make_actions(0, 4))
+        queue.close()
+
+        client = RecordingClient()
+        queue = self.open(client)
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(0, 4)])
+
+    def test_rejectedBatches_areNotRetried(self):
+        client = RecordingClient(failures=1, error=http.BadRequest())
+        rejected = []
+        queue = self.open(client, batch_size=2, flush_interval=1,
+                          on_reject=lambda *args: rejected.append(args))
+        queue.enqueue_many(make_actions(0, 4))
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(2, 4)])
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual([a.episode for a in rejected[0][0]],
+                         [a.episode for a in make_actions(0, 2)])
+        self.assertTrue(isinstance(rejected[0][1], http.BadRequest))
+        self.assertEqual([a.episode for a in
+                          journal._recover(self.filename + '.rejected')],
+                         [a.episode for a in make_actions(0, 2)])
+        self.assertEqual(self.read(), b'')
+
+    def test_serverErrors_areRetried(self):
+        client = RecordingClient(failures=2, error=http.UnknownResponse(503))
+        queue = self.open(client)
+        queue.enqueue_many(make_actions(0, 3))
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(0, 3)])
+        self.assertFalse(os.path.exists(self.filename + '.rejected'))
+
+    def test_unauthorized_isRetried_andNothingIsRejected(self):
+        client = RecordingClient(failures=3, error=http.Unauthorized())
+        rejected = []
+        queue = self.open(client, batch_size=2,
+                          on_reject=lambda *args: rejected.append(args))
+        queue.enqueue_many(make_actions(0, 4))
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(0, 4)])
+        self.assertEqual(rejected, [])
+        self.assertFalse(os.path.exists(self.filename + '.rejected'))
+
+    def test_close_startsNoUploadAfterTimeout(self):
+        client = BlockingClient()
+        queue = self.open(client, flush_interval=10)
+        self.assertTrue(queue.wait_committed(queue.enqueue_many(
+            make_actions(0, 3)), timeout=10))
+        started = time.time()
+        queue.close(timeout=0)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertFalse(client.started.is_set())
+        self.assertEqual(queue.pending, 3)
+
+    def test_close_abandonsRunningUpload(self):
+        client = BlockingClient()
+        queue = self.open(client)
+        queue.enqueue_many(make_actions(0, 3))
+        self.assertTrue(client.started.wait(10))
+        started = time.time()
+        queue.close(timeout=0.1)
+        self.assertLess(time.time() - started, 0.5)
+        client.release.set()
+
+        client = RecordingClient()
+        queue = self.open(client)
+        self.assertTrue(queue.flush(timeout=10))
+        queue.close()
+        self.assertEqual(client.uploaded(),
+                         [a.episode for a in make_actions(0, 3)])
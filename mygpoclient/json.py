@@ -15,18 +15,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-# Fix gPodder bug 900 (so "import json" doesn't import this module)
-from __future__ import absolute_import
-
-try:
-    # Python 3
-    bytes = bytes
-
-except BaseException:
-    # Python 2
-    bytes = str
-
+import codecs
+import functools
+import itertools
 import json
+import operator
+import re
+from sys import intern
 
 from mygpoclient import http
 
@@ -37,37 +32,550 @@ class JsonException(Exception):
     pass
 
 
+class JsonCodec(object):
+    """A JSON implementation that encodes to and decodes from bytes
+
+    dumps converts an object to UTF-8 encoded JSON, and loads converts
+    UTF-8 encoded JSON to an object (raising ValueError if it's invalid).
+
+    dumps_string (optional) converts a string to the JSON text (str)
+    that dumps writes for it, which ObjectEncoder uses for speed.
+    """
+
+    def __init__(self, name, dumps, loads, dumps_string=None):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.dumps_string = dumps_string
+
+    def __repr__(self):
+        return '<JsonCodec %s>' % self.name
+
+
+def _orjson_codec():
+    import orjson
+    # Like the json module, allow non-string keys (e.g. in settings).
+    # Strings are escaped as the json module does without ensure_ascii
+    return JsonCodec('orjson', functools.partial(
+        orjson.dumps, option=orjson.OPT_NON_STR_KEYS), orjson.loads,
+        json.encoder.encode_basestring)
+
+
+def _ujson_codec():
+    import ujson
+
+    def dumps(data):
+        return ujson.dumps(data, ensure_ascii=False,
+                           escape_forward_slashes=False).encode('utf-8')
+
+    return JsonCodec('ujson', dumps, ujson.loads)
+
+
+def _simplejson_codec():
+    import simplejson
+    return JsonCodec('simplejson',
+                     lambda data: simplejson.dumps(data).encode('utf-8'),
+                     simplejson.loads,
+                     simplejson.encoder.encode_basestring_ascii)
+
+
+def _json_codec():
+    return JsonCodec('json',
+                     lambda data: json.dumps(data).encode('utf-8'),
+                     json.loads,
+                     json.encoder.encode_basestring_ascii)
+
+
+# Known codecs, fastest first (see benchmarks/json_codecs.py)
+_codec_factories = [
+    ('orjson', _orjson_codec),
+    ('ujson', _ujson_codec),
+    ('simplejson', _simplejson_codec),
+    ('json', _json_codec),
+]
+_codecs = {}
+_default_codec = None
+
+
+def register_codec(codec, default=False):
+    """Add a JsonCodec (replacing a codec with the same name)"""
+    global _default_codec
+    _codecs[codec.name] = codec
+    if default or (_default_codec is not None and
+                   _default_codec.name == codec.name):
+        _default_codec = codec
+
+
+def get_codec(name=None):
+    """Get a codec by name, or the default codec
+
+    Unless set with set_default_codec, the default codec is the
+    fastest one that is installed (the json module as a last resort).
+    Raises ValueError if the codec is not available.
+
+    >>> get_codec('json').dumps({'a': [1, 2]}) == b'{"a": [1, 2]}'
+    True
+    >>> get_codec('json').loads(b'{"a": [1, 2]}')
+    {'a': [1, 2]}
+    """
+    if name is None:
+        if _default_codec is None:
+            set_default_codec(available_codecs()[0])
+        return _default_codec
+
+    if name not in _codecs:
+        factory = dict(_codec_factories).get(name)
+        if factory is None:
+            raise ValueError('Unknown JSON codec: %s' % name)
+        try:
+            _codecs[name] = factory()
+        except ImportError:
+            raise ValueError('JSON codec is not installed: %s' % name)
+
+    return _codecs[name]
+
+
+def set_default_codec(name):
+    """Use the codec with the given name for all JSON clients"""
+    global _default_codec
+    _default_codec = get_codec(name)
+
+
+def available_codecs():
+    """Get the names of the installed codecs, fastest first"""
+    names = []
+    for name, _ in _codec_factories:
+        try:
+            get_codec(name)
+        except ValueError:
+            continue
+        names.append(name)
+
+    names.extend(sorted(name for name in _codecs if name not in names))
+    return names
+
+
+class _TextReader(object):
+    """Text decoded incrementally from an iterable of UTF-8 blocks
+
+    Only the text from the current position on is kept, so the buffer
+    holds at most the current value and one block of data.
+    """
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, blocks):
+        self._blocks = iter(blocks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read more text, returns False at the end of the data"""
+        while not self.eof:
+            block = next(self._blocks, None)
+            if block is None:
+                self.eof = True
+                text = self._utf8.decode(b'', True)
+            else:
+                text = self._utf8.decode(block)
+            if text:
+                self.text = self.text[self.pos:] + text
+                self.pos = 0
+                return True
+
+        return False
+
+    def peek(self):
+        """Skip whitespace and get the next character ('' at the end)"""
+        while True:
+            self.pos = self.WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters):
+        """Consume the next character, which must be in characters"""
+        character = self.peek()
+        if not character or character not in characters:
+            raise JsonException('Expected one of %r but got %r' %
+                                (characters, self.text[self.pos:][:40]))
+        self.pos += 1
+        return character
+
+    def value(self):
+        """Decode the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.text, self.pos)
+            except ValueError:
+                end = None
+
+            # A value that ends with the text might be cut off (a number)
+            if end is not None and (end < len(self.text) or self.eof):
+                self.pos = end
+                return value
+
+            if self.eof:
+                raise JsonException('Value error while parsing response: ' +
+                                    self.text[self.pos:][:40])
+
+            # Read at least twice as much before parsing the value again
+            wanted = 2 * (len(self.text) - self.pos) + 1
+            while len(self.text) - self.pos < wanted and self.fill():
+                pass
+
+
+def _iter_items(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iterdecode(blocks, key=None, members=None):
+    """Decode the items of a JSON array one at a time
+
+    The JSON data is read from blocks (an iterable of UTF-8 encoded
+    bytes, such as the body of a response), and every item is yielded
+    as soon as it has been read, so memory use does not depend on the
+    length of the array.
+
+    If key is given, the data must be a JSON object, and the items of
+    the array at key are yielded. All other members of the object are
+    put into the dict members (if given) as they are read.
+
+    >>> list(iterdecode([b'[1, {"a":', b' [2]}, "x"', b']']))
+    [1, {'a': [2]}, 'x']
+    >>> members = {}
+    >>> list(iterdecode([b'{"actions": [1, 2], "timestamp": 12}'],
+    ...                 'actions', members))
+    [1, 2]
+    >>> members
+    {'timestamp': 12}
+    """
+    reader = _TextReader(blocks)
+    if key is None:
+        for item in _iter_items(reader):
+            yield item
+        return
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key:
+            for item in _iter_items(reader):
+                yield item
+        else:
+            value = reader.value()
+            if members is not None:
+                members[name] = value
+        if reader.expect(',}') == '}':
+            return
+
+
+class Schema(object):
+    """Expected shape of the JSON objects of a response
+
+    Builds model objects directly from decoded objects: the required
+    keys are checked and fetched in a single step (raising error with
+    message if one is missing) and, followed by the optional keys
+    (None if missing), are passed as positional arguments to factory.
+
+    The string values of the interned keys are interned, so values that
+    repeat across many objects (e.g. podcast URLs) are only kept once.
+
+    >>> schema = Schema(complex, ('real', 'imag'), message='Not complex')
+    >>> schema.build({'real': 1, 'imag': 2})
+    (1+2j)
+    >>> schema.build_list([{'real': 1, 'imag': 0}])
+    [(1+0j)]
+    >>> schema.build({'real': 1})
+    Traceback (most recent call last):
+      ...
+    ValueError: Not complex
+    """
+
+    def __init__(self, factory, required, optional=(), error=ValueError,
+                 message='Missing keys', interned=()):
+        self.factory = factory
+        self.required = tuple(required)
+        self.optional = tuple(optional)
+        self.error = error
+        self.message = message
+        keys = self.required + self.optional
+        self._interned = tuple(keys.index(key) for key in interned)
+        if len(self.required) == 1:
+            key, = self.required
+            self._getter = lambda d: (d[key],)
+        else:
+            self._getter = operator.itemgetter(*self.required)
+
+    def values(self, d):
+        """Get the arguments for factory from a decoded object"""
+        try:
+            values = self._getter(d)
+        except (KeyError, TypeError):
+            raise self.error(self.message)
+
+        if self.optional:
+            values += tuple(map(d.get, self.optional))
+        if self._interned:
+            values = list(values)
+            for index in self._interned:
+                if isinstance(values[index], str):
+                    values[index] = intern(values[index])
+        return values
+
+    def build(self, d):
+        """Build a model object from a decoded object"""
+        return self.factory(*self.values(d))
+
+    def build_list(self, items):
+        """Build the model objects for a decoded list
+
+        The items of the list are replaced in place, so every decoded
+        object is released as soon as its model object has been built,
+        instead of keeping all of them around until the end.
+        """
+        if not isinstance(items, list):
+            items = list(items)
+
+        build = self.build
+        for index, d in enumerate(items):
+            items[index] = build(d)
+        return items
+
+
+class ObjectEncoder(object):
+    """Encoder for objects that are sent as JSON objects
+
+    The counterpart of Schema: an object is sent as a JSON object with
+    the values of the required attributes and of the optional ones that
+    are not None, in that order (see to_dict). encode writes a list of
+    such objects straight to JSON text, without creating the dicts.
+
+    The result is the same as that of the default codec for the dicts,
+    byte for byte: the keys, separators and strings are written by the
+    codec, and values other than strings and ints are encoded with it.
+    Codecs that write dicts in another layout are given the dicts.
+
+    >>> from fractions import Fraction
+    >>> encoder = ObjectEncoder(('numerator', 'denominator'))
+    >>> encoder.to_dict(Fraction(1, 2))
+    {'numerator': 1, 'denominator': 2}
+    >>> objects = [Fraction(1, 2), Fraction(3)]
+    >>> encoder.encode(objects) == get_codec().dumps(
+    ...     [encoder.to_dict(x) for x in objects])
+    True
+    """
+    # Number of objects that iterencode passes to encode at a time
+    GROUP_SIZE = 256
+
+    def __init__(self, required, optional=()):
+        self.required = tuple(required)
+        self.optional = tuple(optional)
+        keys = self.required + self.optional
+        if len(keys) == 1:
+            key, = keys
+            self._getter = lambda obj: (getattr(obj, key),)
+        else:
+            self._getter = operator.attrgetter(*keys)
+        self._codec = None
+
+    def _dict(self, values):
+        d = dict(zip(self.required, values))
+        for key, value in zip(self.optional, values[len(self.required):]):
+            if value is not None:
+                d[key] = value
+        return d
+
+    def to_dict(self, obj):
+        """Get the dict of an object (as it's encoded)"""
+        return self._dict(self._getter(obj))
+
+    def _prepare(self, codec):
+        """Take the keys, separators and strings from codec
+
+        The text of two sample objects (with all values, and with all
+        optional values missing) is checked against the codec's.
+        """
+        def dumps(value):
+            return codec.dumps(value).decode('utf-8')
+
+        self._value = dumps
+        self._text = {int: int.__repr__, str: codec.dumps_string or dumps}
+        self._separator = dumps([0, 0])[2:-2]
+        key_separator = dumps({'': 0})[3:-2]
+        self._fields = [(dumps(key) + key_separator,
+                         index >= len(self.required))
+                        for index, key in enumerate(self.required +
+                                                    self.optional)]
+
+        count = len(self._fields)
+        samples = (tuple('x' if i % 2 else i for i in range(count)),
+                   tuple('x' if i < len(self.required) else None
+                         for i in range(count)))
+        self._writable = all(self._write(values) == dumps(self._dict(values))
+                             for values in samples)
+        self._codec = codec
+
+    def _write(self, values):
+        """Write the JSON text of an object with the given values"""
+        text = self._text
+        return '{' + self._separator.join([
+            prefix + text.get(type(value), self._value)(value)
+            for (prefix, optional), value in zip(self._fields, values)
+            if value is not None or not optional]) + '}'
+
+    def _prepared_codec(self):
+        codec = get_codec()
+        if codec is not self._codec:
+            self._prepare(codec)
+        return codec
+
+    def encode(self, objects):
+        """Encode a list of objects as JSON array (bytes)"""
+        codec = self._prepared_codec()
+        values = map(self._getter, objects)
+        if not self._writable:
+            return codec.dumps(list(map(self._dict, values)))
+        text = '[' + self._separator.join(map(self._write, values)) + ']'
+        return text.encode('utf-8')
+
+    def encode_object(self, obj):
+        """Encode a single object as JSON object (bytes)"""
+        return self.encode_values(self._getter(obj))
+
+    def encode_values(self, values):
+        """Encode a single object, given its values, as JSON (bytes)
+
+        The values (a tuple) are in the order of the attributes.
+        """
+        codec = self._prepared_codec()
+        if not self._writable:
+            return codec.dumps(self._dict(values))
+        return self._write(values).encode('utf-8')
+
+
+def iterencode(items, block_size=http.CHUNK_SIZE, encoder=None):
+    """Encode the items of an iterable as a JSON array, block by block
+
+    Yields the array as blocks of bytes of about block_size bytes, so
+    the items are encoded one at a time as the blocks are consumed.
+    The joined blocks are the same as the encoded list of the items.
+
+    If encoder (an ObjectEncoder) is given, the items are objects that
+    are encoded with it, a few hundred at a time.
+
+    >>> b''.join(iterencode(iter([1, 2, 3]))) == JsonClient.encode([1, 2, 3])
+    True
+    >>> b''.join(iterencode([])) == b'[]'
+    True
+    >>> blocks = list(iterencode(range(1000), block_size=100))
+    >>> len(blocks) > 1 and max(len(block) for block in blocks) < 110
+    True
+    """
+    dumps = get_codec().dumps
+    # Use the same separator as the codec does for lists
+    separator = dumps([0, 0])[2:-2]
+    if encoder is None:
+        encoded = map(dumps, items)
+    else:
+        # Encode groups of objects, and leave out the brackets
+        items = iter(items)
+        groups = iter(lambda: list(itertools.islice(items,
+                                                    encoder.GROUP_SIZE)), [])
+        encoded = (encoder.encode(group)[1:-1] for group in groups)
+
+    buffer = bytearray(b'[')
+    for index, item in enumerate(encoded):
+        if index:
+            buffer += separator
+        buffer += item
+        if len(buffer) >= block_size:
+            yield bytes(buffer)
+            del buffer[:]
+
+    buffer += b']'
+    yield bytes(buffer)
+
+
+class JsonStream(object):
+    """Request body that encodes the items of an iterable as JSON array
+
+    JsonClient sends it with chunked transfer encoding while encoding
+    it (see iterencode), so it never has to be held in memory as a
+    whole. As the items are consumed, it can only be sent once.
+    """
+
+    def __init__(self, items, block_size=http.CHUNK_SIZE, encoder=None):
+        self.items = items
+        self.block_size = block_size
+        self.encoder = encoder
+
+    def __iter__(self):
+        return iterencode(self.items, self.block_size, self.encoder)
+
+
 class JsonClient(http.HttpClient):
     """A HttpClient with built-in JSON support
 
     This client will automatically marshal and unmarshal data for
     JSON-related web services so that code using this class will
     not need to care about (de-)serialization of data structures.
+
+    If a cache (see the cache module) is given, GET responses with an
+    ETag or Last-Modified header are stored together with their decoded
+    data, and later GET requests for the same URI are made conditional.
+    If the server answers "304 Not Modified", the cached data is used.
     """
 
-    def __init__(self, username=None, password=None):
-        http.HttpClient.__init__(self, username, password)
+    def __init__(self, username=None, password=None, cache=None, **kwargs):
+        http.HttpClient.__init__(self, username, password, **kwargs)
+        self._cache = cache
 
     @staticmethod
     def encode(data):
         """Encodes a object into its JSON string repesentation
 
+        The default codec (see get_codec) is used for encoding. Bytes
+        are taken as data that has been encoded already (e.g. by an
+        ObjectEncoder) and are returned as they are.
+
         >>> JsonClient.encode(None) is None
         True
-        >>> JsonClient.encode([1,2,3]) == b'[1, 2, 3]'
-        True
+        >>> JsonClient.encode(b'[1, 2]')
+        b'[1, 2]'
+        >>> JsonClient.decode(JsonClient.encode([1,2,3]))
+        [1, 2, 3]
         >>> JsonClient.encode(42) == b'42'
         True
         """
-        if data is None:
-            return None
+        if data is None or isinstance(data, bytes):
+            return data
         else:
-            return json.dumps(data).encode('utf-8')
+            return get_codec().dumps(data)
 
     @staticmethod
     def decode(data):
         """Decodes a response string to a Python object
 
+        The default codec (see get_codec) is used for decoding, and
+        the data is passed to it as bytes.
+
         >>> JsonClient.decode(b'')
         >>> JsonClient.decode(b'[1,2,3]')
         [1, 2, 3]
@@ -77,18 +585,81 @@ class JsonClient(http.HttpClient):
         if data == b'':
             return None
 
-        data = data.decode('utf-8')
         try:
-            return json.loads(data)
+            return get_codec().loads(data)
         except ValueError:
-            raise JsonException('Value error while parsing response: ' + data)
+            raise JsonException('Value error while parsing response: ' +
+                                data.decode('utf-8', 'replace'))
 
     @staticmethod
     def _prepare_request(method, uri, data):
-        data = JsonClient.encode(data)
+        if not isinstance(data, JsonStream):
+            data = JsonClient.encode(data)
         return http.HttpClient._prepare_request(method, uri, data)
 
     @staticmethod
     def _process_response(response):
         data = http.HttpClient._process_response(response)
         return JsonClient.decode(data)
+
+    def _cache_key(self, uri):
+        # Responses depend on the user (e.g. the subscriptions of a device)
+        return '%s %s' % (self._username or '', uri)
+
+    def _conditional_headers(self, cached):
+        """Get the request headers to revalidate a cached response"""
+        etag, last_modified, _ = cached
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def _handle_response(self, method, uri, response):
+        result = self._process_response(response)
+        headers = getattr(response, 'headers', None)
+        if self._cache is None or method != 'GET' or headers is None:
+            return result
+
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if ((etag is not None or last_modified is not None) and
+                'no-store' not in headers.get('Cache-Control', '')):
+            self._cache.set(self._cache_key(uri), etag, last_modified, result)
+        return result
+
+    def GET_items(self, uri, key=None, members=None):
+        """GET a JSON array and decode its items one at a time
+
+        Returns a generator of the items of the array in the response
+        (see iterdecode for key and members). The body is read while
+        the generator is consumed, so memory use stays bounded no
+        matter how big the response is. Such responses are not cached.
+        """
+        blocks = self._request('GET', uri, None, stream=True)
+        return iterdecode(blocks, key, members)
+
+    def POST_items(self, uri, items, encoder=None):
+        """POST the items of an iterable as a JSON array
+
+        The items are encoded (with encoder, if given, see iterencode)
+        while the body is sent with chunked transfer encoding, so memory
+        use stays bounded no matter how many items there are. As the
+        body can't be sent again, the request is not retried.
+        """
+        return self._request('POST', uri, JsonStream(items, encoder=encoder))
+
+    def GET(self, uri):
+        if self._cache is None:
+            return http.HttpClient.GET(self, uri)
+
+        cached = self._cache.get(self._cache_key(uri))
+        if cached is None:
+            return self._request('GET', uri, None)
+
+        try:
+            return self._request('GET', uri, None,
+                                 self._conditional_headers(cached))
+        except http.NotModified:
+            return cached[2]
@@ -15,18 +15,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-try:
-    # Python 3
-    from io import BytesIO
-    from urllib import request
-
-except ImportError:
-    # Python 2
-    from StringIO import StringIO as BytesIO
-    import urllib2 as request
+from io import BytesIO
+from urllib import request
+from urllib.error import HTTPError
 
+from mygpoclient import cache
+from mygpoclient import http
 from mygpoclient import json
+from mygpoclient import testing
 
+import itertools
 import unittest
 import minimock
 
@@ -35,6 +33,15 @@ def fqname(o):
     return o.__module__ + "." + o.__name__
 
 
+class HeaderResponse(BytesIO):
+    """Fake response with headers"""
+    status = 200
+
+    def __init__(self, value, headers):
+        BytesIO.__init__(self, value)
+        self.headers = headers
+
+
 class Test_JsonClient(unittest.TestCase):
     PORT = 9876
     URI_BASE = 'http://localhost:%(PORT)d' % locals()
@@ -77,3 +84,266 @@ class Test_JsonClient(unittest.TestCase):
         client = json.JsonClient(self.USERNAME, self.PASSWORD)
         self.mock_setHttpResponse(b'this is not a valid json string')
         self.assertRaises(json.JsonException, client.GET, self.URI_BASE + '/')
+
+    def mock_setConditionalServer(self, headers):
+        """Answer 304 if the request has validators, else 200 with headers"""
+        self.requests = []
+
+        def open_request(request):
+            self.requests.append(request)
+            if (request.has_header('If-none-match') or
+                    request.has_header('If-modified-since')):
+                raise HTTPError(request.get_full_url(), 304, 'Not Modified',
+                                {}, BytesIO(b''))
+            return HeaderResponse(b'[1, 2, 3]', headers)
+
+        self.mockopener.open.mock_returns_func = open_request
+
+    def test_cache_etag_servesNotModifiedFromCache(self):
+        client = json.JsonClient(self.USERNAME, self.PASSWORD,
+                                 cache=cache.MemoryCache())
+        self.mock_setConditionalServer({'ETag': '"v1"'})
+        self.assertEqual(client.GET(self.URI_BASE + '/'), [1, 2, 3])
+        self.assertEqual(client.GET(self.URI_BASE + '/'), [1, 2, 3])
+        self.assertEqual(self.requests[1].get_header('If-none-match'), '"v1"')
+
+    def test_cache_lastModified_sendsIfModifiedSince(self):
+        date = 'Sat, 01 Jan 2000 00:00:00 GMT'
+        client = json.JsonClient(self.USERNAME, self.PASSWORD,
+                                 cache=cache.MemoryCache())
+        self.mock_setConditionalServer({'Last-Modified': date})
+        client.GET(self.URI_BASE + '/')
+        self.assertEqual(client.GET(self.URI_BASE + '/'), [1, 2, 3])
+        self.assertEqual(self.requests[1].get_header('If-modified-since'),
+                         date)
+
+    def test_cache_withoutValidators_isNotUsed(self):
+        client = json.JsonClient(self.USERNAME, self.PASSWORD,
+                                 cache=cache.MemoryCache())
+        self.mock_setConditionalServer({})
+        client.GET(self.URI_BASE + '/')
+        client.GET(self.URI_BASE + '/')
+        self.assertFalse(self.requests[1].has_header('If-none-match'))
+
+    def test_cache_isSeparatedByUser(self):
+        shared = cache.MemoryCache()
+        self.mock_setConditionalServer({'ETag': '"v1"'})
+        json.JsonClient('john', 'secret', cache=shared).GET(self.URI_BASE)
+        json.JsonClient('jane', 'secret', cache=shared).GET(self.URI_BASE)
+        self.assertFalse(self.requests[1].has_header('If-none-match'))
+
+    def test_notModified_withoutCache_raisesNotModified(self):
+        client = json.JsonClient(self.USERNAME, self.PASSWORD)
+        self.mock_setConditionalServer({})
+        self.assertRaises(http.NotModified, client._request, 'GET',
+                          self.URI_BASE + '/', None, {'If-None-Match': '*'})
+
+
+class Test_iterdecode(unittest.TestCase):
+    DATA = [1, -2.5e3, 'caf\u00e9 \u266b', None, True, {'a': [1, {}]}, [], '']
+
+    def encode(self, value):
+        return json.JsonClient.encode(value)
+
+    def test_itemsSplitAtEveryByte(self):
+        data = self.encode(self.DATA)
+        blocks = [data[i:i + 1] for i in range(len(data))]
+        self.assertEqual(list(json.iterdecode(blocks)), self.DATA)
+
+    def test_arrayOfObject_collectsOtherMembers(self):
+        data = self.encode({'timestamp': 12, 'actions': self.DATA,
+                            'extra': {'b': 2}})
+        members = {}
+        self.assertEqual(list(json.iterdecode([data[:7], data[7:]],
+                                              'actions', members)),
+                         self.DATA)
+        self.assertEqual(members, {'timestamp': 12, 'extra': {'b': 2}})
+
+    def test_emptyArrays(self):
+        self.assertEqual(list(json.iterdecode([b' [ ] '])), [])
+        self.assertEqual(list(json.iterdecode([b'{}'], 'actions')), [])
+
+    def test_itemsAreDecodedLazily(self):
+        blocks = itertools.chain([b'['], itertools.repeat(b'12345, '))
+        items = json.iterdecode(blocks)
+        self.assertEqual(list(itertools.islice(items, 1000)),
+                         [12345] * 1000)
+
+    def test_largeItem_isDecoded(self):
+        item = {'description': 'x' * 100000}
+        data = self.encode([item, item])
+        blocks = [data[i:i + 100] for i in range(0, len(data), 100)]
+        self.assertEqual(list(json.iterdecode(blocks)), [item, item])
+
+    def test_invalidData_raisesJsonException(self):
+        for data in (b'[1, 2', b'[1 2]', b'{"a": 1}', b'[1, nope]'):
+            self.assertRaises(json.JsonException, list,
+                              json.iterdecode([data]))
+
+
+class Test_JsonCodecs(unittest.TestCase):
+    DATA = {'actions': [{'podcast': 'http://example.com/feed.rss',
+                         'episode': 'http://example.com/caf\u00e9.mp3',
+                         'action': 'play', 'position': 10,
+                         'timestamp': '2009-12-12T09:00:00'}],
+            'timestamp': 1262103016, 'ratio': 0.5, 'valid': True,
+            'missing': None}
+
+    def setUp(self):
+        self.default = json.get_codec()
+
+    def tearDown(self):
+        json.register_codec(self.default, default=True)
+
+    def test_availableCodecs_roundTrip(self):
+        self.assertEqual(json.available_codecs()[-1], 'json')
+        for name in json.available_codecs():
+            codec = json.get_codec(name)
+            data = codec.dumps(self.DATA)
+            self.assertTrue(isinstance(data, bytes))
+            self.assertEqual(codec.loads(data), self.DATA)
+            self.assertEqual(json.get_codec('json').loads(data), self.DATA)
+
+    def test_invalidData_raisesValueError(self):
+        for name in json.available_codecs():
+            self.assertRaises(ValueError, json.get_codec(name).loads,
+                              b'{"a": nope}')
+
+    def test_invalidUtf8_raisesValueError(self):
+        for name in json.available_codecs():
+            self.assertRaises(ValueError, json.get_codec(name).loads,
+                              b'["\xff"]')
+
+    def test_unknownCodec_raisesValueError(self):
+        self.assertRaises(ValueError, json.get_codec, 'yaml')
+        self.assertRaises(ValueError, json.set_default_codec, 'yaml')
+
+    def test_setDefaultCodec_isUsedByClients(self):
+        calls = []
+        stdlib = json.get_codec('json')
+
+        def loads(data):
+            calls.append(data)
+            return stdlib.loads(data)
+
+        json.register_codec(json.JsonCodec('counting', stdlib.dumps, loads))
+        json.set_default_codec('counting')
+        self.assertEqual(json.JsonClient.decode(b'[1]'), [1])
+
+        fake_client = testing.FakeJsonClient()
+        fake_client.response_value = b'[2]'
+        self.assertEqual(fake_client.GET('http://example.com/'), [2])
+        self.assertEqual(calls, [b'[1]', b'[2]'])
+
+    def test_decode_invalidData_raisesJsonException(self):
+        for name in json.available_codecs():
+            json.set_default_codec(name)
+            self.assertRaises(json.JsonException, json.JsonClient.decode,
+                              b'caf\xc3\xa9')
+
+
+class Test_Schema(unittest.TestCase):
+
+    class Point(object):
+        def __init__(self, x, y, label=None):
+            self.x = x
+            self.y = y
+            self.label = label
+
+    def setUp(self):
+        self.schema = json.Schema(self.Point, ('x', 'y'), ('label',),
+                                  error=KeyError, message='no point')
+
+    def test_build_passesOptionalKeys(self):
+        point = self.schema.build({'x': 1, 'y': 2, 'label': 'a', 'z': 3})
+        self.assertEqual((point.x, point.y, point.label), (1, 2, 'a'))
+        point = self.schema.build({'x': 1, 'y': 2})
+        self.assertEqual(point.label, None)
+
+    def test_build_missingKey_raisesError(self):
+        self.assertRaises(KeyError, self.schema.build, {'x': 1})
+
+    def test_build_noObject_raisesError(self):
+        self.assertRaises(KeyError, self.schema.build, ['x', 'y'])
+
+    def test_buildList_replacesItemsInPlace(self):
+        items = json.JsonClient.decode(b'[{"x": 1, "y": 2}, {"x": 3, "y": 4}]')
+        points = self.schema.build_list(items)
+        self.assertTrue(points is items)
+        self.assertEqual([p.x for p in points], [1, 3])
+
+    def test_buildList_acceptsIterables(self):
+        points = self.schema.build_list(iter([{'x': 1, 'y': 2}]))
+        self.assertEqual([p.y for p in points], [2])
+
+    def test_singleRequiredKey(self):
+        schema = json.Schema(str, ('x',))
+        self.assertEqual(schema.build({'x': 1}), '1')
+        self.assertRaises(ValueError, schema.build, {})
+
+
+class Test_ObjectEncoder(unittest.TestCase):
+    POINTS = [Test_Schema.Point(1, 2, 'a'), Test_Schema.Point(3, 4),
+              Test_Schema.Point('x', None, 'http://example.com/?a=1,b=2')]
+
+    def setUp(self):
+        self.default = json.get_codec()
+        self.encoder = json.ObjectEncoder(('x', 'y'), ('label',))
+
+    def tearDown(self):
+        json.register_codec(self.default, default=True)
+
+    def each_codec(self):
+        """Use every codec in turn, also without its dumps_string"""
+        for name in json.available_codecs():
+            codec = json.get_codec(name)
+            json.set_default_codec(name)
+            yield
+            json.register_codec(json.JsonCodec(name + '-plain', codec.dumps,
+                                               codec.loads), default=True)
+            yield
+
+    def assert_sameAsCodec(self, points):
+        expected = json.get_codec().dumps([self.encoder.to_dict(point)
+                                           for point in points])
+        self.assertEqual(self.encoder.encode(points), expected)
+        self.assertEqual(b''.join(json.iterencode(
+            points, block_size=10, encoder=self.encoder)), expected)
+
+    def test_toDict_leavesOutMissingOptionalValues(self):
+        self.assertEqual(self.encoder.to_dict(self.POINTS[1]),
+                         {'x': 3, 'y': 4})
+        self.assertEqual(self.encoder.to_dict(self.POINTS[2]),
+                         {'x': 'x', 'y': None,
+                          'label': 'http://example.com/?a=1,b=2'})
+
+    def test_encode_isSameAsCodec_forAllCodecs(self):
+        for _ in self.each_codec():
+            self.assert_sameAsCodec(self.POINTS)
+            self.assert_sameAsCodec([])
+
+    def test_encode_valuesToEscape_areSameAsCodec(self):
+        points = [Test_Schema.Point(1, 2, label)
+                  for label in ('"quoted"', 'back\\slash', 'café',
+                                'tab\t', '100%', 'bell\x07',
+                                'line\u2028separator')]
+        points.append(Test_Schema.Point(0.5, True))
+        for _ in self.each_codec():
+            for point in points:
+                self.assert_sameAsCodec([self.POINTS[0], point])
+
+    def test_encodeValues_isSameAsCodec(self):
+        encoder = json.ObjectEncoder(('set', 'remove'))
+        for _ in self.each_codec():
+            for values in (({}, []), ({'a': 1, 'b': [None, 'c']}, ['d'])):
+                self.assertEqual(encoder.encode_values(values),
+                                 json.get_codec().dumps(
+                                     {'set': values[0],
+                                      'remove': values[1]}))
+
+    def test_encode_otherSeparators_isSameAsCodec(self):
+        stdlib = json.get_codec('json')
+        json.register_codec(json.JsonCodec(
+            'wrapped', lambda data: stdlib.dumps(data).replace(b', ', b',\n'),
+            stdlib.loads), default=True)
+        self.assert_sameAsCodec(self.POINTS)
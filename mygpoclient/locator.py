@@ -17,13 +17,7 @@
 
 import mygpoclient
 
-try:
-    # Python 3
-    from urllib.parse import quote_plus, quote
-
-except ImportError:
-    # Python 2
-    from urllib import quote_plus, quote
+from urllib.parse import quote_plus, quote
 
 from mygpoclient import util
 
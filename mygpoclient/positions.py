@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Latest state of episodes from episode actions of all devices
+
+A PositionTracker keeps the latest play, download and delete action of
+every episode. New actions (downloaded from the server or created
+locally) are folded in as they come, so the whole action history never
+has to be replayed:
+
+    tracker = PositionTracker.load('positions.json')
+    changes = client.download_episode_actions(since=tracker.since)
+    for state in tracker.update_changes(changes):
+        player.seek(state.episode, state.position)
+    tracker.save('positions.json')
+
+The latest action of a kind is the one with the newest timestamp. Ties
+are broken by the position, device, started and total values, so the
+result doesn't depend on the order in which actions arrive (e.g. local
+actions before or after the same actions from the server).
+"""
+
+import os
+import threading
+
+from mygpoclient import api
+from mygpoclient import json
+from mygpoclient import util
+
+
+def _order_key(action):
+    """Get the key by which actions of the same kind are ordered
+
+    Actions without (valid) timestamp are older than all others.
+
+    >>> a = api.EpisodeAction('p', 'e', 'play', 'phone',
+    ...                       '2009-12-12T09:00:00', 0, 10, 100)
+    >>> b = api.EpisodeAction('p', 'e', 'play', 'laptop',
+    ...                       '2009-12-12T09:00:00', 0, 20, 100)
+    >>> _order_key(a) < _order_key(b)
+    True
+    >>> _order_key(api.EpisodeAction('p', 'e', 'play')) < _order_key(a)
+    True
+    """
+    epoch = None
+    if action.timestamp is not None:
+        epoch = util.iso8601_to_epoch(action.timestamp)
+    return (float('-inf') if epoch is None else epoch,
+            -1 if action.position is None else action.position,
+            action.device or '',
+            -1 if action.started is None else action.started,
+            -1 if action.total is None else action.total)
+
+
+class EpisodeState(object):
+    """Latest known state of an episode
+
+    Attributes:
+    podcast - The feed URL of the podcast
+    episode - The enclosure URL or GUID of the episode
+    play - The latest "play" EpisodeAction (or None)
+    download - The latest "download" EpisodeAction (or None)
+    delete - The latest "delete" EpisodeAction (or None)
+    """
+    __slots__ = ('podcast', 'episode', 'play', 'download', 'delete')
+
+    def __init__(self, podcast, episode):
+        self.podcast = podcast
+        self.episode = episode
+        self.play = None
+        self.download = None
+        self.delete = None
+
+    @property
+    def position(self):
+        """The latest play position in seconds (or None)"""
+        return None if self.play is None else self.play.position
+
+    @property
+    def downloaded(self):
+        """True if the episode was downloaded after it was deleted"""
+        if self.download is None:
+            return False
+        return (self.delete is None or
+                _order_key(self.download) > _order_key(self.delete))
+
+    def actions(self):
+        """Get the latest actions (at most one of every kind)"""
+        return [action for action in (self.download, self.play, self.delete)
+                if action is not None]
+
+    def fold(self, action):
+        """Use action if it's newer than the latest one of its kind
+
+        Returns True if the state changed.
+        """
+        latest = getattr(self, action.action)
+        if latest is not None and _order_key(action) <= _order_key(latest):
+            return False
+
+        setattr(self, action.action, action)
+        return True
+
+
+class PositionTracker(object):
+    """Latest state of every episode, updated incrementally
+
+    Actions other than play, download and delete are ignored. since is
+    the timestamp for the next download_episode_actions request, as set
+    by update_changes. It's saved in snapshots together with the latest
+    actions (not the whole history), so they stay small.
+
+    >>> tracker = PositionTracker()
+    >>> changed = tracker.update([
+    ...     api.EpisodeAction('p', 'e', 'play', 'phone',
+    ...                       '2009-12-12T10:00:00', 0, 600, 3600),
+    ...     api.EpisodeAction('p', 'e', 'play', 'laptop',
+    ...                       '2009-12-12T09:00:00', 0, 120, 3600)])
+    >>> [(state.episode, state.position) for state in changed]
+    [('e', 600)]
+    >>> tracker.position('p', 'e')
+    600
+    """
+    TRACKED_ACTIONS = ('play', 'download', 'delete')
+
+    def __init__(self, since=None):
+        self.since = since
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._states.values()))
+
+    def get(self, podcast, episode):
+        """Get the EpisodeState of an episode, or None"""
+        return self._states.get((podcast, episode))
+
+    def position(self, podcast, episode):
+        """Get the latest play position of an episode, or None"""
+        state = self._states.get((podcast, episode))
+        return None if state is None else state.position
+
+    def update(self, actions):
+        """Fold in EpisodeAction objects (remote or local, in any order)
+
+        Returns the states that changed, in the order in which they
+        first changed.
+        """
+        changed = {}
+        tracked = self.TRACKED_ACTIONS
+        with self._lock:
+            states = self._states
+            for action in actions:
+                if action.action not in tracked:
+                    continue
+
+                key = (action.podcast, action.episode)
+                state = states.get(key)
+                if state is None:
+                    state = states[key] = EpisodeState(*key)
+                if state.fold(action):
+                    changed[key] = state
+
+        return list(changed.values())
+
+    def update_changes(self, changes):
+        """Fold in an EpisodeActionChanges object and take its since
+
+        This works for the generators of iter_episode_actions as well.
+        """
+        changed = self.update(changes.actions)
+        if changes.since is not None:
+            self.since = changes.since
+        return changed
+
+    def snapshot(self):
+        """Get the since value and latest actions as JSON (bytes)"""
+        with self._lock:
+            actions = [action for state in self._states.values()
+                       for action in state.actions()]
+            since = self.since
+
+        return json.JsonClient.encode({
+            'since': since,
+            'actions': [action.to_dictionary() for action in actions],
+        })
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """Create a tracker from the result of snapshot"""
+        snapshot = json.JsonClient.decode(data)
+        tracker = cls(snapshot['since'])
+        tracker.update(api.EpisodeAction.from_dictionaries(
+            snapshot['actions'], trusted=True))
+        return tracker
+
+    def save(self, filename):
+        """Write a snapshot to a file (replacing it atomically)"""
+        util.replace_file(filename, self.snapshot())
+
+    @classmethod
+    def load(cls, filename):
+        """Create a tracker from a saved snapshot (empty if there's none)"""
+        try:
+            with open(filename, 'rb') as fp:
+                data = fp.read()
+        except (IOError, OSError):
+            if os.path.exists(filename):
+                raise
+            return cls()
+
+        return cls.from_snapshot(data)
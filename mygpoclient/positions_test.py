@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import os
+import shutil
+import tempfile
+
+from mygpoclient import api
+from mygpoclient import positions
+
+import unittest
+
+FEED_URL = 'http://example.com/test.rss'
+EPISODE_1 = 'http://example.com/1.mp3'
+EPISODE_2 = 'http://example.com/2.mp3'
+
+ACTIONS = [
+    api.EpisodeAction(FEED_URL, EPISODE_1, 'download', 'phone',
+                      '2009-12-12T08:00:00'),
+    api.EpisodeAction(FEED_URL, EPISODE_1, 'play', 'phone',
+                      '2009-12-12T09:00:00', 0, 120, 3600),
+    api.EpisodeAction(FEED_URL, EPISODE_1, 'play', 'laptop',
+                      '2009-12-12T10:00:00', 120, 900, 3600),
+    api.EpisodeAction(FEED_URL, EPISODE_1, 'delete', 'phone',
+                      '2009-12-12T11:00:00'),
+    api.EpisodeAction(FEED_URL, EPISODE_2, 'play', 'phone',
+                      '2009-12-12T10:00:00', 0, 60, 1800),
+    api.EpisodeAction(FEED_URL, EPISODE_2, 'play', 'laptop',
+                      '2009-12-12T10:00:00', 0, 30, 1800),
+    api.EpisodeAction(FEED_URL, EPISODE_2, 'new', 'phone',
+                      '2009-12-12T12:00:00'),
+]
+
+
+def summary(tracker):
+    return sorted((state.episode, state.position, state.downloaded,
+                   [a.to_dictionary() for a in state.actions()])
+                  for state in tracker)
+
+
+class Test_PositionTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = positions.PositionTracker()
+
+    def test_update_keepsLatestActionOfEveryKind(self):
+        self.tracker.update(ACTIONS)
+        state = self.tracker.get(FEED_URL, EPISODE_1)
+        self.assertEqual(state.position, 900)
+        self.assertEqual(state.play.device, 'laptop')
+        self.assertFalse(state.downloaded)
+        self.assertEqual(len(self.tracker), 2)
+        self.assertEqual(self.tracker.get(FEED_URL, 'unknown'), None)
+
+    def test_update_sameTimestamp_isResolvedByPosition(self):
+        self.tracker.update(ACTIONS)
+        self.assertEqual(self.tracker.position(FEED_URL, EPISODE_2), 60)
+
+    def test_update_anyOrder_givesSameState(self):
+        expected = None
+        for order in itertools.permutations(ACTIONS[:6]):
+            tracker = positions.PositionTracker()
+            for action in order:
+                tracker.update([action])
+            if expected is None:
+                expected = summary(tracker)
+            self.assertEqual(summary(tracker), expected)
+
+    def test_update_returnsChangedStates(self):
+        self.tracker.update(ACTIONS[:3])
+        self.assertEqual(self.tracker.update(ACTIONS[1:2]), [])
+        changed = self.tracker.update(ACTIONS[3:])
+        self.assertEqual([state.episode for state in changed],
+                         [EPISODE_1, EPISODE_2])
+
+    def test_update_withoutTimestamp_isOlderThanAll(self):
+        self.tracker.update(ACTIONS[1:2])
+        self.tracker.update([api.EpisodeAction(FEED_URL, EPISODE_1, 'play',
+                                               None, None, 0, 3000, 3600)])
+        self.assertEqual(self.tracker.position(FEED_URL, EPISODE_1), 120)
+
+    def test_updateChanges_takesSince(self):
+        changes = api.EpisodeActionChanges(iter(ACTIONS), 1262103016)
+        self.tracker.update_changes(changes)
+        self.assertEqual(self.tracker.since, 1262103016)
+        self.tracker.update_changes(api.EpisodeActionChanges([], None))
+        self.assertEqual(self.tracker.since, 1262103016)
+
+    def test_snapshot_roundTrip(self):
+        self.tracker.update_changes(api.EpisodeActionChanges(ACTIONS, 12))
+        restored = positions.PositionTracker.from_snapshot(
+            self.tracker.snapshot())
+        self.assertEqual(restored.since, 12)
+        self.assertEqual(summary(restored), summary(self.tracker))
+
+
+class Test_PositionTracker_files(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'positions.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_missingFile_givesEmptyTracker(self):
+        tracker = positions.PositionTracker.load(self.filename)
+        self.assertEqual((len(tracker), tracker.since), (0, None))
+
+    def test_saveAndLoad(self):
+        tracker = positions.PositionTracker(42)
+        tracker.update(ACTIONS)
+        tracker.save(self.filename)
+        tracker.save(self.filename)
+        self.assertEqual(os.listdir(self.directory), ['positions.json'])
+
+        restored = positions.PositionTracker.load(self.filename)
+        self.assertEqual(restored.since, 42)
+        self.assertEqual(summary(restored), summary(tracker))
@@ -17,6 +17,7 @@
 
 import mygpoclient
 
+from mygpoclient import http
 from mygpoclient import locator
 from mygpoclient import json
 from mygpoclient import simple
@@ -31,6 +32,7 @@ class Tag(object):
     """
 
     REQUIRED_KEYS = ('tag', 'usage')
+    __slots__ = REQUIRED_KEYS
 
     def __init__(self, tag, usage):
         self.tag = tag
@@ -38,11 +40,7 @@ class Tag(object):
 
     @classmethod
     def from_dict(cls, d):
-        for key in cls.REQUIRED_KEYS:
-            if key not in d:
-                raise ValueError('Missing keys for tag')
-
-        return cls(*(d.get(k) for k in cls.REQUIRED_KEYS))
+        return cls(*TAG_SCHEMA.values(d))
 
     def __eq__(self, other):
         """Test two tag objects for equality
@@ -61,6 +59,10 @@ class Tag(object):
                    for k in self.REQUIRED_KEYS)
 
 
+TAG_SCHEMA = json.Schema(Tag, Tag.REQUIRED_KEYS,
+                         message='Missing keys for tag')
+
+
 class Episode(object):
     """Container Class for Episodes
 
@@ -77,6 +79,7 @@ class Episode(object):
 
     REQUIRED_KEYS = ('title', 'url', 'podcast_title', 'podcast_url',
                      'description', 'website', 'released', 'mygpo_link')
+    __slots__ = REQUIRED_KEYS
 
     def __init__(self, title, url, podcast_title, podcast_url,
                  description, website, released, mygpo_link):
@@ -91,11 +94,7 @@ class Episode(object):
 
     @classmethod
     def from_dict(cls, d):
-        for key in cls.REQUIRED_KEYS:
-            if key not in d:
-                raise ValueError('Missing keys for episode')
-
-        return cls(*(d.get(k) for k in cls.REQUIRED_KEYS))
+        return cls(*EPISODE_SCHEMA.values(d))
 
     def __eq__(self, other):
         """Test two Episode objects for equality
@@ -114,17 +113,26 @@ class Episode(object):
                    for k in self.REQUIRED_KEYS)
 
 
+EPISODE_SCHEMA = json.Schema(Episode, Episode.REQUIRED_KEYS,
+                             message='Missing keys for episode',
+                             interned=('podcast_url',))
+
+
 class PublicClient(object):
     """Client for the gpodder.net "anonymous" API
 
     This is the API client implementation that provides a
     pythonic interface to the parts of the gpodder.net
     Simple API that don't need user authentication.
+
+    Every method that talks to the webservice accepts an optional
+    "deadline" keyword argument: the number of seconds after which the
+    call (including all of its requests) fails with http.RequestTimeout.
     """
     FORMAT = 'json'
 
     def __init__(self, root_url=mygpoclient.ROOT_URL,
-                 client_class=json.JsonClient):
+                 client_class=json.JsonClient, **kwargs):
         """Creates a new Public API client
 
         The parameter root_url is optional and defaults to
@@ -135,10 +143,17 @@ class PublicClient(object):
         not need to be changed in normal use cases. If it
         is changed, it should provide the same interface
         as the json.JsonClient class in mygpoclient.
+
+        Additional keyword arguments are passed on to client_class,
+        e.g. a http.ConnectionPool as "pool", a retry.RetryPolicy as
+        "retry_policy", a ratelimit.RateLimiter as "rate_limiter", a
+        cache.MemoryCache or cache.FileCache as "cache" or the timeouts
+        "connect_timeout", "read_timeout" and "deadline".
         """
         self._locator = locator.Locator(None, root_url)
-        self._client = client_class(None, None)
+        self._client = client_class(None, None, **kwargs)
 
+    @http.accepts_deadline
     def get_toplist(self, count=mygpoclient.TOPLIST_DEFAULT):
         """Get a list of most-subscribed podcasts
 
@@ -150,8 +165,20 @@ class PublicClient(object):
         the maximum value is 100.
         """
         uri = self._locator.toplist_uri(count, self.FORMAT)
-        return [simple.Podcast.from_dict(x) for x in self._client.GET(uri)]
+        return simple.PODCAST_SCHEMA.build_list(self._client.GET(uri))
+
+    @http.accepts_deadline
+    def iter_toplist(self, count=mygpoclient.TOPLIST_DEFAULT):
+        """Get the most-subscribed podcasts one at a time
+
+        Like get_toplist, but returns a generator of simple.Podcast
+        objects that are decoded while the response is read.
+        """
+        uri = self._locator.toplist_uri(count, self.FORMAT)
+        return (simple.PODCAST_SCHEMA.build(x)
+                for x in self._client.GET_items(uri))
 
+    @http.accepts_deadline
     def search_podcasts(self, query):
         """Search for podcasts on the webservice
 
@@ -161,8 +188,20 @@ class PublicClient(object):
         query as a string.
         """
         uri = self._locator.search_uri(query, self.FORMAT)
-        return [simple.Podcast.from_dict(x) for x in self._client.GET(uri)]
+        return simple.PODCAST_SCHEMA.build_list(self._client.GET(uri))
+
+    @http.accepts_deadline
+    def iter_search_podcasts(self, query):
+        """Search for podcasts and get the results one at a time
+
+        Like search_podcasts, but returns a generator of simple.Podcast
+        objects that are decoded while the response is read.
+        """
+        uri = self._locator.search_uri(query, self.FORMAT)
+        return (simple.PODCAST_SCHEMA.build(x)
+                for x in self._client.GET_items(uri))
 
+    @http.accepts_deadline
     def get_podcasts_of_a_tag(self, tag, count=mygpoclient.TOPLIST_DEFAULT):
         """Get a list of most-subscribed podcasts of a Tag
 
@@ -176,8 +215,21 @@ class PublicClient(object):
         the maximum value is 100.
         """
         uri = self._locator.podcasts_of_a_tag_uri(tag, count)
-        return [simple.Podcast.from_dict(x) for x in self._client.GET(uri)]
+        return simple.PODCAST_SCHEMA.build_list(self._client.GET(uri))
+
+    @http.accepts_deadline
+    def iter_podcasts_of_a_tag(self, tag, count=mygpoclient.TOPLIST_DEFAULT):
+        """Get the most-subscribed podcasts of a Tag one at a time
+
+        Like get_podcasts_of_a_tag, but returns a generator of
+        simple.Podcast objects that are decoded while the response is
+        read.
+        """
+        uri = self._locator.podcasts_of_a_tag_uri(tag, count)
+        return (simple.PODCAST_SCHEMA.build(x)
+                for x in self._client.GET_items(uri))
 
+    @http.accepts_deadline
     def get_toptags(self, count=mygpoclient.TOPLIST_DEFAULT):
         """Get a list of most-used tags
 
@@ -189,8 +241,9 @@ class PublicClient(object):
         the maximum value is 100.
         """
         uri = self._locator.toptags_uri(count)
-        return [Tag.from_dict(x) for x in self._client.GET(uri)]
+        return TAG_SCHEMA.build_list(self._client.GET(uri))
 
+    @http.accepts_deadline
     def get_podcast_data(self, podcast_uri):
         """Get Metadata for the specified Podcast
 
@@ -199,8 +252,9 @@ class PublicClient(object):
         The parameter "podcast_uri" specifies the URL of the Podcast.
         """
         uri = self._locator.podcast_data_uri(podcast_uri)
-        return simple.Podcast.from_dict(self._client.GET(uri))
+        return simple.PODCAST_SCHEMA.build(self._client.GET(uri))
 
+    @http.accepts_deadline
     def get_episode_data(self, podcast_uri, episode_uri):
         """Get Metadata for the specified Episode
 
@@ -212,4 +266,4 @@ class PublicClient(object):
         The parameter "episode_uri" specifies the URL of the Episode
         """
         uri = self._locator.episode_data_uri(podcast_uri, episode_uri)
-        return Episode.from_dict(self._client.GET(uri))
+        return EPISODE_SCHEMA.build(self._client.GET(uri))
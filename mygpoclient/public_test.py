@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from mygpoclient import http
 from mygpoclient import public
 from mygpoclient import simple
 from mygpoclient import testing
@@ -207,3 +208,36 @@ class Test_PublicClient(unittest.TestCase):
             'http://www.podtrac.com/pts/redirect.mp3/aolradio.podcast.aol.com/twit/twit0245.mp3')
         self.assertEqual(result, self.EPISODE)
         self.assertEqual(len(self.fake_client.requests), 1)
+
+    def test_deadline_limitsRequestsOfCall(self):
+        remaining = []
+        GET = self.fake_client.GET
+
+        def timed_GET(uri):
+            remaining.append(http.remaining_time())
+            return GET(uri)
+
+        self.fake_client.GET = timed_GET
+        self.fake_client.response_value = self.TOPTAGS_JSON
+        self.assertEqual(self.client.get_toptags(deadline=10), self.TOPTAGS)
+        self.assertTrue(0 < remaining[0] <= 10)
+        self.assertEqual(http.remaining_time(), None)
+
+    def test_iterToplist(self):
+        self.fake_client.response_value = self.TOPLIST_JSON
+        result = self.client.iter_toplist()
+        self.assertEqual(next(result), self.TOPLIST[0])
+        self.assertEqual(list(result), self.TOPLIST[1:])
+        self.assertEqual(len(self.fake_client.requests), 1)
+
+    def test_iterSearchPodcasts(self):
+        self.fake_client.response_value = self.SEARCHRESULT_JSON
+        result = self.client.iter_search_podcasts('linux')
+        self.assertEqual(list(result), self.SEARCHRESULT)
+        self.assertEqual(len(self.fake_client.requests), 1)
+
+    def test_iterPodcastsOfATag(self):
+        self.fake_client.response_value = self.TOPLIST_JSON
+        result = self.client.iter_podcasts_of_a_tag('linux')
+        self.assertEqual(list(result), self.TOPLIST)
+        self.assertEqual(len(self.fake_client.requests), 1)
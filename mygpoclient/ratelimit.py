@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+# Monotonic clock for measuring token refills
+_now = time.monotonic
+
+
+class RateLimitExceeded(Exception):
+    """Raised if a non-blocking rate limiter has no token for a request"""
+    pass
+
+
+class RateLimiter(object):
+    """Per-host token bucket rate limiter
+
+    Every host gets a bucket of burst tokens that is refilled at rate
+    tokens per second, and every request takes one token. One limiter
+    can be shared by any number of clients (and threads) to cap the
+    total request rate to a server, e.g.:
+
+        limiter = RateLimiter(rate=5, burst=10)
+        client = MygPodderClient(username, password, rate_limiter=limiter)
+
+    By default, acquire blocks until a token is available (or timeout
+    seconds have passed). With blocking=False, clients raise
+    RateLimitExceeded instead of waiting.
+
+    >>> limiter = RateLimiter(rate=1, burst=2)
+    >>> limiter.acquire('gpodder.net', blocking=False)
+    True
+    >>> limiter.acquire('gpodder.net', blocking=False)
+    True
+    >>> limiter.acquire('gpodder.net', blocking=False)
+    False
+    >>> limiter.acquire('example.org', blocking=False)
+    True
+    """
+
+    def __init__(self, rate, burst=None, blocking=True, timeout=None,
+                 clock=_now, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('rate must be positive but was %s' % rate)
+
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1., self.rate)
+        self.blocking = blocking
+        self.timeout = timeout
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # host -> (tokens, time of last refill)
+        self._buckets = {}
+
+    def poll(self, host):
+        """Take a token for host if one is available
+
+        Returns 0 if a token has been taken, otherwise the number of
+        seconds until the next token will be available.
+        """
+        with self._lock:
+            now = self._clock()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[host] = (tokens - 1, now)
+                return 0
+
+            self._buckets[host] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def acquire(self, host, blocking=None, timeout=None):
+        """Take a token for host, waiting for it if blocking
+
+        Returns True if a token has been taken, or False if there was
+        none (non-blocking) or the timeout has expired. The blocking
+        and timeout parameters default to the values of the limiter.
+        """
+        if blocking is None:
+            blocking = self.blocking
+        if timeout is None:
+            timeout = self.timeout
+
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            delay = self.poll(host)
+            if delay == 0:
+                return True
+
+            if not blocking:
+                return False
+
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining < delay:
+                    return False
+
+            self._sleep(delay)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from mygpoclient import api
+from mygpoclient import ratelimit
+
+import unittest
+
+HOST = 'gpodder.net'
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Test_RateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = ratelimit.RateLimiter(rate=2, burst=3,
+                                             clock=self.clock,
+                                             sleep=self.clock.sleep)
+
+    def test_burst_thenWaitsForRefill(self):
+        for _ in range(3):
+            self.assertTrue(self.limiter.acquire(HOST))
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertTrue(self.limiter.acquire(HOST))
+        self.assertEqual(self.clock.sleeps, [.5])
+
+    def test_poll_returnsTimeUntilNextToken(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.poll(HOST), 0)
+        self.assertEqual(self.limiter.poll(HOST), .5)
+        self.clock.now = .25
+        self.assertEqual(self.limiter.poll(HOST), .25)
+
+    def test_refill_isCappedAtBurst(self):
+        for _ in range(3):
+            self.limiter.poll(HOST)
+        self.clock.now = 100
+        for _ in range(3):
+            self.assertTrue(self.limiter.acquire(HOST, blocking=False))
+        self.assertFalse(self.limiter.acquire(HOST, blocking=False))
+
+    def test_timeout_givesUp(self):
+        for _ in range(3):
+            self.limiter.poll(HOST)
+        self.assertFalse(self.limiter.acquire(HOST, timeout=.4))
+        self.assertTrue(self.limiter.acquire(HOST, timeout=.5))
+
+    def test_hostsHaveSeparateBuckets(self):
+        for _ in range(3):
+            self.limiter.poll(HOST)
+        self.assertTrue(self.limiter.acquire('example.org', blocking=False))
+
+    def test_invalidRate_raisesValueError(self):
+        self.assertRaises(ValueError, ratelimit.RateLimiter, 0)
+
+    def test_sharedBetweenThreads_neverExceedsBurst(self):
+        limiter = ratelimit.RateLimiter(rate=0.001, burst=10, blocking=False)
+        results = []
+
+        def worker():
+            for _ in range(10):
+                results.append(limiter.acquire(HOST))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 10)
+
+    def test_isPassedOnToHttpClient(self):
+        client = api.MygPodderClient('john', 'secret',
+                                     rate_limiter=self.limiter)
+        self.assertIs(client._client._rate_limiter, self.limiter)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import calendar
+import random
+import threading
+import time
+
+from email import utils
+
+# Monotonic clock for measuring delays
+_now = time.monotonic
+
+
+class CircuitOpen(Exception):
+    """Raised instead of sending a request to an unhealthy host"""
+    pass
+
+
+class CircuitBreaker(object):
+    """Per-host circuit breaker
+
+    After failure_threshold consecutive failures (server errors or
+    connection problems) the circuit for a host opens, and requests to
+    that host fail fast with CircuitOpen for reset_timeout seconds.
+    After that, a single trial request is let through: if it succeeds,
+    the circuit closes again, otherwise it stays open for another
+    reset_timeout seconds.
+
+    >>> breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    >>> breaker.record_failure('gpodder.net')
+    >>> breaker.check('gpodder.net')
+    >>> breaker.record_failure('gpodder.net')
+    >>> breaker.check('gpodder.net')
+    Traceback (most recent call last):
+      ...
+    mygpoclient.retry.CircuitOpen: gpodder.net
+    """
+    DEFAULT_FAILURE_THRESHOLD = 5
+    DEFAULT_RESET_TIMEOUT = 30
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT, clock=_now):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        # host -> [consecutive failures, opened at, trial in progress]
+        self._hosts = {}
+
+    def check(self, host):
+        """Raise CircuitOpen if no request should be sent to host"""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return
+
+            if state[2] or self._clock() - state[1] < self.reset_timeout:
+                raise CircuitOpen(host)
+
+            # Half-open: let exactly one trial request through
+            state[2] = True
+
+    def release(self, host):
+        """End a trial request without an outcome (e.g. it was cancelled)
+
+        The circuit stays open, and the next check after reset_timeout
+        lets another trial request through.
+        """
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state[2] = False
+
+    def record_success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, None, False])
+            state[0] += 1
+            if state[2] or state[0] >= self.failure_threshold:
+                state[1] = self._clock()
+                state[2] = False
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header value to seconds (or None)
+
+    >>> parse_retry_after('120')
+    120.0
+    >>> parse_retry_after('Fri, 31 Dec 1999 23:59:59 GMT')
+    0
+    >>> parse_retry_after('soon') is None
+    True
+    """
+    if value is None:
+        return None
+
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+
+    date = utils.parsedate(value)
+    if date is None:
+        return None
+
+    return max(0, calendar.timegm(date) - time.time())
+
+
+class RetryPolicy(object):
+    """Decides if and when a failed request is retried
+
+    A request is retried if its method is in methods and it failed
+    with a status code in status_codes or with a connection error.
+    POST is not retried by default, as the server might have already
+    processed the request (e.g. an upload of episode actions).
+
+    The delay before attempt n+1 is chosen at random between zero and
+    backoff_base * 2 ** (n - 1) seconds, capped at backoff_max
+    ("exponential backoff with full jitter"). If the server sends a
+    Retry-After header, the client waits at least that long. Requests
+    are given up after max_attempts attempts, or when the next attempt
+    would start more than budget seconds after the first one.
+
+    The policy contains a CircuitBreaker (per host), so a policy that
+    is shared by several clients will make all of them fail fast while
+    the server is unhealthy. Pass circuit_breaker=None to disable it.
+
+    >>> policy = RetryPolicy(max_attempts=3, backoff_base=1, random=lambda: 1)
+    >>> policy.next_delay('GET', 503, attempt=1, elapsed=0)
+    1.0
+    >>> policy.next_delay('GET', 503, attempt=2, elapsed=1)
+    2.0
+    >>> policy.next_delay('GET', 503, attempt=3, elapsed=3) is None
+    True
+    >>> policy.next_delay('GET', 404, attempt=1, elapsed=0) is None
+    True
+    >>> policy.next_delay('POST', None, attempt=1, elapsed=0) is None
+    True
+    >>> policy.next_delay('GET', 429, attempt=1, elapsed=0, retry_after=5)
+    5.0
+    """
+    DEFAULT_METHODS = ('GET', 'HEAD', 'PUT')
+    DEFAULT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts=4, methods=DEFAULT_METHODS,
+                 status_codes=DEFAULT_STATUS_CODES, backoff_base=0.5,
+                 backoff_max=30, budget=60, circuit_breaker=True,
+                 random=random.random):
+        self.max_attempts = max_attempts
+        self.methods = methods
+        self.status_codes = status_codes
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker
+        self._random = random
+
+    def check(self, host):
+        """Raise CircuitOpen if the circuit for host is open"""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.check(host)
+
+    def release(self, host):
+        """End an attempt whose outcome won't be recorded"""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.release(host)
+
+    def record(self, host, status=None):
+        """Record the outcome of an attempt for the circuit breaker
+
+        The status is None if the request failed without a response.
+        Server errors and throttling (429) count as failures.
+        """
+        if self.circuit_breaker is None:
+            return
+
+        if status is None or status >= 500 or status == 429:
+            self.circuit_breaker.record_failure(host)
+        else:
+            self.circuit_breaker.record_success(host)
+
+    def next_delay(self, method, status, attempt, elapsed, retry_after=None):
+        """Get the delay before the next attempt, or None to give up
+
+        The status is None if the request failed without a response,
+        attempt is the number of attempts made so far and elapsed is
+        the time in seconds since the first attempt was started.
+        """
+        if method not in self.methods or attempt >= self.max_attempts:
+            return None
+
+        if status is not None and status not in self.status_codes:
+            return None
+
+        delay = self._random() * min(self.backoff_max,
+                                     self.backoff_base * 2 ** (attempt - 1))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        delay = float(delay)
+
+        if elapsed + delay > self.budget:
+            return None
+
+        return delay
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from mygpoclient import retry
+
+import unittest
+
+HOST = 'gpodder.net'
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class Test_CircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = retry.CircuitBreaker(failure_threshold=2,
+                                            reset_timeout=10,
+                                            clock=self.clock)
+
+    def open_circuit(self):
+        self.breaker.record_failure(HOST)
+        self.breaker.record_failure(HOST)
+
+    def test_successResetsFailureCount(self):
+        self.breaker.record_failure(HOST)
+        self.breaker.record_success(HOST)
+        self.breaker.record_failure(HOST)
+        self.breaker.check(HOST)
+
+    def test_openCircuit_failsFast(self):
+        self.open_circuit()
+        self.assertRaises(retry.CircuitOpen, self.breaker.check, HOST)
+        self.breaker.check('other.host')
+
+    def test_halfOpen_allowsSingleTrial(self):
+        self.open_circuit()
+        self.clock.now = 11
+        self.breaker.check(HOST)
+        self.assertRaises(retry.CircuitOpen, self.breaker.check, HOST)
+
+    def test_failedTrial_reopensCircuit(self):
+        self.open_circuit()
+        self.clock.now = 11
+        self.breaker.check(HOST)
+        self.breaker.record_failure(HOST)
+        self.clock.now = 20
+        self.assertRaises(retry.CircuitOpen, self.breaker.check, HOST)
+        self.clock.now = 22
+        self.breaker.check(HOST)
+
+    def test_releasedTrial_allowsAnotherTrial(self):
+        self.open_circuit()
+        self.clock.now = 11
+        self.breaker.check(HOST)
+        self.breaker.release(HOST)
+        self.breaker.check(HOST)
+        self.assertRaises(retry.CircuitOpen, self.breaker.check, HOST)
+
+    def test_successfulTrial_closesCircuit(self):
+        self.open_circuit()
+        self.clock.now = 11
+        self.breaker.check(HOST)
+        self.breaker.record_success(HOST)
+        self.breaker.check(HOST)
+        self.breaker.check(HOST)
+
+
+class Test_RetryPolicy(unittest.TestCase):
+    def test_backoff_isCappedAndJittered(self):
+        policy = retry.RetryPolicy(max_attempts=10, backoff_base=1,
+                                   backoff_max=4, budget=100,
+                                   random=lambda: .5)
+        delays = [policy.next_delay('GET', 503, n, 0) for n in range(1, 6)]
+        self.assertEqual(delays, [.5, 1, 2, 2, 2])
+
+    def test_budgetExceeded_givesUp(self):
+        policy = retry.RetryPolicy(backoff_base=1, budget=5,
+                                   random=lambda: 1)
+        self.assertEqual(policy.next_delay('GET', None, 1, 3), 1)
+        self.assertEqual(policy.next_delay('GET', None, 1, 4.5), None)
+
+    def test_retryAfter_beyondBudget_givesUp(self):
+        policy = retry.RetryPolicy(budget=60)
+        self.assertEqual(policy.next_delay('GET', 503, 1, 0, 120), None)
+
+    def test_record_onlyCountsServerErrors(self):
+        policy = retry.RetryPolicy()
+        policy.circuit_breaker.failure_threshold = 1
+        policy.record(HOST, 404)
+        policy.check(HOST)
+        policy.record(HOST, None)
+        self.assertRaises(retry.CircuitOpen, policy.check, HOST)
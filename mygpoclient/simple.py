@@ -19,6 +19,7 @@ from functools import wraps
 
 import mygpoclient
 
+from mygpoclient import http
 from mygpoclient import locator
 from mygpoclient import json
 
@@ -52,6 +53,7 @@ class Podcast(object):
     """
     REQUIRED_FIELDS = ('url', 'title', 'description', 'website', 'subscribers',
                        'subscribers_last_week', 'mygpo_link', 'logo_url')
+    __slots__ = REQUIRED_FIELDS
 
     def __init__(self, url, title, description, website,
                  subscribers, subscribers_last_week, mygpo_link, logo_url):
@@ -66,11 +68,7 @@ class Podcast(object):
 
     @classmethod
     def from_dict(cls, d):
-        for key in cls.REQUIRED_FIELDS:
-            if key not in d:
-                raise ValueError('Missing keys for toplist podcast')
-
-        return cls(*(d.get(k) for k in cls.REQUIRED_FIELDS))
+        return cls(*PODCAST_SCHEMA.values(d))
 
     def __eq__(self, other):
         """Test two Podcast objects for equality
@@ -89,16 +87,24 @@ class Podcast(object):
                    for k in self.REQUIRED_FIELDS)
 
 
+PODCAST_SCHEMA = json.Schema(Podcast, Podcast.REQUIRED_FIELDS,
+                             message='Missing keys for toplist podcast')
+
+
 class SimpleClient(object):
     """Client for the gpodder.net Simple API
 
     This is the API client implementation that provides a
     pythonic interface to the gpodder.net Simple API.
+
+    Every method that talks to the webservice accepts an optional
+    "deadline" keyword argument: the number of seconds after which the
+    call (including all of its requests) fails with http.RequestTimeout.
     """
     FORMAT = 'json'
 
     def __init__(self, username, password, root_url=mygpoclient.ROOT_URL,
-                 client_class=json.JsonClient):
+                 client_class=json.JsonClient, **kwargs):
         """Creates a new Simple API client
 
         Username and password must be specified and are
@@ -112,12 +118,19 @@ class SimpleClient(object):
         not need to be changed in normal use cases. If it
         is changed, it should provide the same interface
         as the json.JsonClient class in mygpoclient.
+
+        Additional keyword arguments are passed on to client_class,
+        e.g. a http.ConnectionPool as "pool", a retry.RetryPolicy as
+        "retry_policy", a ratelimit.RateLimiter as "rate_limiter", a
+        cache.MemoryCache or cache.FileCache as "cache" or the timeouts
+        "connect_timeout", "read_timeout" and "deadline".
         """
         self.username = username
         self.password = password
         self._locator = locator.Locator(username, root_url)
-        self._client = client_class(username, password)
+        self._client = client_class(username, password, **kwargs)
 
+    @http.accepts_deadline
     @needs_credentials
     def get_subscriptions(self, device_id):
         """Get a list of subscriptions for a device
@@ -131,6 +144,7 @@ class SimpleClient(object):
         uri = self._locator.subscriptions_uri(device_id, self.FORMAT)
         return self._client.GET(uri)
 
+    @http.accepts_deadline
     @needs_credentials
     def put_subscriptions(self, device_id, urls):
         """Update a device's subscription list
@@ -146,6 +160,7 @@ class SimpleClient(object):
         uri = self._locator.subscriptions_uri(device_id, self.FORMAT)
         return self._client.PUT(uri, urls) is None
 
+    @http.accepts_deadline
     @needs_credentials
     def get_suggestions(self, count=10):
         """Get podcast suggestions for the user
@@ -160,7 +175,7 @@ class SimpleClient(object):
         returned (at maximum).
         """
         uri = self._locator.suggestions_uri(count, self.FORMAT)
-        return [Podcast.from_dict(x) for x in self._client.GET(uri)]
+        return PODCAST_SCHEMA.build_list(self._client.GET(uri))
 
     @property
     def locator(self):
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local store for the sync state of gpodder.net accounts
+
+A SyncStore keeps the devices, the subscriptions of every device and
+the latest episode action of every kind for every episode in an SQLite
+database, together with the since values of the last downloads. With a
+store attached, MygPodderClient only asks the server for the changes
+since the last sync, and the state can be queried without requests:
+
+    client = MygPodderClient(username, password,
+                             store=SyncStore('gpodder.sqlite'))
+    client.refresh_subscriptions('laptop')
+    client.refresh_episode_actions()
+    client.store.subscriptions(username, 'laptop')
+    client.store.last_action(username, podcast_url, episode_url)
+
+The database uses write-ahead logging, so it can be read by other
+processes while it's written. Several accounts can share a database.
+"""
+
+import sqlite3
+import threading
+
+from mygpoclient import api
+from mygpoclient import positions
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS watermark (
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    since INTEGER NOT NULL,
+    PRIMARY KEY (user, name)
+);
+CREATE TABLE IF NOT EXISTS device (
+    user TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    caption TEXT,
+    type TEXT NOT NULL,
+    subscriptions INTEGER NOT NULL,
+    PRIMARY KEY (user, device_id)
+);
+CREATE TABLE IF NOT EXISTS subscription (
+    user TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (user, device_id, url)
+);
+CREATE INDEX IF NOT EXISTS subscription_url ON subscription (user, url);
+CREATE TABLE IF NOT EXISTS episode_action (
+    user TEXT NOT NULL,
+    podcast TEXT NOT NULL,
+    episode TEXT NOT NULL,
+    action TEXT NOT NULL,
+    device TEXT,
+    timestamp TEXT,
+    started INTEGER,
+    position INTEGER,
+    total INTEGER,
+    PRIMARY KEY (user, podcast, episode, action)
+);
+CREATE INDEX IF NOT EXISTS episode_action_device
+    ON episode_action (user, device);
+'''
+
+_ACTION_COLUMNS = ('podcast, episode, action, device, timestamp, '
+                   'started, position, total')
+
+
+def _latest_actions(actions):
+    """Get the latest action of every kind for every episode
+
+    Returns a dict with (podcast, episode, action) keys.
+    """
+    latest = {}
+    for action in actions:
+        key = (action.podcast, action.episode, action.action)
+        other = latest.get(key)
+        if (other is None or
+                positions._order_key(action) > positions._order_key(other)):
+            latest[key] = action
+    return latest
+
+
+class SyncStore(object):
+    """Sync state of gpodder.net accounts in an SQLite database
+
+    filename can be ':memory:' for a store that isn't saved. Every
+    method takes the user name of the account first. Changes are
+    committed right away, together with the since value that belongs
+    to them, so the store never has a since value that's newer than
+    its data.
+
+    >>> store = SyncStore(':memory:')
+    >>> store.update_subscriptions('jen', 'n900', ['http://a/', 'http://b/'],
+    ...                            [], since=1262103016)
+    >>> store.subscriptions('jen', 'n900')
+    ['http://a/', 'http://b/']
+    >>> store.subscriptions_since('jen', 'n900')
+    1262103016
+    >>> store.close()
+    """
+
+    def __init__(self, filename, timeout=30):
+        self.filename = filename
+        self._connection = sqlite3.connect(filename, timeout=timeout,
+                                           check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql, parameters):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _since(self, user, name):
+        rows = self._query('SELECT since FROM watermark '
+                           'WHERE user = ? AND name = ?', (user, name))
+        return rows[0][0] if rows else None
+
+    @staticmethod
+    def _set_since(connection, user, name, since):
+        if since is not None:
+            connection.execute('INSERT OR REPLACE INTO watermark '
+                               'VALUES (?, ?, ?)', (user, name, since))
+
+    def subscriptions_since(self, user, device_id):
+        """Get the since value for pulling the subscriptions of a device"""
+        return self._since(user, 'subscriptions/' + device_id)
+
+    def episode_actions_since(self, user):
+        """Get the since value for downloading episode actions"""
+        return self._since(user, 'episode_actions')
+
+    def set_devices(self, user, devices):
+        """Replace the devices with a list of PodcastDevice objects"""
+        rows = [(user, device.device_id, device.caption, device.type,
+                 device.subscriptions) for device in devices]
+        with self._lock, self._connection as connection:
+            connection.execute('DELETE FROM device WHERE user = ?', (user,))
+            connection.executemany('INSERT INTO device '
+                                   'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def devices(self, user):
+        """Get the PodcastDevice objects, ordered by device ID"""
+        rows = self._query('SELECT device_id, caption, type, subscriptions '
+                           'FROM device WHERE user = ? ORDER BY device_id',
+                           (user,))
+        return [api.PodcastDevice(*row) for row in rows]
+
+    def set_subscriptions(self, user, device_id, urls, since=None):
+        """Replace the subscriptions of a device"""
+        rows = [(user, device_id, url) for url in set(urls)]
+        with self._lock, self._connection as connection:
+            connection.execute('DELETE FROM subscription '
+                               'WHERE user = ? AND device_id = ?',
+                               (user, device_id))
+            connection.executemany('INSERT INTO subscription '
+                                   'VALUES (?, ?, ?)', rows)
+            self._set_since(connection, user, 'subscriptions/' + device_id,
+                            since)
+
+    def update_subscriptions(self, user, device_id, add_urls, remove_urls,
+                             update_urls=(), since=None):
+        """Add and remove subscriptions of a device
+
+        For every (old_url, new_url) tuple in update_urls (as in an
+        UpdateResult), old_url is replaced with new_url, or removed if
+        new_url is empty.
+        """
+        removed = set(remove_urls)
+        removed.update(old_url for old_url, _ in update_urls)
+        added = set(add_urls) - removed
+        added.update(new_url for _, new_url in update_urls if new_url)
+        with self._lock, self._connection as connection:
+            connection.executemany('DELETE FROM subscription WHERE user = ? '
+                                   'AND device_id = ? AND url = ?',
+                                   [(user, device_id, url) for url in removed])
+            connection.executemany('INSERT OR IGNORE INTO subscription '
+                                   'VALUES (?, ?, ?)',
+                                   [(user, device_id, url) for url in added])
+            self._set_since(connection, user, 'subscriptions/' + device_id,
+                            since)
+
+    def subscriptions(self, user, device_id):
+        """Get the subscribed URLs of a device (sorted)"""
+        rows = self._query('SELECT url FROM subscription WHERE user = ? '
+                           'AND device_id = ? ORDER BY url',
+                           (user, device_id))
+        return [url for url, in rows]
+
+    def subscribed_devices(self, user, url):
+        """Get the IDs of the devices subscribed to a podcast (sorted)"""
+        rows = self._query('SELECT device_id FROM subscription WHERE user = ? '
+                           'AND url = ? ORDER BY device_id', (user, url))
+        return [device_id for device_id, in rows]
+
+    def add_episode_actions(self, user, actions, since=None):
+        """Fold in EpisodeAction objects (in any order)
+
+        Only the latest action of every kind is kept for every episode
+        (ordered as in the positions module). Returns the actions that
+        replaced a stored one or were new.
+        """
+        latest = _latest_actions(actions)
+        changed = []
+        select = ('SELECT %s FROM episode_action WHERE user = ? AND '
+                  'podcast = ? AND episode = ? AND action = ?' %
+                  _ACTION_COLUMNS)
+        with self._lock, self._connection as connection:
+            for key, action in latest.items():
+                row = connection.execute(select, (user,) + key).fetchone()
+                if row is not None and (positions._order_key(action) <=
+                                        positions._order_key(
+                                            api.EpisodeAction(*row))):
+                    continue
+                connection.execute(
+                    'INSERT OR REPLACE INTO episode_action '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (user, action.podcast, action.episode, action.action,
+                     action.device, action.timestamp, action.started,
+                     action.position, action.total))
+                changed.append(action)
+            self._set_since(connection, user, 'episode_actions', since)
+
+        return changed
+
+    def episode_actions(self, user, podcast=None, device=None):
+        """Get the stored actions, optionally of a podcast or device"""
+        sql = 'SELECT %s FROM episode_action WHERE user = ?' % _ACTION_COLUMNS
+        parameters = (user,)
+        if podcast is not None:
+            sql += ' AND podcast = ?'
+            parameters += (podcast,)
+        if device is not None:
+            sql += ' AND device = ?'
+            parameters += (device,)
+        rows = self._query(sql + ' ORDER BY podcast, episode, action',
+                           parameters)
+        return [api.EpisodeAction(*row) for row in rows]
+
+    def last_action(self, user, podcast, episode, action=None):
+        """Get the latest EpisodeAction of an episode (or None)
+
+        If action is given, only actions of that kind are considered.
+        """
+        sql = ('SELECT %s FROM episode_action WHERE user = ? AND '
+               'podcast = ? AND episode = ?' % _ACTION_COLUMNS)
+        parameters = (user, podcast, episode)
+        if action is not None:
+            sql += ' AND action = ?'
+            parameters += (action,)
+        actions = [api.EpisodeAction(*row)
+                   for row in self._query(sql, parameters)]
+        if not actions:
+            return None
+        return max(actions, key=positions._order_key)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+
+from mygpoclient import api
+from mygpoclient import store
+
+import unittest
+
+USER = 'jen'
+FEED_URL_1 = 'http://example.com/test.rss'
+FEED_URL_2 = 'http://feeds.example.org/1/feed.atom'
+EPISODE_1 = 'http://example.com/1.mp3'
+
+ACTIONS = [
+    api.EpisodeAction(FEED_URL_1, EPISODE_1, 'download', 'phone',
+                      '2009-12-12T08:00:00'),
+    api.EpisodeAction(FEED_URL_1, EPISODE_1, 'play', 'laptop',
+                      '2009-12-12T10:00:00', 120, 900, 3600),
+    api.EpisodeAction(FEED_URL_1, EPISODE_1, 'play', 'phone',
+                      '2009-12-12T09:00:00', 0, 120, 3600),
+    api.EpisodeAction(FEED_URL_2, EPISODE_1, 'play', 'phone',
+                      '2009-12-12T11:00:00', 0, 60, 1800),
+]
+
+
+class Test_SyncStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'sync.sqlite')
+        self.store = store.SyncStore(self.filename)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_usesWriteAheadLog(self):
+        rows = self.store._query('PRAGMA journal_mode', ())
+        self.assertEqual(rows, [('wal',)])
+
+    def test_devices_areReplaced(self):
+        self.store.set_devices(USER, [
+            api.PodcastDevice('n900', 'Phone', 'mobile', 2),
+            api.PodcastDevice('abc', 'Laptop', 'laptop', 10)])
+        self.store.set_devices(USER, [
+            api.PodcastDevice('n900', 'My Phone', 'mobile', 3)])
+        self.store.set_devices('steve', [
+            api.PodcastDevice('abc', 'Laptop', 'laptop', 10)])
+        self.assertEqual([str(device) for device in self.store.devices(USER)],
+                         ["PodcastDevice('n900', 'My Phone', 'mobile', 3)"])
+
+    def test_subscriptions_areUpdated_withRewrites(self):
+        self.store.set_subscriptions(USER, 'n900', [FEED_URL_1, FEED_URL_2])
+        self.store.set_subscriptions(USER, 'abc', [FEED_URL_1])
+        self.store.update_subscriptions(
+            USER, 'n900', ['http://x/ ', 'http://y/'], [FEED_URL_2],
+            [('http://x/ ', 'http://x/'), ('http://y/', '')])
+        self.assertEqual(self.store.subscriptions(USER, 'n900'),
+                         [FEED_URL_1, 'http://x/'])
+        self.assertEqual(self.store.subscribed_devices(USER, FEED_URL_1),
+                         ['abc', 'n900'])
+        self.assertEqual(self.store.subscriptions('steve', 'n900'), [])
+
+    def test_since_isStoredWithChanges(self):
+        self.assertEqual(self.store.subscriptions_since(USER, 'n900'), None)
+        self.store.update_subscriptions(USER, 'n900', [FEED_URL_1], [],
+                                        since=1000)
+        self.store.update_subscriptions(USER, 'n900', [], [FEED_URL_1])
+        self.assertEqual(self.store.subscriptions_since(USER, 'n900'), 1000)
+        self.assertEqual(self.store.subscriptions_since(USER, 'abc'), None)
+
+        self.store.add_episode_actions(USER, ACTIONS, since=2000)
+        self.assertEqual(self.store.episode_actions_since(USER), 2000)
+        self.assertEqual(self.store.episode_actions_since('steve'), None)
+
+    def test_episodeActions_keepLatestOfEveryKind(self):
+        changed = self.store.add_episode_actions(USER, ACTIONS[:2])
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(self.store.add_episode_actions(USER, ACTIONS[2:3]),
+                         [])
+        self.assertEqual(self.store.add_episode_actions(USER, ACTIONS[3:]),
+                         ACTIONS[3:])
+
+        play = self.store.last_action(USER, FEED_URL_1, EPISODE_1, 'play')
+        self.assertEqual(play.to_dictionary(), ACTIONS[1].to_dictionary())
+        last = self.store.last_action(USER, FEED_URL_1, EPISODE_1)
+        self.assertEqual(last.to_dictionary(), ACTIONS[1].to_dictionary())
+        self.assertEqual(self.store.last_action(USER, FEED_URL_1, 'x'), None)
+
+        self.assertEqual(len(self.store.episode_actions(USER)), 3)
+        self.assertEqual(
+            [a.action for a in self.store.episode_actions(USER, FEED_URL_1)],
+            ['download', 'play'])
+        self.assertEqual(
+            [a.podcast for a in self.store.episode_actions(USER,
+                                                           device='phone')],
+            [FEED_URL_1, FEED_URL_2])
+
+    def test_state_isPersistent(self):
+        self.store.set_subscriptions(USER, 'n900', [FEED_URL_1], since=1000)
+        self.store.add_episode_actions(USER, ACTIONS)
+        self.store.close()
+
+        self.store = store.SyncStore(self.filename)
+        self.assertEqual(self.store.subscriptions(USER, 'n900'), [FEED_URL_1])
+        self.assertEqual(self.store.subscriptions_since(USER, 'n900'), 1000)
+        self.assertEqual(len(self.store.episode_actions(USER)), 3)
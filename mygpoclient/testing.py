@@ -40,6 +40,9 @@ class FakeJsonClient(object):
         return self
 
     def _request(self, method, uri, data):
+        if isinstance(data, bytes):
+            # Record data that has been encoded already as decoded
+            data = json.JsonClient.decode(data)
         self.requests.append((method, uri, data))
         data = json.JsonClient.encode(data)
         return json.JsonClient.decode(self.response_value)
@@ -47,8 +50,16 @@ class FakeJsonClient(object):
     def GET(self, uri):
         return self._request('GET', uri, None)
 
+    def GET_items(self, uri, key=None, members=None):
+        self.requests.append(('GET', uri, None))
+        return json.iterdecode([self.response_value], key, members)
+
     def POST(self, uri, data):
         return self._request('POST', uri, data)
 
+    def POST_items(self, uri, items, encoder=None):
+        data = b''.join(json.iterencode(items, encoder=encoder))
+        return self._request('POST', uri, data)
+
     def PUT(self, uri, data):
         return self._request('PUT', uri, data)
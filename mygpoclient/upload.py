@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# gpodder.net API Client
+# Copyright (C) 2009-2013 Thomas Perl and the gPodder Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Chunks and checkpoints for uploads of many episode actions
+
+MygPodderClient.upload_episode_actions_chunked splits the actions into
+chunks (see iter_chunks) and records every acknowledged chunk in a
+Checkpoint, so an upload that failed can be resumed where it stopped:
+
+    since = client.upload_episode_actions_chunked(
+        actions, max_actions=1000, in_flight=4,
+        checkpoint='upload.checkpoint')
+"""
+
+import os
+
+from mygpoclient import json
+from mygpoclient import util
+
+
+def iter_chunks(actions, encoder, max_actions=1000, max_bytes=None):
+    """Split EpisodeAction objects into encoded chunks
+
+    Yields (count, data) tuples, where data is the JSON array of count
+    actions, as encoder (api.EPISODE_ACTION_ENCODER for uploads) writes
+    it. A chunk has at most max_actions actions and (if given) at most
+    max_bytes bytes, unless a single action is larger.
+
+    >>> from mygpoclient import api
+    >>> actions = [api.EpisodeAction('p', 'e%d' % i, 'new') for i in range(5)]
+    >>> encoder = api.EPISODE_ACTION_ENCODER
+    >>> [count for count, data in iter_chunks(actions, encoder, 2)]
+    [2, 2, 1]
+    >>> [count for count, data in iter_chunks(actions, encoder,
+    ...                                       max_bytes=120)]
+    [2, 2, 1]
+    >>> count, data = next(iter_chunks(actions, encoder))
+    >>> data == encoder.encode(actions)
+    True
+    """
+    separator = json.get_codec().dumps([0, 0])[2:-2]
+    parts = []
+    size = 2
+    for action in actions:
+        part = encoder.encode_object(action)
+        extra = len(part) + (len(separator) if parts else 0)
+        if parts and (len(parts) >= max_actions or (
+                max_bytes is not None and size + extra > max_bytes)):
+            yield len(parts), b'[' + separator.join(parts) + b']'
+            parts = []
+            size = 2
+            extra = len(part)
+
+        parts.append(part)
+        size += extra
+
+    if parts:
+        yield len(parts), b'[' + separator.join(parts) + b']'
+
+
+class Checkpoint(object):
+    """File that records the progress of an upload
+
+    It holds the number of actions that have been acknowledged by the
+    server (counted from the start) and the latest since value. The
+    file is replaced atomically, so it's always one or the other.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        """Get (count, since), or (0, None) if there's no checkpoint"""
+        try:
+            with open(self.filename, 'rb') as fp:
+                data = json.JsonClient.decode(fp.read())
+        except (IOError, OSError):
+            if os.path.exists(self.filename):
+                raise
+            return 0, None
+
+        return data['actions'], data['since']
+
+    def save(self, count, since):
+        data = json.JsonClient.encode({'actions': count, 'since': since})
+        util.replace_file(self.filename, data)
+
+    def remove(self):
+        try:
+            os.unlink(self.filename)
+        except OSError:
+            if os.path.exists(self.filename):
+                raise
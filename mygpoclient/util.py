@@ -16,6 +16,23 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import datetime
+import functools
+import os
+import tempfile
+
+from email import utils
+
+# Cache for parsed timestamps; timestamps repeat a lot in episode
+# action lists, e.g. for actions that are uploaded together
+_lru_cache = functools.lru_cache(maxsize=4096)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_fromisoformat = getattr(datetime.datetime, 'fromisoformat', None)
+_DIGITS = frozenset('0123456789')
+_DAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTH_NAMES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_MONTHS = dict((name, month) for month, name in enumerate(_MONTH_NAMES, 1))
 
 
 def join(*args):
@@ -23,6 +40,82 @@ def join(*args):
     return '/'.join(args)
 
 
+def replace_file(filename, data):
+    """Write data (bytes) to a file, replacing it atomically
+
+    The data is written to a temporary file in the same directory,
+    which is then renamed, so readers see either the old or the new
+    contents, but never a partly written file.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _strptime_iso8601(s):
+    for format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
+                   '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.datetime.strptime(s, format)
+        except ValueError:
+            continue
+
+    return None
+
+
+def _parse_canonical(head):
+    """Parse a timestamp of the form YYYY-MM-DDTHH:MM:SS, or get None"""
+    if _fromisoformat is not None:
+        # C implementation (Python 3.7+), made exactly as strict as the
+        # slicing below by formatting the result again
+        try:
+            dt = _fromisoformat(head)
+        except ValueError:
+            return None
+        return dt if dt.isoformat() == head else None
+
+    digits = (head[:4] + head[5:7] + head[8:10] + head[11:13] +
+              head[14:16] + head[17:19])
+    if not (head[4] == head[7] == '-' and head[10] == 'T' and
+            head[13] == head[16] == ':' and _DIGITS.issuperset(digits)):
+        return None
+
+    try:
+        return datetime.datetime(
+            int(digits[:4]), int(digits[4:6]), int(digits[6:8]),
+            int(digits[8:10]), int(digits[10:12]), int(digits[12:]))
+    except ValueError:
+        return None
+
+
+@_lru_cache
+def _parse_iso8601(s):
+    """Parse a timestamp in a single pass if it has a canonical shape
+
+    The shape is decided by the length: 19 characters without, 20 with
+    "Z" and 21 to 26 with fractional seconds. Everything else (e.g.
+    single-digit fields, which strptime accepts) goes to strptime.
+    """
+    length = len(s)
+    if length == 19 or (length == 20 and s[19] == 'Z'):
+        dt = _parse_canonical(s[:19])
+        if dt is not None:
+            return dt
+    elif 21 <= length <= 26 and s[19] == '.':
+        fraction = s[20:]
+        dt = _parse_canonical(s[:19])
+        if dt is not None and _DIGITS.issuperset(fraction):
+            return dt.replace(microsecond=int(fraction.ljust(6, '0')))
+
+    return _strptime_iso8601(s)
+
+
 def iso8601_to_datetime(s):
     """Convert a ISO8601-formatted string to datetime
 
@@ -32,17 +125,109 @@ def iso8601_to_datetime(s):
     datetime.datetime(2009, 12, 29, 19, 25, 33, 100000)
     >>> iso8601_to_datetime('2009-12-29T19:25:33Z')
     datetime.datetime(2009, 12, 29, 19, 25, 33)
+    >>> iso8601_to_datetime('2009-2-9T9:25:33')
+    datetime.datetime(2009, 2, 9, 9, 25, 33)
     >>> iso8601_to_datetime('xXxXxXxXxxxxXxxxXxx')
+    >>> iso8601_to_datetime('2009-02-29T19:25:33')
     >>>
     """
-    for format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
-                   '%Y-%m-%dT%H:%M:%SZ'):
-        try:
-            return datetime.datetime.strptime(s, format)
-        except ValueError:
-            continue
+    return _parse_iso8601(s)
 
-    return None
+
+def is_iso8601(s):
+    """Check if iso8601_to_datetime accepts a string
+
+    >>> is_iso8601('2009-12-29T19:25:33')
+    True
+    >>> is_iso8601('2009-12-29T19:25:33.1Z')
+    False
+    """
+    return _parse_iso8601(s) is not None
+
+
+def datetime_to_epoch(dt):
+    """Convert a datetime to seconds since the epoch
+
+    Naive datetime objects are taken to be in UTC.
+
+    >>> datetime_to_epoch(datetime.datetime(2009, 12, 29, 19, 25, 33, 500000))
+    1262114733.5
+    """
+    offset = dt.utcoffset()
+    if offset is not None:
+        dt = dt.replace(tzinfo=None) - offset
+    return (dt - _EPOCH).total_seconds()
+
+
+def epoch_to_datetime(seconds):
+    """Convert seconds since the epoch to a naive datetime in UTC
+
+    >>> epoch_to_datetime(1262114733.5)
+    datetime.datetime(2009, 12, 29, 19, 25, 33, 500000)
+    """
+    return _EPOCH + datetime.timedelta(seconds=seconds)
+
+
+def iso8601_to_epoch(s):
+    """Convert a ISO8601-formatted string to seconds since the epoch
+
+    Returns None if the string can't be parsed.
+
+    >>> iso8601_to_epoch('2009-12-29T19:25:33Z')
+    1262114733.0
+    >>> iso8601_to_epoch('tomorrow')
+    """
+    dt = _parse_iso8601(s)
+    if dt is None:
+        return None
+    return (dt - _EPOCH).total_seconds()
+
+
+def rfc2822_to_datetime(s):
+    """Convert a RFC 2822 date (e.g. of a HTTP header) to datetime
+
+    The result is a naive datetime in UTC, or None if the date can't
+    be parsed. The HTTP format (in GMT) is parsed without the email
+    module; other time zones are converted to UTC.
+
+    >>> rfc2822_to_datetime('Tue, 29 Dec 2009 19:25:33 GMT')
+    datetime.datetime(2009, 12, 29, 19, 25, 33)
+    >>> rfc2822_to_datetime('Tue, 29 Dec 2009 20:25:33 +0100')
+    datetime.datetime(2009, 12, 29, 19, 25, 33)
+    >>> rfc2822_to_datetime('yesterday')
+    """
+    if len(s) == 29 and s[25:] == ' GMT' and s[4] == s[7] == s[11] == ' ':
+        month = _MONTHS.get(s[8:11])
+        digits = s[5:7] + s[12:16] + s[17:19] + s[20:22] + s[23:25]
+        if (month is not None and s[19] == s[22] == ':' and
+                _DIGITS.issuperset(digits)):
+            try:
+                return datetime.datetime(
+                    int(digits[2:6]), month, int(digits[:2]),
+                    int(digits[6:8]), int(digits[8:10]), int(digits[10:]))
+            except ValueError:
+                pass
+
+    parsed = utils.parsedate_tz(s)
+    if parsed is None:
+        return None
+    return epoch_to_datetime(utils.mktime_tz(parsed))
+
+
+def datetime_to_rfc2822(dt):
+    """Convert a datetime to a RFC 2822 date in GMT (for HTTP headers)
+
+    Naive datetime objects are taken to be in UTC.
+
+    >>> datetime_to_rfc2822(datetime.datetime(2009, 12, 29, 19, 25, 33))
+    'Tue, 29 Dec 2009 19:25:33 GMT'
+    """
+    offset = dt.utcoffset()
+    if offset is not None:
+        dt = dt.replace(tzinfo=None) - offset
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        _DAY_NAMES[dt.weekday()], dt.day, _MONTH_NAMES[dt.month - 1],
+        dt.year, dt.hour, dt.minute, dt.second)
 
 
 def datetime_to_iso8601(dt):
@@ -68,8 +253,8 @@ def position_to_seconds(s):
     >>> position_to_seconds('100:00:00')
     360000
     """
-    hours, minutes, seconds = (int(x) for x in s.split(':', 2))
-    return (((hours * 60) + minutes) * 60) + seconds
+    hours, minutes, seconds = s.split(':', 2)
+    return (int(hours) * 60 + int(minutes)) * 60 + int(seconds)
 
 
 def seconds_to_position(seconds):
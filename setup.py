@@ -46,12 +46,13 @@ CLASSIFIERS = [
     'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
     'Operating System :: OS Independent',
     'Programming Language :: Python',
-    'Programming Language :: Python :: 2',
-    'Programming Language :: Python :: 2.6',
-    'Programming Language :: Python :: 2.7',
     'Programming Language :: Python :: 3',
-    'Programming Language :: Python :: 3.3',
-    'Programming Language :: Python :: 3.4',
+    'Programming Language :: Python :: 3 :: Only',
+    'Programming Language :: Python :: 3.6',
+    'Programming Language :: Python :: 3.7',
+    'Programming Language :: Python :: 3.8',
+    'Programming Language :: Python :: 3.9',
+    'Programming Language :: Python :: 3.10',
 ]
 
 setup(name=PACKAGE,
@@ -67,4 +68,5 @@ setup(name=PACKAGE,
       data_files=DATA_FILES,
       download_url=WEBSITE + PACKAGE + '-' + VERSION + '.tar.gz',
       classifiers=CLASSIFIERS,
+      python_requires='>=3.6',
       )